@@ -0,0 +1,38 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from tugboat.parser_engine.generate_intermediary import ProcessInputFiles
+from tugboat.synthetic import generate_package
+
+
+@pytest.fixture
+def process_input(tmp_path, monkeypatch):
+    """
+    ProcessInputFiles of a synthetic site of 2 racks of 4 hosts, with its
+    excel data parsed. Validation dumps the parsed data in the working
+    directory, tmp_path here
+    """
+    monkeypatch.chdir(tmp_path)
+    package = generate_package(str(tmp_path / 'package'), 2, 4)
+    process_input_ob = ProcessInputFiles([package['excel']], package['spec'])
+    process_input_ob.apply_design_rules(package['site_config'])
+    process_input_ob.get_parsed_raw_data_from_excel()
+    return process_input_ob
+
+
+@pytest.fixture
+def intermediary(process_input):
+    """ Intermediary of the synthetic site of process_input """
+    return process_input.generate_intermediary_yaml()
@@ -0,0 +1,111 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pytest
+import yaml
+from tugboat.batch import format_results
+from tugboat.batch import load_batch_manifest
+from tugboat.batch import process_site
+from tugboat.batch import run_batch
+from tugboat.synthetic import generate_package
+
+OPTIONS = {
+    'manifests': False,
+    'render_jobs': 1,
+    'no_cache': True,
+    'cache_dir': None,
+    'xlsx_engine': 'openpyxl',
+    'detect_extent': False,
+    'intermediary_format': 'yaml',
+}
+
+
+@pytest.fixture
+def sites(tmp_path, monkeypatch):
+    """
+    A batch of three sites: the first one raises, its excel file is
+    missing, the second one exits, its spec matches no sheet, and the
+    third one is fine. The working directory is tmp_path
+    """
+    monkeypatch.chdir(tmp_path)
+    package = generate_package(str(tmp_path / 'package'), 2, 4)
+    with open(package['spec'], 'r') as f:
+        spec = yaml.safe_load(f)
+    spec['specs']['xl_spec']['ipmi_sheet_name'] = 'Missing Sheet'
+    with open(str(tmp_path / 'other_spec.yaml'), 'w') as f:
+        yaml.safe_dump(spec, f)
+    manifest = {
+        'sites': [{
+            'name': 'raises',
+            'excel': 'package/missing.xlsx',
+            'spec': 'package/excel_spec.yaml',
+            'site_config': 'package/site_config.yaml',
+        }, {
+            'name': 'exits',
+            'excel': ['package/syn01_design_spec.xlsx'],
+            'spec': 'other_spec.yaml',
+            'site_config': 'package/site_config.yaml',
+        }, {
+            'name': 'good',
+            'excel': ['package/syn01_design_spec.xlsx'],
+            'spec': 'package/excel_spec.yaml',
+            'site_config': 'package/site_config.yaml',
+            'output_dir': 'out/good',
+        }]
+    }
+    with open(str(tmp_path / 'batch.yaml'), 'w') as f:
+        yaml.safe_dump(manifest, f)
+    return load_batch_manifest(str(tmp_path / 'batch.yaml'))
+
+
+def test_load_batch_manifest(sites, tmp_path):
+    assert [site['name'] for site in sites] == ['raises', 'exits', 'good']
+    assert sites[0]['excel'] == [str(tmp_path / 'package/missing.xlsx')]
+    assert sites[1]['output_dir'] == str(tmp_path / 'exits')
+    assert sites[2]['output_dir'] == str(tmp_path / 'out/good')
+
+
+def test_process_site_restores_the_working_directory(sites, tmp_path):
+    for site in sites:
+        process_site(site, OPTIONS)
+        assert os.getcwd() == str(tmp_path)
+        assert os.path.isdir(site['output_dir'])
+
+
+@pytest.mark.parametrize('jobs', [1, 2])
+def test_failed_sites_do_not_stop_the_batch(sites, jobs):
+    results = run_batch(sites, OPTIONS, jobs)
+    assert [(result['name'], result['status']) for result in results] == [
+        ('raises', 'failed'),
+        ('exits', 'failed'),
+        ('good', 'ok'),
+    ]
+    assert 'missing.xlsx' in results[0]['error']
+    assert results[1]['error'] == 'Tugboat exited!!'
+    assert os.path.isfile(
+        os.path.join(sites[2]['output_dir'], 'syn01_intermediary.yaml'))
+
+    lines = format_results(results).splitlines()
+    assert lines[0].split() == [
+        'SITE', 'STATUS', 'INTERMEDIARY', 'MANIFESTS', 'TOTAL', 'ERROR'
+    ]
+    assert lines[1].split()[:2] == ['raises', 'failed']
+    assert lines[2].split()[:2] == ['exits', 'failed']
+    assert lines[2].endswith('Tugboat exited!!')
+    good = lines[3].split()
+    assert good[:2] == ['good', 'ok']
+    """ No manifests were generated, and there is no error """
+    assert good[3] == '-' and len(good) == 5
+    assert lines[-1] == '3 sites, 2 failed'
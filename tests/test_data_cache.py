@@ -0,0 +1,39 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tugboat.parser_engine.utils import data_cache
+from tugboat.parser_engine.utils.data_cache import ParsedDataCache
+from tugboat.synthetic import generate_package
+
+
+def test_key_depends_on_engine_and_extent(tmp_path):
+    package = generate_package(str(tmp_path), racks=1, hosts_per_rack=2)
+    cache = ParsedDataCache(str(tmp_path / 'cache'))
+    args = ([package['excel']], package['spec'])
+    keys = {
+        cache.get_key(*args, detect_extent=extent, xlsx_engine=engine)
+        for extent in (False, True) for engine in ('openpyxl', 'xml')
+    }
+    assert len(keys) == 4
+    assert cache.get_key(*args) == cache.get_key(
+        *args, xlsx_engine='openpyxl')
+
+
+def test_key_depends_on_cache_revision(tmp_path, monkeypatch):
+    package = generate_package(str(tmp_path), racks=1, hosts_per_rack=2)
+    cache = ParsedDataCache(str(tmp_path / 'cache'))
+    key = cache.get_key([package['excel']], package['spec'])
+    monkeypatch.setattr(data_cache, 'CACHE_REVISION',
+                        data_cache.CACHE_REVISION + 1)
+    assert cache.get_key([package['excel']], package['spec']) != key
@@ -0,0 +1,73 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+from jinja2 import Environment
+from tugboat.site_processors.dependencies import InputDigests
+from tugboat.site_processors.site_processor import render_recorded
+
+DATA = {
+    'region_name': 'syn01',
+    'network': {
+        'common': {
+            'oam': {'nw': '100.64.0.0/24', 'vlan': '21'},
+            'pxe': {'nw': '172.16.0.0/24', 'vlan': '41'},
+        },
+    },
+    'baremetal': {
+        'rack01': {'syn01r01c001': {'ip': {'oam': '100.64.0.11'}}},
+    },
+}
+
+
+def record(source, data=DATA):
+    template_j2 = Environment().from_string(source)
+    content, inputs = render_recorded(template_j2, data)
+    assert content == template_j2.render(data=data)
+    return content, inputs
+
+
+def digest(inputs, data):
+    return InputDigests(data).digest(*inputs)
+
+
+def test_values_read_are_recorded():
+    content, inputs = record('{{ data.network.common.oam.vlan }}')
+    assert content == '21'
+    assert inputs[0] == [('network', 'common', 'oam', 'vlan')]
+    data = copy.deepcopy(DATA)
+    data['network']['common']['pxe']['vlan'] = '42'
+    assert digest(inputs, data) == digest(inputs, DATA)
+    data['network']['common']['oam']['vlan'] = '22'
+    assert digest(inputs, data) != digest(inputs, DATA)
+
+
+def test_membership_of_a_container_is_recorded():
+    """ 'rack01' holds a dict, its presence is read, not its content """
+    content, inputs = record(
+        "{% if 'rack01' in data.baremetal %}rack01{% endif %}")
+    assert content == 'rack01'
+    assert ('baremetal', 'rack01') in inputs[1]
+    data = copy.deepcopy(DATA)
+    data['baremetal']['rack01']['syn01r01c002'] = {}
+    assert digest(inputs, data) == digest(inputs, DATA)
+    data['baremetal']['rack02'] = data['baremetal'].pop('rack01')
+    assert digest(inputs, data) != digest(inputs, DATA)
+
+
+def test_output_differing_through_the_views_is_not_recorded():
+    """ pprint wraps a dict, not the repr of a view of it """
+    content, inputs = record('{{ data.network | pprint }}')
+    assert '\n' in content
+    assert inputs is None
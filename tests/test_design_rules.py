@@ -0,0 +1,130 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import os
+import pytest
+import yaml
+from tugboat.parser_engine.check_exceptions import InvalidDesignRules
+from tugboat.parser_engine.utils import design_rules
+from tugboat.parser_engine.utils.design_rules import compile_design_rules
+from tugboat.parser_engine.utils.design_rules import DesignRules
+from tugboat.parser_engine.utils.design_rules import load_global_config
+from tugboat.parser_engine.utils.design_rules import merge_rules
+from tugboat.synthetic import SITE_CONFIG
+
+
+def write_site_config(path, site_config):
+    with open(str(path), 'w') as f:
+        yaml.safe_dump(site_config, f)
+    return str(path)
+
+
+def get_rules():
+    """ Merged rules share the values of the site config, copy it """
+    return merge_rules(load_global_config(), copy.deepcopy(SITE_CONFIG))
+
+
+def test_merge_rules_is_deep():
+    base = {
+        'proxy': {'http': 'a', 'https': 'b'},
+        'profiles': {'foundry': {'ctrl': 'cp', 'compute': 'nc'}},
+        'host_types': ['genesis', 'controllers'],
+        'ips_to_leave': 12,
+    }
+    override = {
+        'profiles': {'foundry': {'ctrl': 'cp-large'}, 'nc': {}},
+        'host_types': ['computes'],
+        'ips_to_leave': {'pxe': 4},
+    }
+    original = copy.deepcopy(base)
+    assert merge_rules(base, override) == {
+        'proxy': {'http': 'a', 'https': 'b'},
+        'profiles': {
+            'foundry': {'ctrl': 'cp-large', 'compute': 'nc'},
+            'nc': {},
+        },
+        'host_types': ['computes'],
+        'ips_to_leave': {'pxe': 4},
+    }
+    assert base == original
+
+
+def test_missing_or_mistyped_rules_are_invalid():
+    rules = get_rules()
+    del rules['bgp']
+    rules['ips_to_leave'] = 'twelve'
+    with pytest.raises(InvalidDesignRules) as error:
+        DesignRules(rules)
+    assert error.value.problems == [
+        "'ips_to_leave' should be a int", "'bgp' is missing"
+    ]
+
+    rules = get_rules()
+    del rules['hardware_profile']['foundry']['profile_name']['ctrl']
+    with pytest.raises(InvalidDesignRules) as error:
+        DesignRules(rules)
+    assert error.value.problems == [
+        "'hardware_profile.foundry.profile_name.ctrl' is missing"
+    ]
+
+
+def test_rules_are_read_only():
+    rules = DesignRules(get_rules())
+    with pytest.raises(TypeError):
+        rules['proxy']['http'] = 'http://other:8080'
+    with pytest.raises(AttributeError):
+        rules['host_types'].append('storage')
+    with pytest.raises(TypeError):
+        rules['ips_to_leave'] = 4
+    section = rules.section('proxy')
+    section['http'] = 'http://other:8080'
+    assert rules['proxy']['http'] == SITE_CONFIG['proxy']['http']
+    assert rules.ctrl_profile == 'cp'
+    assert rules.host_types == ('genesis', 'controllers', 'computes')
+
+
+def test_rules_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(design_rules, '_compiled', {})
+    cache_dir = str(tmp_path / 'cache')
+    site_config = write_site_config(tmp_path / 'site_config.yaml',
+                                    SITE_CONFIG)
+    rules = compile_design_rules(site_config, cache_dir)
+    assert compile_design_rules(site_config, cache_dir) is rules
+    assert len(os.listdir(os.path.join(cache_dir, 'rules'))) == 1
+
+    """ Another process reads the rules from disk """
+    monkeypatch.setattr(design_rules, '_compiled', {})
+    cached = compile_design_rules(site_config, cache_dir)
+    assert cached is not rules
+    assert dict(cached) == dict(rules)
+
+    """ An edited site config is compiled again """
+    write_site_config(site_config, merge_rules(SITE_CONFIG,
+                                               {'ceph': {'osd_count': 8}}))
+    assert compile_design_rules(site_config, cache_dir)['ceph'][
+        'osd_count'] == 8
+    assert len(os.listdir(os.path.join(cache_dir, 'rules'))) == 2
+
+
+def test_invalid_rules_are_not_cached(tmp_path, monkeypatch):
+    monkeypatch.setattr(design_rules, '_compiled', {})
+    cache_dir = str(tmp_path / 'cache')
+    site_config = write_site_config(
+        tmp_path / 'site_config.yaml',
+        dict(SITE_CONFIG, sitetype='unknown'))
+    for _ in range(2):
+        with pytest.raises(InvalidDesignRules):
+            compile_design_rules(site_config, cache_dir)
+    assert not os.path.exists(os.path.join(cache_dir, 'rules'))
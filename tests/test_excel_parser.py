@@ -0,0 +1,77 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from openpyxl import load_workbook
+from tugboat.parser_engine.utils.excel_parser import ExcelParser
+from tugboat.parser_engine.utils.extraction_plan import ReadExtent
+from tugboat.parser_engine.utils.spec_matcher import SpecMatcher
+from tugboat.parser_engine.utils.workbook import extract_workbook
+from tugboat.synthetic import EXCEL_SPEC
+from tugboat.synthetic import generate_package
+
+# A cell far outside of what the excel spec reads
+FAR_ROW = 1000
+FAR_COLUMN = 50
+
+
+@pytest.fixture
+def packages(tmp_path, monkeypatch):
+    """
+    Two synthetic packages, whose workbooks have the same sheet names. A
+    cell no spec reads is added to the second one. Validation dumps the
+    data in the working directory
+    """
+    monkeypatch.chdir(tmp_path)
+    first = generate_package(str(tmp_path / 'first'), 2, 4)
+    second = generate_package(str(tmp_path / 'second'), 3, 5, 'syn02')
+    workbook = load_workbook(second['excel'])
+    workbook[EXCEL_SPEC['ipmi_sheet_name']].cell(FAR_ROW, FAR_COLUMN, 'far')
+    workbook.save(second['excel'])
+    return first, second
+
+
+@pytest.mark.parametrize('detect_extent', [False, True])
+def test_parallel_read_is_identical(packages, detect_extent):
+    first, second = packages
+    sheetnames = {}
+    data = {}
+    for jobs in (1, 2):
+        parser = ExcelParser([first['excel'], second['excel']],
+                             first['spec'],
+                             jobs=jobs,
+                             detect_extent=detect_extent)
+        sheetnames[jobs] = parser.wb_combined.sheetnames
+        data[jobs] = parser.get_data()
+        parser.close()
+    assert sheetnames[2] == sheetnames[1]
+    assert EXCEL_SPEC['ipmi_sheet_name'] + '1' in sheetnames[1]
+    assert data[2] == data[1]
+    assert len(data[1]['ipmi_data'][0]) == 8
+
+
+@pytest.mark.parametrize('detect_extent', [False, True])
+def test_workers_read_the_extent_of_the_specs(packages, detect_extent):
+    _, second = packages
+    excel_specs = SpecMatcher.load(second['spec']).excel_specs
+    extent = ReadExtent.compile(excel_specs, detect_extent)
+    for sheetname, dimensions, rows in extract_workbook(
+            second['excel'], extent=extent):
+        assert len(rows) < FAR_ROW
+        assert all(len(row) == extent.max_column for row in rows)
+        if sheetname == EXCEL_SPEC['ipmi_sheet_name']:
+            """ The recorded dimensions are kept """
+            assert dimensions[1] == FAR_ROW
+            hostname_col = EXCEL_SPEC['hostname_col']
+            assert sum(1 for row in rows if row[hostname_col - 1]) == 15
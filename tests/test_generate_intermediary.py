@@ -0,0 +1,107 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import logging
+import pytest
+from openpyxl import load_workbook
+from tugboat.parser_engine.check_exceptions import NotEnoughIp
+from tugboat.parser_engine.generate_intermediary import ProcessInputFiles
+from tugboat.parser_engine.utils.intermediary_codec import dump_intermediary
+from tugboat.synthetic import EXCEL_SPEC
+from tugboat.synthetic import generate_package
+
+
+def test_missing_oob_subnet_is_a_warning(process_input, caplog):
+    """ OOB addresses come from the excel files, none are allocated """
+    public = process_input.parsed_xl_data['network_data']['public']
+    public['oob']['subnets'] = public['oob']['subnets'][:1]
+    with caplog.at_level(logging.WARNING):
+        data = process_input.generate_intermediary_yaml()
+    assert 'rack02: no oob subnet for 4 nodes' in caplog.text
+    assert data['network']['common']['oob']['nw'] == '10.1.0.0/24'
+
+
+def test_allocated_network_shortfall_is_fatal(process_input):
+    public = process_input.parsed_xl_data['network_data']['public']
+    public['oam']['ip'] = '100.64.0.0/29'
+    with pytest.raises(NotEnoughIp) as error:
+        process_input.generate_intermediary_yaml()
+    assert error.value.shortfalls == [
+        'common: oam 100.64.0.0/29 can not handle 8 nodes, room for 0'
+    ]
+
+
+def add_host(excel, row, hostname):
+    """ Add hostname after the last host, at row, next to the host above """
+    workbook = load_workbook(excel)
+    ws = workbook[EXCEL_SPEC['ipmi_sheet_name']]
+    ipmi_address = ws.cell(row - 1, EXCEL_SPEC['ipmi_address_col']).value
+    ws.cell(row, EXCEL_SPEC['hostname_col'], hostname)
+    ws.cell(row, EXCEL_SPEC['ipmi_address_col'],
+            ipmi_address[:ipmi_address.rindex('.') + 1] +
+            str(int(ipmi_address.split('.')[-1]) + 1))
+    ws.cell(row, EXCEL_SPEC['host_profile_col'], 'dp-nc')
+    workbook.save(excel)
+
+
+def test_baseline_keeps_addresses(intermediary, tmp_path, caplog):
+    """
+    Regenerate with a host added to rack02 and a rack added. One address
+    of the baseline is in the DHCP range of the PXE network
+    """
+    previous = copy.deepcopy(intermediary)
+    previous['baremetal']['rack01']['syn01r01o004']['ip']['pxe'] = \
+        '172.16.0.200'
+    dump_intermediary(previous, str(tmp_path / 'previous.yaml'))
+
+    package = generate_package(str(tmp_path / 'next'), 3, 4)
+    add_host(package['excel'], EXCEL_SPEC['start_row'] + 12, 'syn01r02o005')
+    process_input = ProcessInputFiles([package['excel']],
+                                      package['spec'],
+                                      detect_extent=True)
+    process_input.apply_design_rules(package['site_config'])
+    process_input.get_parsed_raw_data_from_excel()
+    process_input.load_baseline(str(tmp_path / 'previous.yaml'))
+    with caplog.at_level(logging.INFO):
+        data = process_input.generate_intermediary_yaml()
+
+    old_addresses = set()
+    for rack, hosts in intermediary['baremetal'].items():
+        for host, host_data in hosts.items():
+            assert data['baremetal'][rack][host] == host_data
+            old_addresses.update(host_data['ip'].values())
+    added = [
+        'syn01r02o005', 'syn01r03o001', 'syn01r03o002', 'syn01r03o003',
+        'syn01r03o004'
+    ]
+    new_addresses = set()
+    for host in added:
+        rack = 'rack02' if host == 'syn01r02o005' else 'rack03'
+        new_addresses.update(data['baremetal'][rack][host]['ip'].values())
+    assert len(new_addresses) == 5 * 6
+    assert not new_addresses & old_addresses
+
+    pxe = intermediary['baremetal']['rack01']['syn01r01o004']['ip']['pxe']
+    assert process_input.baseline.summary(data['baremetal']) == [
+        'Hosts unchanged: 8',
+        'Hosts added: {}'.format(', '.join(added)),
+        'Hosts removed: -',
+        'Hosts changed: -',
+        'Racks added: rack03',
+        'Racks removed: -',
+        'Addresses changed: 1',
+        '  syn01r01o004 pxe: 172.16.0.200 -> {}'.format(pxe),
+    ]
+    assert 'Racks added: rack03' in caplog.text
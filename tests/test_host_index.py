@@ -0,0 +1,61 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tugboat.parser_engine.utils.host_index import get_rack_id
+from tugboat.parser_engine.utils.host_index import HostIndex
+
+""" Rack r1 is a prefix of rack r10 """
+HOSTS = ['abc12r10c001', 'abc12r1c001', 'abc12r1c002', 'abc12r10c002']
+
+
+def test_rack_id():
+    assert get_rack_id('abc12r1c001') == 'r1'
+    assert get_rack_id('abc12r10c001') == 'r10'
+
+
+def test_racks_sharing_a_prefix():
+    index = HostIndex(HOSTS)
+    assert index.region_name == 'abc12'
+    assert index.racks == {'r10': 'rack10', 'r1': 'rack1'}
+    assert list(index.racks) == ['r10', 'r1']
+    assert index.sorted_racks == ['rack1', 'rack10']
+    assert index.rack_hosts == {
+        'rack1': ['abc12r1c001', 'abc12r1c002'],
+        'rack10': ['abc12r10c001', 'abc12r10c002'],
+    }
+    assert index.host_rack == {
+        'abc12r1c001': 'rack1',
+        'abc12r1c002': 'rack1',
+        'abc12r10c001': 'rack10',
+        'abc12r10c002': 'rack10',
+    }
+
+
+def test_categorize():
+    index = HostIndex(HOSTS)
+    profiles = {host: 'cp' for host in HOSTS}
+    profiles['abc12r10c002'] = 'dp'
+    """ The first controller in hostname order, r10 sorts before r1c """
+    assert index.categorize(profiles, 'cp') == {
+        'abc12r10c001': 'genesis',
+        'abc12r10c002': 'compute',
+        'abc12r1c001': 'controller',
+        'abc12r1c002': 'controller',
+    }
+    index.categorize(profiles, 'cp', genesis='abc12r1c002')
+    assert index.roles['genesis'] == ['abc12r1c002']
+    assert index.roles['controller'] == ['abc12r10c001', 'abc12r1c001']
+    """ A genesis host that is no controller any more is replaced """
+    index.categorize(profiles, 'cp', genesis='abc12r10c002')
+    assert index.roles['genesis'] == ['abc12r10c001']
@@ -0,0 +1,78 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import time
+import pytest
+from tugboat.parser_engine.utils.intermediary_codec import CODECS
+from tugboat.parser_engine.utils.intermediary_codec import detect_codec
+from tugboat.parser_engine.utils.intermediary_codec import dump_intermediary
+from tugboat.parser_engine.utils.intermediary_codec import HEADER
+from tugboat.parser_engine.utils.intermediary_codec import load_intermediary
+from tugboat.parser_engine.utils.intermediary_codec import MAGIC
+from tugboat.parser_engine.utils.intermediary_codec import SNAPSHOT_VERSION
+
+
+def test_round_trip(intermediary, tmp_path):
+    for codec in CODECS.values():
+        file_name = str(tmp_path / 'site.{}'.format(codec.extension))
+        dump_intermediary(intermediary, file_name, codec)
+        assert detect_codec(file_name) is codec
+        assert load_intermediary(file_name) == intermediary
+
+
+def test_detect_codec(tmp_path):
+    """ Snapshots by their header whatever the extension """
+    for name, content, codec in (
+            ('site.yaml', b'region_name: x\n', 'yaml'),
+            ('site.json', b'{"region_name":"x"}', 'json'),
+            ('site.bin', b'region_name: x\n', 'yaml'),
+            ('site.json.bin', MAGIC + b'\x00\x01', 'binary')):
+        path = tmp_path / name
+        path.write_bytes(content)
+        assert detect_codec(str(path)).name == codec
+
+
+def test_snapshot_header_is_checked(tmp_path):
+    file_name = str(tmp_path / 'site.bin')
+    dump_intermediary({'region_name': 'x'}, file_name, CODECS['binary'])
+    with open(file_name, 'rb') as f:
+        body = f.read()[HEADER.size:]
+    for magic, version in ((MAGIC, SNAPSHOT_VERSION + 1),
+                           (b'TUGBOAX\x00', SNAPSHOT_VERSION)):
+        with open(file_name, 'wb') as f:
+            f.write(HEADER.pack(magic, version) + body)
+        with pytest.raises(ValueError), open(file_name, 'rb') as f:
+            CODECS['binary'].load(f)
+
+
+def test_codecs_benchmark(intermediary, tmp_path):
+    """ Write and read time of the codecs, the snapshot beats YAML """
+    data = dict(intermediary)
+    """ About 1000 hosts, copied or YAML would write aliases """
+    data['baremetal'] = {
+        '{}{}'.format(rack, index): copy.deepcopy(hosts)
+        for index in range(125)
+        for rack, hosts in intermediary['baremetal'].items()
+    }
+    seconds = {}
+    for name, codec in sorted(CODECS.items()):
+        file_name = str(tmp_path / 'site.{}'.format(codec.extension))
+        start = time.time()
+        dump_intermediary(data, file_name, codec)
+        written = time.time()
+        assert load_intermediary(file_name) == data
+        seconds[name] = (written - start, time.time() - written)
+        print('{}: write {:.3f}s, read {:.3f}s'.format(name, *seconds[name]))
+    assert sum(seconds['binary']) < sum(seconds['yaml'])
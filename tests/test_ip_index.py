@@ -0,0 +1,132 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import random
+import netaddr
+from tugboat.parser_engine.utils.ip_index import IPIndex
+from tugboat.parser_engine.utils.ip_index import range_blocks
+
+NETWORKS = ('10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24', '10.1.2.128/25',
+            '192.168.0.0/24', '2001:db8::/32', '2001:db8:1::/48')
+
+
+def get_index():
+    index = IPIndex()
+    for network in NETWORKS:
+        index.add(network, network)
+    return index
+
+
+def test_range_blocks_match_netaddr():
+    random.seed(17)
+    cases = [(0, 2**32 - 1), (0, 0), (1, 6), (10, 10), (255, 256)]
+    cases += [
+        sorted(random.randrange(2**32) for _ in range(2)) for _ in range(200)
+    ]
+    for first, last in cases:
+        expected = [(cidr.first, cidr.prefixlen)
+                    for cidr in netaddr.iprange_to_cidrs(
+                        str(netaddr.IPAddress(first)),
+                        str(netaddr.IPAddress(last)))]
+        assert range_blocks(first, last, 32) == expected, (first, last)
+
+
+def test_lookup_longest_match_last():
+    index = get_index()
+    assert index.lookup('10.1.2.200') == [
+        '10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24', '10.1.2.128/25'
+    ]
+    assert index.lookup('10.1.2.3') == [
+        '10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24'
+    ]
+    assert index.lookup('10.200.0.1') == ['10.0.0.0/8']
+    assert index.lookup('172.16.0.1') == []
+    assert index.lookup('2001:db8:1::5') == [
+        '2001:db8::/32', '2001:db8:1::/48'
+    ]
+    """ IPv4 and IPv6 keys are apart, ::a01:203 is 10.1.2.3 as an int """
+    assert index.lookup('::a01:203') == []
+
+
+def test_overlaps():
+    index = get_index()
+    assert index.overlaps('10.1.0.0/16') == [
+        '10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24', '10.1.2.128/25'
+    ]
+    assert index.overlaps('10.1.2.0/26') == [
+        '10.0.0.0/8', '10.1.0.0/16', '10.1.2.0/24'
+    ]
+    assert sorted(index.overlaps('0.0.0.0/0')) == sorted(
+        network for network in NETWORKS if ':' not in network)
+    assert index.overlaps('192.168.1.0/24') == []
+    assert index.overlaps('2001:db8:2::/48') == ['2001:db8::/32']
+    assert index.overlaps('2001::/16') == [
+        '2001:db8::/32', '2001:db8:1::/48'
+    ]
+
+
+def test_ranges_not_aligned_to_a_block():
+    index = IPIndex()
+    index.add_range('10.0.0.5', '10.0.0.20', 'a')
+    index.add_range('10.0.0.21', '10.0.1.3', 'b')
+    index.add('10.0.0.16/30', 'c')
+    assert len(index) == 3
+    assert index.lookup('10.0.0.4') == []
+    assert index.lookup('10.0.0.5') == ['a']
+    assert index.lookup('10.0.0.17') == ['a', 'c']
+    assert index.lookup('10.0.0.21') == ['b']
+    assert index.lookup('10.0.1.3') == ['b']
+    assert index.lookup('10.0.1.4') == []
+    assert index.overlaps_range('10.0.0.0', '10.0.0.4') == []
+    assert index.overlaps_range('10.0.0.3', '10.0.0.5') == ['a']
+    assert index.overlaps_range('10.0.0.19', '10.0.0.22') == ['a', 'c', 'b']
+    assert index.overlaps_range('10.0.1.3', '10.0.2.0') == ['b']
+    assert sorted(index.overlaps('10.0.0.0/24')) == ['a', 'b', 'c']
+
+
+def test_ipv6_ranges():
+    index = IPIndex()
+    index.add_range('2001:db8::3', '2001:db8::1:0', 'v6')
+    index.add_range('10.0.0.3', '10.0.1.0', 'v4')
+    assert index.lookup('2001:db8::ffff') == ['v6']
+    assert index.lookup('2001:db8::2') == []
+    assert index.overlaps_range('2001:db8::1:0', '2001:db8::2:0') == ['v6']
+    assert index.overlaps('2001:db8::/120') == ['v6']
+    assert index.overlaps_range('10.0.1.0', '10.0.1.1') == ['v4']
+
+
+def test_matches_netaddr():
+    """ Random networks and queries against a plain scan with netaddr """
+    random.seed(11)
+    index = IPIndex()
+    networks = []
+    for i in range(300):
+        prefixlen = random.randint(8, 30)
+        network = netaddr.IPNetwork('{}/{}'.format(
+            netaddr.IPAddress(random.randrange(2**32)), prefixlen)).cidr
+        networks.append((network, i))
+        index.add(network, i)
+    """ Outermost first, networks of the same prefix in insertion order """
+    by_prefixlen = sorted(networks, key=lambda entry: entry[0].prefixlen)
+    for _ in range(300):
+        address = netaddr.IPAddress(random.randrange(2**32))
+        assert index.lookup(address) == [
+            i for network, i in by_prefixlen if address in network
+        ]
+        first = random.randrange(2**32 - 5000)
+        last = first + random.randrange(5000)
+        assert sorted(index.overlaps_range(
+            str(netaddr.IPAddress(first)), str(netaddr.IPAddress(last)))) == \
+            [i for network, i in networks
+             if network.first <= last and first <= network.last]
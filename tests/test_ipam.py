@@ -0,0 +1,133 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import netaddr
+import pytest
+from tugboat.parser_engine.utils.ipam import AddressAllocator
+from tugboat.parser_engine.utils.ipam import Subnet
+from tugboat.parser_engine.utils.records import NetworkRanges
+
+CIDRS = ('10.0.0.0/22', '10.0.0.0/24', '10.0.0.64/26', '10.0.0.8/29',
+         '10.0.0.4/30', '10.0.0.2/31', '2001:db8::/120')
+
+
+def enumerated_ranges(cidr, ips_to_leave, static_end=-2, dhcp=False):
+    """ Ranges as the intermediary computed them from list(subnet) """
+    ips = list(netaddr.IPNetwork(cidr))
+    ranges = {}
+    if dhcp:
+        mid = len(ips) // 2
+        ranges['dhcp_start'] = str(ips[mid])
+        ranges['dhcp_end'] = str(ips[-2])
+        static_end = mid - 1
+    ranges['static_start'] = str(ips[ips_to_leave + 1])
+    ranges['static_end'] = str(ips[static_end])
+    ranges['reserved_start'] = str(ips[1])
+    ranges['reserved_end'] = str(ips[ips_to_leave])
+    return ranges
+
+
+def enumerated_capacity(cidr, ips_to_leave, static_end=-2, dhcp=False):
+    ips = list(netaddr.IPNetwork(cidr))
+    if dhcp:
+        static_end = len(ips) // 2 - 1
+    return len(ips[ips_to_leave + 1:static_end % len(ips) + 1])
+
+
+def test_addresses_match_enumeration():
+    for cidr in CIDRS:
+        ips = list(netaddr.IPNetwork(cidr))
+        subnet = Subnet(cidr)
+        assert len(subnet) == len(ips)
+        for offset in range(-len(ips), len(ips)):
+            assert subnet.address(offset) == str(ips[offset])
+            assert subnet.value(offset) == int(ips[offset])
+        for offset in (len(ips), -len(ips) - 1):
+            with pytest.raises(IndexError):
+                subnet.address(offset)
+
+
+def test_ranges_match_enumeration():
+    """ ips_to_leave, the dhcp split and static_end=-1, down to /31 """
+    for cidr in CIDRS:
+        subnet = Subnet(cidr)
+        for ips_to_leave in range(0, 12):
+            for static_end, dhcp in ((-2, False), (-1, False), (-2, True)):
+                args = (ips_to_leave, static_end, dhcp)
+                try:
+                    expected = enumerated_ranges(cidr, *args)
+                except IndexError:
+                    with pytest.raises(IndexError):
+                        subnet.ranges(*args)
+                    continue
+                assert subnet.ranges(*args) == expected, (cidr, args)
+                assert subnet.capacity(*args) == \
+                    enumerated_capacity(cidr, *args), (cidr, args)
+
+
+def test_allocator_hands_out_addresses_in_order():
+    ips = list(netaddr.IPNetwork('10.0.0.0/28'))
+    allocator = AddressAllocator(NetworkRanges(Subnet('10.0.0.0/28'), 2))
+    assert [allocator.allocate() for _ in range(4)] == \
+        [int(ip) for ip in ips[3:7]]
+
+
+def test_allocator_skips_reserved_addresses():
+    ips = list(netaddr.IPNetwork('10.0.0.0/28'))
+    allocator = AddressAllocator(NetworkRanges(Subnet('10.0.0.0/28'), 2))
+    assert allocator.reserve('10.0.0.4') == int(ips[4])
+    assert allocator.reserve('10.0.0.6') == int(ips[6])
+    """ Taken, outside of the subnet or not an address """
+    assert allocator.reserve('10.0.0.4') is None
+    assert allocator.reserve('10.0.1.4') is None
+    assert allocator.reserve('not an address') is None
+    assert allocator.reserve(None) is None
+    allocated = [allocator.allocate() for _ in range(3)]
+    assert allocated == [int(ips[3]), int(ips[5]), int(ips[7])]
+    with pytest.raises(IndexError):
+        for _ in range(len(ips)):
+            allocator.allocate()
+
+
+def test_allocator_reserves_the_static_range_only():
+    """ Reserved .1-.2, static .3-.7 and DHCP .8-.14 """
+    allocator = AddressAllocator(
+        NetworkRanges(Subnet('10.0.0.0/28'), 2, dhcp=True))
+    assert (allocator.first, allocator.last) == (3, 7)
+    for address in ('10.0.0.0', '10.0.0.2', '10.0.0.8', '10.0.0.15'):
+        assert allocator.reserve(address) is None, address
+    assert allocator.reserve('10.0.0.3') == int(netaddr.IPAddress('10.0.0.3'))
+    assert allocator.reserve('10.0.0.7') == int(netaddr.IPAddress('10.0.0.7'))
+    """ static_end=-1 ends the static range at the broadcast address """
+    allocator = AddressAllocator(
+        NetworkRanges(Subnet('10.0.0.0/28'), 2, static_end=-1))
+    assert allocator.reserve('10.0.0.15') is not None
+
+
+def test_ranges_benchmark():
+    """ Ranges of a /14 against enumerating its addresses """
+    cidr = '10.0.0.0/14'
+    start = time.time()
+    expected = enumerated_ranges(cidr, 10, dhcp=True)
+    enumerated_seconds = time.time() - start
+
+    start = time.time()
+    ranges = Subnet(cidr).ranges(10, dhcp=True)
+    subnet_seconds = time.time() - start
+
+    assert ranges == expected
+    print('/14 ranges: list(subnet) {:.3f}s, Subnet {:.6f}s'.format(
+        enumerated_seconds, subnet_seconds))
+    assert subnet_seconds < enumerated_seconds
@@ -0,0 +1,130 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import io
+import sys
+from array import array
+import netaddr
+from tugboat.parser_engine.utils.intermediary_codec import YamlCodec
+from tugboat.parser_engine.utils.records import AddressTable
+from tugboat.parser_engine.utils.records import HostRecord
+
+# Hosts of the synthetic site of the intermediary fixture, as
+# (name, rack, type, host profile, last octet of the allocated addresses)
+HOSTS = (
+    ('syn01r01c001', 'rack01', 'genesis', 'cp', 13),
+    ('syn01r01c002', 'rack01', 'controller', 'cp', 14),
+    ('syn01r01c003', 'rack01', 'controller', 'cp', 15),
+    ('syn01r01o004', 'rack01', 'compute', 'nc', 16),
+    ('syn01r02o001', 'rack02', 'compute', 'nc', 17),
+    ('syn01r02o002', 'rack02', 'compute', 'nc', 18),
+    ('syn01r02o003', 'rack02', 'compute', 'nc', 19),
+    ('syn01r02o004', 'rack02', 'compute', 'nc', 20),
+)
+
+# The last host in the intermediary written before the host records
+BAREMETAL_YAML = '''\
+baremetal:
+  rack02:
+    syn01r02o004:
+      host_profile: nc
+      ip:
+        calico: 172.24.0.20
+        oam: 100.64.0.20
+        oob: 10.2.0.13
+        overlay: 172.28.0.20
+        pxe: 172.16.0.20
+        storage: 172.20.0.20
+      rack: rack02
+      type: compute
+'''
+
+
+def dump(data):
+    stream = io.StringIO()
+    YamlCodec.dump(data, stream)
+    return stream.getvalue()
+
+
+def test_ipv4_address_table():
+    addresses = ['0.0.0.0', '10.1.2.3', '255.255.255.255']
+    table = AddressTable(len(addresses))
+    table.add_column('pxe', 4)
+    assert isinstance(table.columns['pxe'], array)
+    for row, address in enumerate(addresses):
+        table.set(row, 'pxe', int(netaddr.IPAddress(address)))
+    assert [table.address(row, 'pxe') for row in range(3)] == addresses
+    assert table.value(1, 'pxe') == (4, int(netaddr.IPAddress('10.1.2.3')))
+    """ A column added again keeps its addresses """
+    table.add_column('pxe', 4)
+    assert table.address(2, 'pxe') == '255.255.255.255'
+
+
+def test_ipv6_address_table():
+    addresses = [
+        '::', '2001:db8::1', 'ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff'
+    ]
+    table = AddressTable(len(addresses))
+    table.add_column('pxe', 4)
+    table.add_column('storage', 6)
+    assert isinstance(table.columns['storage'], list)
+    for row, address in enumerate(addresses):
+        table.set(row, 'storage', int(netaddr.IPAddress(address)))
+    assert [table.address(row, 'storage') for row in range(3)] == addresses
+    assert table.value(1, 'storage') == (6, 0x20010db8 << 96 | 1)
+    """ Rows of a column not set yet hold the network address """
+    assert table.address(1, 'pxe') == '0.0.0.0'
+
+
+def test_host_record_names_are_shared():
+    record = HostRecord(''.join(['syn01', 'r01c001']), 'rack01', 0,
+                        '10.1.0.10', 'cp')
+    assert record.name is sys.intern('syn01r01c001')
+    assert record.rack is sys.intern('rack01')
+    assert record.type is None
+    assert repr(record) == "HostRecord('syn01r01c001')"
+
+
+def test_baremetal_matches_host_dicts(intermediary):
+    """ The host dicts the intermediary generator used to build """
+    expected = {}
+    for name, rack, host_type, host_profile, octet in HOSTS:
+        expected.setdefault(rack, {})[name] = {
+            'ip': {
+                'oob': '10.{}.0.{}'.format(rack[-1], 10 + int(name[-1]) - 1),
+                'oam': '100.64.0.{}'.format(octet),
+                'pxe': '172.16.0.{}'.format(octet),
+                'storage': '172.20.0.{}'.format(octet),
+                'calico': '172.24.0.{}'.format(octet),
+                'overlay': '172.28.0.{}'.format(octet),
+            },
+            'type': host_type,
+            'host_profile': host_profile,
+            'rack': rack,
+        }
+    baremetal = intermediary['baremetal']
+    assert baremetal == expected
+    for hosts in baremetal.values():
+        for host in hosts.values():
+            assert type(host) is dict and type(host['ip']) is dict
+            assert all(type(value) is str for value in host['ip'].values())
+
+    assert dump(baremetal) == dump(expected)
+    assert dump({
+        'baremetal': {
+            'rack02': {
+                'syn01r02o004': baremetal['rack02']['syn01r02o004']
+            }
+        }
+    }) == BAREMETAL_YAML
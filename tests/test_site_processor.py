@@ -0,0 +1,247 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import json
+import logging
+import os
+import jinja2
+import pytest
+from tugboat.site_processors import site_processor
+from tugboat.site_processors import template_package
+from tugboat.site_processors.site_processor import SiteProcessor
+from tugboat.site_processors.template_package import build_template_package
+from tugboat.site_processors.template_package import INDEX_FILE
+from tugboat.site_processors.template_package import load_template_package
+
+TEMPLATES = {
+    'site.yaml.j2': 'region: {{ data.region_name }}\n',
+    'baremetal/nodes.yaml.j2':
+    '{% for rack, hosts in data.baremetal.items() %}'
+    '{% for name, host in hosts.items() %}---\n'
+    'name: {{ name }}\nrack: {{ rack }}\n'
+    'oam: {{ host.ip.oam }}\n{% include "footer.j2" %}\n'
+    '{% endfor %}{% endfor %}',
+    'baremetal/footer.j2': '# end of {{ data.region_name }} node',
+    'networks/common.yaml.j2':
+    '{% for name, net in data.network.common.items() %}---\n'
+    'name: {{ name }}\n{{ net }}\n{% endfor %}',
+    'networks/genesis.yaml.j2':
+    '{% set roles = data|get_role_wise_nodes %}'
+    'genesis: {{ roles.genesis.name }} {{ roles.genesis.oam }}\n',
+}
+
+
+@pytest.fixture
+def template_dir(tmp_path, monkeypatch):
+    """
+    Templates of TEMPLATES, without a compiled package. Render workers
+    are forked, so they see the patched functions too
+    """
+    template_dir = tmp_path / 'templates'
+    for name, source in TEMPLATES.items():
+        path = template_dir / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(source)
+    monkeypatch.setattr(site_processor, 'get_template_dir',
+                        lambda: str(template_dir))
+    monkeypatch.setattr(template_package, 'get_package_dir',
+                        lambda: str(tmp_path / 'package'))
+    return template_dir
+
+
+def render(intermediary, output_dir, render_jobs):
+    output_dir.mkdir(exist_ok=True)
+    cwd = os.getcwd()
+    os.chdir(str(output_dir))
+    try:
+        return SiteProcessor(
+            intermediary, render_jobs=render_jobs).render_template()
+    finally:
+        os.chdir(cwd)
+
+
+def read_tree(output_dir):
+    """ Content and modification time of the manifests under output_dir """
+    files = {}
+    for dirpath, dirs, filenames in os.walk(str(output_dir)):
+        for filename in filenames:
+            if filename.startswith('.'):
+                continue
+            path = os.path.join(dirpath, filename)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, str(output_dir))] = (
+                    f.read(), os.stat(path).st_mtime_ns)
+    return files
+
+
+def test_parallel_render_is_identical(intermediary, template_dir, tmp_path):
+    serial = render(intermediary, tmp_path / 'serial', 1)
+    parallel = render(intermediary, tmp_path / 'parallel', 2)
+    assert serial == parallel
+    assert serial['added'] == len(TEMPLATES)
+    serial_files = read_tree(tmp_path / 'serial')
+    parallel_files = read_tree(tmp_path / 'parallel')
+    assert len(serial_files) == len(TEMPLATES)
+    assert {name: content for name, (content, _) in serial_files.items()} == \
+        {name: content for name, (content, _) in parallel_files.items()}
+    assert b'# end of syn01 node' in serial_files[
+        'pegleg_manifests/site/syn01/baremetal/nodes.yaml'][0]
+
+
+def test_second_render_rewrites_nothing(intermediary, template_dir, tmp_path):
+    for render_jobs in (1, 2):
+        output_dir = tmp_path / 'jobs{}'.format(render_jobs)
+        render(intermediary, output_dir, render_jobs)
+        files = read_tree(output_dir)
+        summary = render(intermediary, output_dir, render_jobs)
+        assert summary == {
+            'added': 0,
+            'changed': 0,
+            'unchanged': len(TEMPLATES),
+            'removed': 0,
+        }
+        assert read_tree(output_dir) == files
+
+
+def new_process(monkeypatch):
+    """ Forget the packages read, as a new tugboat process would """
+    monkeypatch.setattr(template_package, '_packages', {})
+
+
+def test_package_is_trusted(intermediary, template_dir, tmp_path,
+                            monkeypatch, caplog):
+    """ The sources are not looked at, even once they changed """
+    package_dir = str(tmp_path / 'package')
+    build_template_package(str(template_dir), package_dir)
+    (template_dir / 'site.yaml.j2').write_text(
+        'region_name: {{ data.region_name }}\n')
+    new_process(monkeypatch)
+
+    def fingerprint(template_dir):
+        raise AssertionError('Sources walked')
+
+    monkeypatch.setattr(template_package, 'get_sources_fingerprint',
+                        fingerprint)
+    with caplog.at_level(logging.WARNING):
+        assert load_template_package(
+            template_dir=str(template_dir)) is not None
+        render(intermediary, tmp_path / 'output', 1)
+    assert caplog.text == ''
+    with open(str(tmp_path / 'output/pegleg_manifests/site/syn01/site.yaml'),
+              'r') as f:
+        assert f.read() == 'region: syn01'
+
+
+def test_package_of_changed_sources_is_ignored(intermediary, template_dir,
+                                               tmp_path, monkeypatch, caplog):
+    """ Templates being developed, checked with TUGBOAT_CHECK_TEMPLATES """
+    monkeypatch.setenv(template_package.CHECK_TEMPLATES_VARIABLE, '1')
+    package_dir = str(tmp_path / 'package')
+    build_template_package(str(template_dir), package_dir)
+    with caplog.at_level(logging.WARNING):
+        assert load_template_package(
+            template_dir=str(template_dir)) is not None
+        render(intermediary, tmp_path / 'output', 1)
+    assert caplog.text == ''
+
+    (template_dir / 'site.yaml.j2').write_text(
+        'region_name: {{ data.region_name }}\n')
+    """ The sources are checked once per process """
+    assert load_template_package(template_dir=str(template_dir)) is not None
+    new_process(monkeypatch)
+    with caplog.at_level(logging.WARNING):
+        assert load_template_package(
+            template_dir=str(template_dir)) is None
+        summary = render(intermediary, tmp_path / 'output', 1)
+    assert 'changed since they were compiled' in caplog.text
+    assert summary['changed'] == 1
+    with open(str(tmp_path / 'output/pegleg_manifests/site/syn01/site.yaml'),
+              'r') as f:
+        assert f.read() == 'region_name: syn01'
+
+
+def test_package_of_another_version_is_ignored(template_dir, tmp_path,
+                                               caplog):
+    package_dir = str(tmp_path / 'package')
+    build_template_package(str(template_dir), package_dir)
+    index_file = os.path.join(package_dir, INDEX_FILE)
+    with open(index_file, 'r') as f:
+        index = json.load(f)
+    index['tugboat'] = '0.0.0'
+    with open(index_file, 'w') as f:
+        json.dump(index, f)
+    with caplog.at_level(logging.WARNING):
+        assert load_template_package(
+            template_dir=str(template_dir)) is None
+    assert 'another version of tugboat' in caplog.text
+
+
+def count_renders(monkeypatch):
+    """ Names of the templates rendered, in a single process """
+    renders = []
+    render = jinja2.Template.render
+
+    def counted(self, *args, **kwargs):
+        renders.append(self.name)
+        return render(self, *args, **kwargs)
+
+    monkeypatch.setattr(jinja2.Template, 'render', counted)
+    return renders
+
+
+def test_recorded_templates_render_once(intermediary, template_dir,
+                                        tmp_path, monkeypatch):
+    """
+    flag.yaml.j2 reads data.extra only when data.flag is set, and
+    bgp.yaml.j2 can not be recorded: json can not dump a recorded dict
+    """
+    (template_dir / 'flag.yaml.j2').write_text(
+        '{% if data.flag %}{{ data.extra }}{% endif %}\n')
+    (template_dir / 'bgp.yaml.j2').write_text(
+        '{{ data.network.bgp|tojson }}\n')
+    data = copy.deepcopy(intermediary)
+    data['flag'] = False
+    data['extra'] = 'a'
+    output_dir = tmp_path / 'output'
+    flag_file = str(output_dir / 'pegleg_manifests/site/syn01/flag.yaml')
+    renders = count_renders(monkeypatch)
+    render(data, output_dir, 1)
+    """ Rendered with and without recording """
+    assert sorted(renders) == sorted(
+        2 * (list(TEMPLATES) + ['flag.yaml.j2', 'bgp.yaml.j2']))
+
+    """
+    flag.yaml.j2 renders once, as data.flag changed, and reads data.extra
+    now. It renders again when data.extra changes only
+    """
+    for extra, rendered in (('a', ['bgp.yaml.j2', 'flag.yaml.j2']),
+                            ('b', ['bgp.yaml.j2', 'flag.yaml.j2']),
+                            ('b', ['bgp.yaml.j2'])):
+        data['flag'] = True
+        data['extra'] = extra
+        del renders[:]
+        render(data, output_dir, 1)
+        assert sorted(renders) == rendered
+        with open(flag_file, 'r') as f:
+            assert f.read() == extra
+
+    render(data, tmp_path / 'fresh', 1)
+    assert {
+        name: content
+        for name, (content, _) in read_tree(output_dir).items()
+    } == {
+        name: content
+        for name, (content, _) in read_tree(tmp_path / 'fresh').items()
+    }
@@ -0,0 +1,100 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import pytest
+import yaml
+from openpyxl import Workbook
+from tugboat.parser_engine.check_exceptions import NoSpecMatched
+from tugboat.parser_engine.utils.spec_matcher import SpecMatcher
+
+SHEETS = {
+    'public_ip_sheet': 'Site-Information',
+    'dns_ntp_ldap_sheet': 'Site-Information',
+    'location_sheet': 'Site-Information',
+    'ipmi_sheet_name': 'Site-Information',
+    'private_ip_sheet': 'Site-Information',
+}
+
+
+def get_spec(**keys):
+    spec = dict(SHEETS, header_row=1, ipmi_address_col=2)
+    spec.update(keys)
+    return spec
+
+
+def get_workbook(header):
+    wb = Workbook()
+    ws = wb.active
+    ws.title = 'Site-Information'
+    ws.append(('Hostname', header))
+    return wb
+
+
+def test_header_decides_between_specs():
+    matcher = SpecMatcher({
+        'specs': {
+            'old': get_spec(ipmi_address_header='ipmi'),
+            'new': get_spec(ipmi_address_header='oob address'),
+        }
+    })
+    assert matcher.match(get_workbook('OOB Address'))[0] == 'new'
+    assert matcher.match(get_workbook('IPMI'))[0] == 'old'
+    with pytest.raises(NoSpecMatched):
+        matcher.match(get_workbook('Other'))
+
+
+def test_qualified_ipmi_sheet_skips_headers():
+    """ The IPMI sheet of the spec is in another workbook """
+    matcher = SpecMatcher({
+        'specs': {
+            'qualified':
+            get_spec(
+                ipmi_sheet_name='other_design.xlsx:Site-Information',
+                ipmi_address_header='oob address'),
+            'plain':
+            get_spec(ipmi_address_header='ipmi'),
+        }
+    })
+    assert matcher.match(get_workbook('IPMI'))[0] == 'plain'
+    assert matcher.match(get_workbook('Other'))[0] == 'qualified'
+
+
+def write_specs(path, **specs):
+    with open(str(path), 'w') as f:
+        yaml.safe_dump({'specs': specs}, f)
+
+
+def test_load_picks_up_edited_specs(tmp_path):
+    spec_dir = tmp_path / 'specs'
+    spec_dir.mkdir()
+    spec_file = spec_dir / 'old.yaml'
+    write_specs(spec_file, old=get_spec(ipmi_address_header='ipmi'))
+    matcher = SpecMatcher.load(str(spec_dir))
+    assert SpecMatcher.load(str(spec_dir)) is matcher
+    assert SpecMatcher.load(str(spec_file)) is not matcher
+
+    """ Same size, only the modification time tells the edit apart """
+    write_specs(spec_file, old=get_spec(ipmi_address_header='oob_'))
+    stat = os.stat(str(spec_file))
+    os.utime(str(spec_file),
+             ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    edited = SpecMatcher.load(str(spec_dir))
+    assert edited is not matcher
+    assert edited.match(get_workbook('OOB_'))[0] == 'old'
+
+    write_specs(spec_dir / 'new.yaml', new=get_spec())
+    added = SpecMatcher.load(str(spec_dir))
+    assert added is not edited
+    assert list(added.excel_specs['specs']) == ['new', 'old']
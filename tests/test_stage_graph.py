@@ -0,0 +1,88 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+import pytest
+from tugboat.parser_engine.utils.stage_graph import Stage
+from tugboat.parser_engine.utils.stage_graph import StageGraph
+
+
+def get_graph(calls, requires):
+    """ Stages named after requires, each one appending its name to calls """
+
+    def function(name):
+        def run():
+            calls.append(name)
+            return name.upper()
+
+        return run
+
+    return StageGraph(
+        [Stage(name, function(name), needed)
+         for name, needed in requires.items()])
+
+
+def test_stages_run_in_dependency_order():
+    calls = []
+    graph = get_graph(calls, {
+        'report': ('hosts', 'networks'),
+        'networks': ('excel', ),
+        'hosts': ('excel', ),
+        'excel': (),
+    })
+    assert graph.order == ['excel', 'hosts', 'networks', 'report']
+    assert graph.run() == {
+        'excel': 'EXCEL',
+        'hosts': 'HOSTS',
+        'networks': 'NETWORKS',
+        'report': 'REPORT',
+    }
+    assert calls == ['excel', 'hosts', 'networks', 'report']
+
+
+def test_stage_required_twice_runs_once():
+    calls = []
+    graph = get_graph(calls, {
+        'excel': (),
+        'hosts': ('excel', ),
+        'networks': ('excel', ),
+    })
+    assert graph.result('hosts') == 'HOSTS'
+    assert graph.result('networks') == 'NETWORKS'
+    assert graph.result('excel') == 'EXCEL'
+    graph.run()
+    assert calls == ['excel', 'hosts', 'networks']
+
+
+def test_stage_cycle():
+    with pytest.raises(ValueError) as error:
+        get_graph([], {'a': ('b', ), 'b': ('c', ), 'c': ('a', )})
+    assert str(error.value) == 'Stage cycle: a -> b -> c -> a'
+
+
+def test_unknown_stage():
+    with pytest.raises(ValueError) as error:
+        get_graph([], {'a': ('b', )})
+    assert "requires unknown stage 'b'" in str(error.value)
+
+
+def test_stage_timings():
+    graph = StageGraph([
+        Stage('fast', lambda: None, ()),
+        Stage('slow', lambda: time.sleep(0.05), ('fast', )),
+    ])
+    graph.run()
+    assert list(graph.timings) == ['fast', 'slow']
+    assert graph.timings['slow'] >= 0.05
+    assert graph.timings['fast'] < graph.timings['slow']
@@ -0,0 +1,46 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from tugboat.site_processors.template_package import build_template_package
+from tugboat.site_processors.template_package import create_environment
+from tugboat.site_processors.template_package import get_package_loader
+from tugboat.site_processors.template_package import get_source_loader
+
+
+def write_templates(template_dir):
+    """ Two directories including a footer.j2 of their own """
+    for directory in ('rack', 'rack/sub'):
+        path = template_dir / directory
+        path.mkdir(parents=True)
+        (path / 'nodes.yaml.j2').write_text(
+            'region: {{ data.region_name }}\n{% include "footer.j2" %}')
+        (path / 'footer.j2').write_text('# footer of ' + directory)
+    (template_dir / 'site.yaml.j2').write_text(
+        '{% include "rack/footer.j2" %}')
+
+
+def test_includes_resolve_in_their_directory(tmp_path):
+    template_dir = tmp_path / 'templates'
+    write_templates(template_dir)
+    build_template_package(str(template_dir), str(tmp_path / 'package'))
+    for loader in (get_source_loader(str(template_dir)),
+                   get_package_loader(str(tmp_path / 'package'))):
+        j2_env = create_environment(loader)
+        data = {'region_name': 'syn01'}
+        assert j2_env.get_template('rack/nodes.yaml.j2').render(
+            data=data) == 'region: syn01\n# footer of rack'
+        assert j2_env.get_template('rack/sub/nodes.yaml.j2').render(
+            data=data) == 'region: syn01\n# footer of rack/sub'
+        assert j2_env.get_template('site.yaml.j2').render(
+            data=data) == '# footer of rack'
@@ -0,0 +1,112 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import zipfile
+from openpyxl import load_workbook
+from openpyxl import Workbook
+from tugboat.parser_engine.utils.excel_parser import ExcelParser
+from tugboat.parser_engine.utils.xlsx_reader import XlsxReader
+from tugboat.synthetic import generate_package
+
+ROWS = [
+    ('host', 'installed', 'uptime', 'ip'),
+    ('h1', datetime.datetime(2018, 7, 4, 10, 30), datetime.time(6, 15),
+     '10.0.0.1'),
+    ('h2', datetime.date(1904, 1, 2), datetime.timedelta(hours=30), 2),
+]
+
+RELS = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+MAIN = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+PACKAGE_RELS = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+# Minimal workbook keeping its shared strings in xl/strings/table.xml
+PARTS = {
+    '_rels/.rels':
+    '<Relationships xmlns="{0}"><Relationship Id="rId1" '
+    'Type="{1}/officeDocument" Target="xl/workbook.xml"/>'
+    '</Relationships>'.format(PACKAGE_RELS, RELS),
+    'xl/workbook.xml':
+    '<workbook xmlns="{0}" xmlns:r="{1}"><sheets><sheet name="Hosts" '
+    'sheetId="1" r:id="rId1"/></sheets></workbook>'.format(MAIN, RELS),
+    'xl/_rels/workbook.xml.rels':
+    '<Relationships xmlns="{0}"><Relationship Id="rId1" '
+    'Type="{1}/worksheet" Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="{1}/sharedStrings" '
+    'Target="strings/table.xml"/></Relationships>'.format(PACKAGE_RELS, RELS),
+    'xl/worksheets/sheet1.xml':
+    '<worksheet xmlns="{0}"><sheetData><row r="1">'
+    '<c r="A1" t="s"><v>1</v></c><c r="B1" t="s"><v>0</v></c>'
+    '</row></sheetData></worksheet>'.format(MAIN),
+    'xl/strings/table.xml':
+    '<sst xmlns="{0}"><si><t>h1</t></si><si><t>host</t></si>'
+    '</sst>'.format(MAIN),
+}
+
+
+def write_workbook(path, date1904=False):
+    wb = Workbook()
+    if date1904:
+        wb.epoch = datetime.datetime(1904, 1, 1)
+    for row in ROWS:
+        wb.active.append(row)
+    wb.active['C3'].number_format = '[h]:mm:ss'
+    wb.save(path)
+
+
+def read_values(reader, path):
+    wb = reader(path)
+    values = [
+        tuple(row)
+        for row in wb[wb.sheetnames[0]].iter_rows(values_only=True)
+    ]
+    wb.close()
+    return values
+
+
+def test_dates_read_as_openpyxl(tmp_path):
+    for date1904 in (False, True):
+        path = str(tmp_path / 'dates{}.xlsx'.format(int(date1904)))
+        write_workbook(path, date1904)
+        expected = read_values(
+            lambda path: load_workbook(path, read_only=True), path)
+        assert isinstance(expected[1][1], datetime.datetime)
+        assert isinstance(expected[2][2], datetime.timedelta)
+        assert read_values(XlsxReader, path) == expected
+
+
+def test_shared_strings_from_workbook_relations(tmp_path):
+    """ The shared strings part is found through its relation """
+    path = str(tmp_path / 'strings.xlsx')
+    with zipfile.ZipFile(path, 'w') as archive:
+        for name, data in PARTS.items():
+            archive.writestr(name, data)
+    reader = XlsxReader(path)
+    ws = reader['Hosts']
+    assert list(ws.iter_rows()) == [('host', 'h1')]
+    reader.close()
+
+
+def test_engines_read_the_same_data(tmp_path, monkeypatch):
+    """ Validation dumps the data in the working directory """
+    monkeypatch.chdir(tmp_path)
+    package = generate_package(str(tmp_path), racks=2, hosts_per_rack=4)
+    data = {}
+    for engine in ('openpyxl', 'xml'):
+        parser = ExcelParser([package['excel']], package['spec'],
+                             engine=engine)
+        data[engine] = parser.get_data()
+        parser.close()
+    assert data['xml'] == data['openpyxl']
+    assert len(data['xml']['ipmi_data'][0]) == 8
@@ -0,0 +1,187 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+import yaml
+from tugboat.parser_engine.utils.design_rules import load_global_config
+from tugboat.parser_engine.generate_intermediary import ProcessInputFiles
+from tugboat.parser_engine.utils.data_cache import ParsedDataCache
+from tugboat.site_processors.site_processor import get_environment
+from tugboat.site_processors.site_processor import SiteProcessor
+
+# Columns of the batch result table, as (title, result key)
+RESULT_COLUMNS = (('SITE', 'name'), ('STATUS', 'status'),
+                  ('INTERMEDIARY', 'intermediary'), ('MANIFESTS',
+                                                     'manifests'),
+                  ('TOTAL', 'total'), ('ERROR', 'error'))
+
+
+def load_batch_manifest(manifest_file):
+    """
+    Read the list of sites of a batch. Each site has a name, its excel
+    files, its excel spec (file or directory) and its site config, plus an
+    optional output_dir (default: the site name) and baseline intermediary.
+    Relative paths are relative to the manifest file
+    """
+    with open(manifest_file, 'r') as f:
+        manifest = yaml.safe_load(f.read()) or {}
+    base_dir = os.path.dirname(os.path.abspath(manifest_file))
+
+    def resolve(path):
+        return os.path.join(base_dir, os.path.expanduser(str(path)))
+
+    sites = []
+    for i, site in enumerate(manifest.get('sites') or []):
+        site = dict(site)
+        site.setdefault('name', 'site{}'.format(i + 1))
+        if isinstance(site.get('excel'), str):
+            site['excel'] = [site['excel']]
+        site['excel'] = [resolve(path) for path in site.get('excel') or []]
+        for key in ('spec', 'site_config', 'baseline'):
+            if site.get(key):
+                site[key] = resolve(site[key])
+        site['output_dir'] = resolve(site.get('output_dir') or site['name'])
+        sites.append(site)
+    return sites
+
+
+def get_cache_dir(options):
+    """ Directory of the caches, None with no_cache """
+    if options['no_cache']:
+        return None
+    return ParsedDataCache(options['cache_dir']).cache_dir
+
+
+def warm_up(options):
+    """
+    Load what every site needs once per worker process instead of once per
+    site
+    """
+    load_global_config()
+    if options['manifests']:
+        get_environment(get_cache_dir(options))
+
+
+def process_site(site, options):
+    """
+    Generate the intermediary, and the manifests if options['manifests'],
+    of one site in its output directory. Never raises: failures are
+    returned in the result
+    """
+    logger = logging.getLogger(__name__)
+    result = {
+        'name': site['name'],
+        'status': 'failed',
+        'intermediary': None,
+        'manifests': None,
+        'total': None,
+        'error': '',
+    }
+    start = time.time()
+    cwd = os.getcwd()
+    try:
+        for key in ('excel', 'spec', 'site_config'):
+            if not site.get(key):
+                raise ValueError("'{}' missing from the batch manifest".format(
+                    key))
+        cache = None
+        cache_dir = get_cache_dir(options)
+        if cache_dir is not None:
+            cache = ParsedDataCache(cache_dir)
+        os.makedirs(site['output_dir'], exist_ok=True)
+        """ Outputs are written to the current directory """
+        os.chdir(site['output_dir'])
+        process_input_ob = ProcessInputFiles(
+            site['excel'], site['spec'], cache, 1, options['xlsx_engine'],
+            options['detect_extent'])
+        intermediary_yaml = process_input_ob.generate_intermediary_file(
+            site['site_config'], site.get('baseline'),
+            options['intermediary_format'])
+        result['intermediary'] = time.time() - start
+        if options['manifests']:
+            manifests_start = time.time()
+            SiteProcessor(intermediary_yaml, cache_dir,
+                          options['render_jobs']).render_template()
+            result['manifests'] = time.time() - manifests_start
+        result['status'] = 'ok'
+    except (Exception, SystemExit) as error:
+        """ Parsing errors exit, that must not end the whole batch """
+        result['error'] = str(error) or type(error).__name__
+        logger.error("Site %s failed:\n%s", site['name'],
+                     traceback.format_exc())
+    finally:
+        os.chdir(cwd)
+    result['total'] = time.time() - start
+    return result
+
+
+def run_batch(sites, options, jobs=1):
+    """
+    Process sites, up to jobs at a time in worker processes. Returns one
+    result per site, in the order of sites
+    """
+    warm_up(options)
+    if jobs <= 1 or len(sites) <= 1:
+        return [process_site(site, options) for site in sites]
+    results = []
+    with ProcessPoolExecutor(
+            max_workers=min(jobs, len(sites)),
+            initializer=warm_up,
+            initargs=(options, )) as executor:
+        futures = [
+            executor.submit(process_site, site, options) for site in sites
+        ]
+        for site, future in zip(sites, futures):
+            try:
+                results.append(future.result())
+            except Exception as error:
+                """ The worker itself died """
+                results.append({
+                    'name': site['name'],
+                    'status': 'failed',
+                    'intermediary': None,
+                    'manifests': None,
+                    'total': None,
+                    'error': str(error) or type(error).__name__,
+                })
+    return results
+
+
+def format_results(results):
+    """ Results as a plain text table """
+
+    def cell(result, key):
+        value = result[key]
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return '{:.2f}s'.format(value)
+        return str(value).splitlines()[0] if value else ''
+
+    rows = [[title for title, _ in RESULT_COLUMNS]]
+    for result in results:
+        rows.append([cell(result, key) for _, key in RESULT_COLUMNS])
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = [
+        '  '.join(value.ljust(width)
+                  for value, width in zip(row, widths)).rstrip()
+        for row in rows
+    ]
+    failed = sum(1 for result in results if result['status'] != 'ok')
+    lines.append('{} sites, {} failed'.format(len(results), failed))
+    return '\n'.join(lines)
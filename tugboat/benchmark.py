@@ -0,0 +1,212 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from collections import OrderedDict
+import click
+from tugboat.parser_engine.generate_intermediary import ProcessInputFiles
+from tugboat.parser_engine.utils.data_cache import get_tugboat_version
+from tugboat.parser_engine.utils.workbook import XLSX_ENGINES
+from tugboat.site_processors.site_processor import SiteProcessor
+from tugboat.synthetic import generate_package
+from tugboat.synthetic import MAX_HOSTS
+from tugboat.synthetic import MAX_RACKS
+
+# Racks of the default benchmark sizes
+DEFAULT_RACKS = (2, 20, MAX_RACKS)
+
+STAGES = ('parse', 'intermediary', 'render')
+
+
+def run_stages(package, output_dir, jobs=1, xlsx_engine='openpyxl',
+               trace=False, render_jobs=1):
+    """
+    Parse the package, generate its intermediary and render its manifests
+    in output_dir. Returns the wall time of every stage and, with trace,
+    the peak memory allocated by the stage
+    """
+    process_input_ob = ProcessInputFiles([package['excel']], package['spec'],
+                                         None, jobs, xlsx_engine)
+    process_input_ob.apply_design_rules(package['site_config'])
+
+    def generate_intermediary():
+        process_input_ob.generate_intermediary_yaml()
+        process_input_ob.dump_intermediary_file()
+
+    def render():
+        SiteProcessor(process_input_ob.intermediary_yaml,
+                      render_jobs=render_jobs).render_template()
+
+    functions = {
+        'parse': process_input_ob.get_parsed_raw_data_from_excel,
+        'intermediary': generate_intermediary,
+        'render': render,
+    }
+    results = OrderedDict()
+    cwd = os.getcwd()
+    """ Outputs are written to the current directory """
+    os.chdir(output_dir)
+    try:
+        for stage in STAGES:
+            if trace:
+                tracemalloc.start()
+            start = time.time()
+            functions[stage]()
+            results[stage] = {'seconds': time.time() - start}
+            if trace:
+                results[stage]['peak_bytes'] = \
+                    tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+    finally:
+        os.chdir(cwd)
+    return results
+
+
+def run_benchmark(work_dir, racks, hosts_per_rack, jobs=1,
+                  xlsx_engine='openpyxl', render_jobs=1):
+    """
+    Benchmark a synthetic site of racks racks of hosts_per_rack hosts.
+    Stages are timed without memory tracing, which slows them down, then
+    run again to measure their peak memory. Each run writes to an empty
+    directory: the output index would otherwise skip every manifest
+    rendered by the previous one
+    """
+    site_dir = os.path.join(work_dir, 'r{}x{}'.format(racks, hosts_per_rack))
+    start = time.time()
+    package = generate_package(site_dir, racks, hosts_per_rack)
+    generate_seconds = time.time() - start
+    output_dirs = {}
+    for name in ('timed', 'traced'):
+        output_dirs[name] = os.path.join(site_dir, name)
+        shutil.rmtree(output_dirs[name], ignore_errors=True)
+        os.makedirs(output_dirs[name])
+    timings = run_stages(package, output_dirs['timed'], jobs, xlsx_engine,
+                         render_jobs=render_jobs)
+    memory = run_stages(package, output_dirs['traced'], jobs, xlsx_engine,
+                        trace=True, render_jobs=render_jobs)
+    manifests = sum(
+        len([name for name in files if not name.startswith('.')])
+        for _, _, files in os.walk(
+            os.path.join(output_dirs['timed'], 'pegleg_manifests')))
+    stages = OrderedDict()
+    for stage in STAGES:
+        stages[stage] = {
+            'seconds': round(timings[stage]['seconds'], 4),
+            'peak_mb': round(memory[stage]['peak_bytes'] / 2**20, 2),
+        }
+    return OrderedDict([
+        ('racks', racks),
+        ('hosts_per_rack', hosts_per_rack),
+        ('hosts', racks * hosts_per_rack),
+        ('manifests', manifests),
+        ('generate_seconds', round(generate_seconds, 4)),
+        ('total_seconds',
+         round(sum(stage['seconds'] for stage in stages.values()), 4)),
+        ('stages', stages),
+    ])
+
+
+@click.command()
+@click.option(
+    '--racks',
+    '-r',
+    multiple=True,
+    type=click.IntRange(1, MAX_RACKS),
+    help='Number of racks of a benchmarked site, repeat for several sites \
+    [default: {}]'.format(', '.join(str(racks) for racks in DEFAULT_RACKS)))
+@click.option(
+    '--hosts',
+    '-n',
+    'hosts_per_rack',
+    default=20,
+    type=click.IntRange(1, MAX_HOSTS),
+    show_default=True,
+    help='Number of hosts per rack')
+@click.option(
+    '--jobs',
+    'jobs',
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help='Processes reading the excel files')
+@click.option(
+    '--render-jobs',
+    'render_jobs',
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help='Processes rendering the manifest templates')
+@click.option(
+    '--xlsx-engine',
+    'xlsx_engine',
+    default='openpyxl',
+    type=click.Choice(XLSX_ENGINES),
+    show_default=True,
+    help='Engine reading the excel files')
+@click.option(
+    '--work-dir',
+    'work_dir',
+    type=click.Path(file_okay=False),
+    help='Keep the synthetic packages and their outputs in this directory \
+    instead of a temporary one')
+@click.option(
+    '--output',
+    '-o',
+    type=click.Path(dir_okay=False),
+    help='Write the JSON report to this file instead of the standard output')
+def main(racks, hosts_per_rack, jobs, render_jobs, xlsx_engine, work_dir,
+         output):
+    """
+    Time parsing, intermediary generation and manifest rendering of
+    synthetic sites, and measure the peak memory of every stage
+    """
+    temporary_dir = None
+    if work_dir is None:
+        temporary_dir = tempfile.mkdtemp(prefix='tugboat-benchmark-')
+        work_dir = temporary_dir
+    try:
+        results = [
+            run_benchmark(
+                os.path.abspath(work_dir), site_racks, hosts_per_rack, jobs,
+                xlsx_engine, render_jobs)
+            for site_racks in racks or DEFAULT_RACKS
+        ]
+    finally:
+        if temporary_dir is not None:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+    report = OrderedDict([
+        ('tugboat_version', get_tugboat_version()),
+        ('python', platform.python_version()),
+        ('platform', platform.platform()),
+        ('jobs', jobs),
+        ('render_jobs', render_jobs),
+        ('xlsx_engine', xlsx_engine),
+        ('results', results),
+    ])
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
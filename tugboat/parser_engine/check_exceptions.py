@@ -18,12 +18,18 @@ class BaseError(Exception):
 
 
 class NotEnoughIp(BaseError):
-    def __init__(self, cidr, total_nodes):
+    def __init__(self, cidr, total_nodes, shortfalls=()):
         self.cidr = cidr
         self.total_nodes = total_nodes
+        """ Descriptions of every network the site runs short of """
+        self.shortfalls = list(shortfalls)
 
     def display_error(self):
-        print('{} can not handle {} nodes'.format(self.cidr, self.total_nodes))
+        if not self.shortfalls:
+            print('{} can not handle {} nodes'.format(self.cidr,
+                                                      self.total_nodes))
+            return
+        print('Not enough IPs:\n{}'.format('\n'.join(self.shortfalls)))
 
 
 class NoSpecMatched(BaseError):
@@ -31,5 +37,13 @@ class NoSpecMatched(BaseError):
         self.specs = excel_specs
 
     def display_error(self):
-        print('No spec matched. Following are the available specs:\n'.format(
-            self.specs))
+        print('No spec matched. Following are the available specs:\n{}'.format(
+            '\n'.join(self.specs['specs'])))
+
+
+class InvalidDesignRules(BaseError):
+    def __init__(self, problems):
+        self.problems = problems
+
+    def display_error(self):
+        print('Invalid design rules:\n{}'.format('\n'.join(self.problems)))
@@ -12,23 +12,55 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import yaml
 import re
 import logging
 import pprint
-import pkg_resources
-import netaddr
+import sys
 from .base import ParserEngine
+from .check_exceptions import (
+    InvalidDesignRules,
+    NotEnoughIp,
+)
+from .utils.baseline import IntermediaryBaseline
+from .utils.design_rules import compile_design_rules
 from .utils.excel_parser import ExcelParser
+from .utils.host_index import HostIndex
+from .utils.intermediary_codec import dump_intermediary
+from .utils.intermediary_codec import get_codec
+from .utils.ip_index import address_int
+from .utils.ip_index import IPIndex
+from .utils.ipam import AddressAllocator
+from .utils.ipam import get_subnet
+from .utils.records import AddressTable
+from .utils.records import HostRecord
+from .utils.records import NetworkRanges
+from .utils.stage_graph import Stage
+from .utils.stage_graph import StageGraph
 from collections import OrderedDict
 
 
 class ProcessInputFiles(ParserEngine):
-    def __init__(self, file_name, excel_specs):
-        """ Save file_name and exel_spec """
+    def __init__(self,
+                 file_name,
+                 excel_specs,
+                 cache=None,
+                 jobs=1,
+                 xlsx_engine='openpyxl',
+                 detect_extent=False):
+        """
+        Save file_name and exel_spec. cache is an optional
+        ParsedDataCache for the data parsed from the excel files, jobs the
+        number of processes used to read the excel files, xlsx_engine
+        the engine reading them and detect_extent whether the rows of host
+        and network data are detected instead of taken from the spec
+        """
         self.logger = logging.getLogger(__name__)
         self.file_name = file_name
         self.excel_specs = excel_specs
+        self.cache = cache
+        self.jobs = jobs
+        self.xlsx_engine = xlsx_engine
+        self.detect_extent = detect_extent
         self.prepare_data_structure_for_intermediary_yaml()
 
     @staticmethod
@@ -58,33 +90,76 @@ class ProcessInputFiles(ParserEngine):
             'assigned_subnets': {},
         }
         self.racks = OrderedDict()
+        self.host_index = None
+        self.hosts = OrderedDict()
+        self.addresses = None
+        self.baseline = None
         self.parsed_xl_data = {}
+        self.stages = StageGraph(self.get_stages())
+
+    def get_stages(self):
+        """
+        Stages of generate_intermediary_yaml. A stage requires the stages
+        whose output it reads, either from self or through
+        self.stages.result()
+        """
+        return [
+            Stage('design_spec', self.assign_design_spec_data, ()),
+            Stage('rack_data', self.get_rack_data, ('design_spec', )),
+            Stage('network_format', self.format_network_data,
+                  ('design_spec', )),
+            Stage('rackwise_subnet', self.get_rackwise_subnet,
+                  ('rack_data', 'network_format')),
+            Stage('network_index', self.build_network_index,
+                  ('design_spec', )),
+            Stage('capacity', self.plan_address_capacity,
+                  ('rack_data', 'rackwise_subnet', 'network_index')),
+            Stage('baseline', self.compare_with_baseline, ('rack_data', )),
+            Stage('private_ip', self.assign_private_ip_to_hosts,
+                  ('capacity', 'baseline')),
+            Stage('public_ip', self.assign_public_ip_to_host,
+                  ('capacity', 'baseline')),
+            Stage('host_type', self.categorize_hosts,
+                  ('rack_data', 'baseline')),
+            Stage('ip', self.assign_ip,
+                  ('private_ip', 'public_ip', 'host_type')),
+            Stage('change_summary', self.summarize_changes, ('ip', )),
+            Stage('oob_network', self.get_rackwise_oob_data,
+                  ('capacity', )),
+            Stage('oam_network', self.get_oam_network_data,
+                  ('rack_data', 'network_format')),
+            Stage('network', self.assign_network_data,
+                  ('ip', 'rackwise_subnet', 'oob_network', 'oam_network')),
+            Stage('address_check', self.check_address_conflicts,
+                  ('network', 'network_index')),
+            Stage('deployment', self.get_deployment_configuration, ()),
+            Stage('profiles', self.assign_racks_to_host_profile, ('ip', )),
+            Stage('region_name', self.assign_region_name, ('rack_data', )),
+            Stage('ceph', self.assign_ceph_data, ()),
+            Stage('conf', self.assign_conf_data, ('network', 'ceph')),
+            Stage('location', self.assign_location_data, ('design_spec', )),
+            Stage('sitetype', self.assign_sitetype, ()),
+            Stage('hw_profile', self.assign_hardware_profile,
+                  ('sitetype', )),
+        ]
 
     def apply_design_rules(self, site_config):
         """ The function applies global and site specific design rules to
         a common design rule
         """
-        """ Load and save global tugboat design rules.yaml """
-        global_config_dir = pkg_resources.resource_filename(
-            'tugboat', 'config/')
-        global_config_file = global_config_dir + 'global_config.yaml'
-        global_config_data = self.read_file(global_config_file)
-        global_config_yaml = yaml.safe_load(global_config_data)
-        """ Load site specific design rules """
-        site_config_data = self.read_file(site_config)
-        site_config_yaml = yaml.safe_load(site_config_data)
-        """ combine global and site design rules """
-        rules_data = {}
-        rules_data.update(global_config_yaml)
-        rules_data.update(site_config_yaml)
-
-        self.rules_data = rules_data
-
-        self.HOST_TYPES = self.rules_data['host_types']
-        self.PRIVATE_NETWORK_TYPES = self.rules_data['private_network_types']
-        self.IPS_TO_LEAVE = self.rules_data['ips_to_leave']
-        self.OOB_IPS_TO_LEAVE = self.rules_data['oob_ips_to_leave']
-        self.sitetype = self.rules_data['sitetype']
+        """ Global rules with the site rules layered on top, compiled once """
+        cache_dir = self.cache.cache_dir if self.cache is not None else None
+        try:
+            self.rules_data = compile_design_rules(site_config, cache_dir)
+        except InvalidDesignRules as error:
+            error.display_error()
+            sys.exit("Tugboat exited!!")
+
+        self.HOST_TYPES = self.rules_data.host_types
+        self.PRIVATE_NETWORK_TYPES = self.rules_data.private_network_types
+        self.IPS_TO_LEAVE = self.rules_data.ips_to_leave
+        self.OOB_IPS_TO_LEAVE = self.rules_data.oob_ips_to_leave
+        self.sitetype = self.rules_data.sitetype
 
     def get_parsed_raw_data_from_excel(self):
         """
@@ -92,8 +167,19 @@ class ProcessInputFiles(ParserEngine):
         and excel specs. The excel specs contains metadata for reading
         the excel information
         """
-        parser = ExcelParser(self.file_name, self.excel_specs)
+        if self.cache is not None:
+            cache_key = self.cache.get_key(self.file_name, self.excel_specs,
+                                           self.detect_extent,
+                                           self.xlsx_engine)
+            self.parsed_xl_data = self.cache.get(cache_key)
+            if self.parsed_xl_data is not None:
+                return
+        parser = ExcelParser(self.file_name, self.excel_specs, self.jobs,
+                             self.xlsx_engine, self.detect_extent)
         self.parsed_xl_data = parser.get_data()
+        parser.close()
+        if self.cache is not None:
+            self.cache.put(cache_key, self.parsed_xl_data)
 
     def get_private_network_data(self, raw_data):
         """
@@ -190,36 +276,24 @@ class ProcessInputFiles(ParserEngine):
                 self.dns_ntp_ldap_data[type_]['base_url'] = base_url
                 self.dns_ntp_ldap_data[type_]['url'] = url
 
-    def get_rack(self, host):
-        """
-        Get rack id  from the rack string extracted
-        from xl
-        """
-        rack_pattern = '\w.*(r\d+)\w.*'
-        rack = re.findall(rack_pattern, host)[0]
-        if not self.region_name:
-            self.region_name = host.split(rack)[0]
-        return rack
-
     def categorize_hosts(self):
         """
         Categorize host as genesis, controller and compute based on
         the hostname string extracted from xl
         """
-        """ loop through IPMI data and determine hosttype """
-        is_genesis = False
-        sitetype = self.sitetype
-        ctrl_profile_type = \
-        self.rules_data['hardware_profile'][sitetype]['profile_name']['ctrl']
-        for host in sorted(self.ipmi_data.keys()):
-            if (self.ipmi_data[host]['host_profile'] == ctrl_profile_type):
-                if not is_genesis:
-                    self.host_type[host] = 'genesis'
-                    is_genesis = True
-                else:
-                    self.host_type[host] = 'controller'
-            else:
-                self.host_type[host] = 'compute'
+        ctrl_profile_type = self.rules_data.ctrl_profile
+        host_profiles = {
+            host: record.host_profile
+            for host, record in self.hosts.items()
+        }
+        genesis = None
+        if self.baseline is not None and \
+                self.baseline.genesis in self.baseline.unchanged:
+            genesis = self.baseline.genesis
+        self.host_type = self.host_index.categorize(
+            host_profiles, ctrl_profile_type, genesis)
+        for host, role in self.host_type.items():
+            self.hosts[host].type = role
 
     def get_rackwise_subnet(self):
         """
@@ -229,9 +303,7 @@ class ProcessInputFiles(ParserEngine):
         self.logger.info("Getting rackwise subnet")
         rackwise_subnets = {}
         rackwise_subnets['common'] = {}
-        self.format_network_data()
-        racks = [self.racks[rack] for rack in self.racks]
-        sorted_racks = sorted(racks)
+        sorted_racks = sorted(self.racks.values())
         for rack in sorted_racks:
             rackwise_subnets[rack] = {}
         for net_type in self.private_network_data:
@@ -239,7 +311,7 @@ class ProcessInputFiles(ParserEngine):
                 i = 0
                 subnets = self.private_network_data[net_type]['subnet']
                 for subnet in subnets:
-                    subnet = netaddr.IPNetwork(subnet)
+                    subnet = get_subnet(subnet)
                     if net_type not in rackwise_subnets[sorted_racks[i]]:
                         rackwise_subnets[sorted_racks[i]][net_type] = ''
                     rackwise_subnets[sorted_racks[i]][net_type] = subnet
@@ -247,122 +319,165 @@ class ProcessInputFiles(ParserEngine):
                     if i >= len(sorted_racks):
                         break
             else:
-                rackwise_subnets['common'][net_type] = netaddr.IPNetwork(
+                rackwise_subnets['common'][net_type] = get_subnet(
                     self.private_network_data[net_type]['subnet'][0])
         self.logger.debug("rackwise subnets:\n%s",
                           pprint.pformat(rackwise_subnets))
         return rackwise_subnets
 
-    def get_rackwise_hosts(self):
-        """ Mapping hosts with rack ids """
-        rackwise_hosts = {}
-        for rack in self.racks:
-            if rack not in rackwise_hosts:
-                rackwise_hosts[self.racks[rack]] = []
-            for host in self.hostnames:
-                if rack in host:
-                    rackwise_hosts[self.racks[rack]].append(host)
-        self.logger.debug("rackwise hosts:\n%s",
-                          pprint.pformat(rackwise_hosts))
-        return rackwise_hosts
-
     def assign_private_ip_to_hosts(self):
         """ Assigning private IP to Hosts """
         self.logger.info("Assigning private IP to Hosts")
-        rackwise_hosts = self.get_rackwise_hosts()
-        rackwise_subnets = self.get_rackwise_subnet()
-        sorted_racks = sorted(self.racks)
-        j = 0
-        for rack in sorted_racks:
-            rack = self.racks[rack]
+        rackwise_hosts = self.host_index.rack_hosts
+        rackwise_subnets = self.stages.result('rackwise_subnet')
+        for rack in self.host_index.sorted_racks:
             self.network_data[rack] = {}
             for net_type in self.private_network_data:
                 if not self.private_network_data[net_type]['is_common']:
                     subnet = rackwise_subnets[rack][net_type]
-                    ips = list(subnet)
-                    for i in range(len(rackwise_hosts[rack])):
-                        self.ipmi_data[rackwise_hosts[rack]
-                                       [i]][net_type] = str(
-                                           ips[i + self.IPS_TO_LEAVE + 1])
-                    mid = len(ips) // 2
+                    ranges = NetworkRanges(
+                        subnet, self.IPS_TO_LEAVE, dhcp=net_type == 'pxe')
+                    self.allocate_host_addresses(rackwise_hosts[rack],
+                                                 net_type,
+                                                 AddressAllocator(ranges))
                     if net_type not in self.network_data['assigned_subnets']:
                         self.network_data['assigned_subnets'][net_type] = []
                     self.network_data['assigned_subnets'][net_type].append(
                         str(subnet))
                 else:
-                    subnet = rackwise_subnets['common'][net_type]
-                    ips = list(subnet)
-                    for i in range(len(rackwise_hosts[rack])):
-                        self.ipmi_data[rackwise_hosts[rack]
-                                       [i]][net_type] = str(
-                                           ips[i + self.IPS_TO_LEAVE + 1 + j])
-                    mid = len(ips) // 2
-                static_start = str(ips[self.IPS_TO_LEAVE + 1])
-                reserved_start = str(ips[1])
-                reserved_end = str(ips[self.IPS_TO_LEAVE])
-                static_end = str(ips[-2])
-                self.network_data[rack][net_type] = {}
-                if net_type == 'pxe':
-                    static_end = str(ips[mid - 1])
-                    dhcp_start = str(ips[mid])
-                    dhcp_end = str(ips[-2])
-                    self.network_data[rack][net_type][
-                        'dhcp_start'] = dhcp_start
-                    self.network_data[rack][net_type]['dhcp_end'] = dhcp_end
-                self.network_data[rack][net_type][
-                    'static_start'] = static_start
-                self.network_data[rack][net_type]['static_end'] = static_end
-                self.network_data[rack][net_type][
-                    'reserved_start'] = reserved_start
-                self.network_data[rack][net_type][
-                    'reserved_end'] = reserved_end
-            j += i + 1
+                    ranges = NetworkRanges(
+                        rackwise_subnets['common'][net_type],
+                        self.IPS_TO_LEAVE,
+                        dhcp=net_type == 'pxe')
+                self.network_data[rack][net_type] = ranges
+        """ Hosts of all the racks share the common networks """
+        for net_type, subnet in rackwise_subnets['common'].items():
+            self.allocate_host_addresses(
+                self.get_sorted_hosts(), net_type,
+                AddressAllocator(
+                    NetworkRanges(
+                        subnet, self.IPS_TO_LEAVE, dhcp=net_type == 'pxe')))
 
     def assign_public_ip_to_host(self):
         """ Assigning public IP to Hosts """
         self.logger.info("Assigning public IP to Hosts")
-        rackwise_hosts = self.get_rackwise_hosts()
-        subnet = netaddr.IPNetwork(self.public_network_data['oam']['ip'])
-        ips = list(subnet)
-        j = 0
-        for rack in sorted(self.racks.keys()):
-            rack = self.racks[rack]
-            for i in range(len(rackwise_hosts[rack])):
-                self.ipmi_data[rackwise_hosts[rack][i]]['oam'] = str(
-                    ips[j + self.IPS_TO_LEAVE + 1])
-                j += 1
+        subnet = get_subnet(self.public_network_data['oam']['ip'])
+        self.allocate_host_addresses(
+            self.get_sorted_hosts(), 'oam',
+            AddressAllocator(
+                NetworkRanges(subnet, self.IPS_TO_LEAVE, static_end=-1)))
+
+    def get_sorted_hosts(self):
+        """ Hosts of all the racks, rack after rack """
+        return [
+            host for rack in self.host_index.sorted_racks
+            for host in self.host_index.rack_hosts[rack]
+        ]
+
+    def allocate_host_addresses(self, hosts, net_type, allocator):
+        """
+        Give each host an address of net_type from allocator, in order.
+        Hosts unchanged since the baseline keep their previous address as
+        long as it is still in the static range of the network
+        """
+        self.addresses.add_column(net_type, allocator.subnet.version)
+        values = {}
+        if self.baseline is not None:
+            for host in hosts:
+                previous = self.baseline.address(host, net_type)
+                if previous is not None:
+                    value = allocator.reserve(previous)
+                    if value is not None:
+                        values[host] = value
+        for host in hosts:
+            if host not in values:
+                values[host] = allocator.allocate()
+            self.addresses.set(self.hosts[host].row, net_type, values[host])
+
+    def load_baseline(self, intermediary_file):
+        """
+        Use a previously generated intermediary as baseline: hosts whose
+        excel rows did not change keep their addresses
+        """
+        self.logger.info("Loading baseline intermediary %s",
+                         intermediary_file)
+        self.baseline = IntermediaryBaseline.load(intermediary_file)
+
+    def compare_with_baseline(self):
+        """ Sort hosts into added, changed and unchanged ones """
+        if self.baseline is None:
+            return
+        self.baseline.compare({
+            host: {
+                'rack': record.rack,
+                'ipmi_address': record.ipmi_address,
+                'host_profile': record.host_profile,
+            }
+            for host, record in self.hosts.items()
+        })
+
+    def summarize_changes(self):
+        """ Log the changes from the baseline """
+        if self.baseline is None:
+            return
+        self.logger.info("Changes from the baseline intermediary:\n%s",
+                         '\n'.join(self.baseline.summary(
+                             self.get_baremetal())))
 
     def get_rack_data(self):
-        """ Format rack name """
+        """ Index the hosts by rack and format rack names """
         self.logger.info("Getting rack data")
+        self.host_index = HostIndex(self.hostnames)
+        self.racks = self.host_index.racks
+        if not self.region_name:
+            self.region_name = self.host_index.region_name
+        self.logger.debug("rackwise hosts:\n%s",
+                          pprint.pformat(self.host_index.rack_hosts))
+        self.hosts = OrderedDict()
         for host in self.hostnames:
-            rack = self.get_rack(host)
-            self.racks[rack] = rack.replace('r', 'rack')
+            if host not in self.hosts:
+                self.hosts[host] = HostRecord(
+                    host, self.host_index.host_rack[host], len(self.hosts),
+                    self.ipmi_data[host]['ipmi_address'],
+                    self.ipmi_data[host]['host_profile'])
+        self.addresses = AddressTable(len(self.hosts))
 
     def assign_ip(self):
+        """
+        Find the genesis host. The baremetal section is only built from the
+        host records by get_baremetal()
+        """
         self.logger.info("Assign IP")
-        self.categorize_hosts()
-        rackwise_hosts = self.get_rackwise_hosts()
-        tmp_data = {}
-        for rack in sorted(self.racks.keys()):
-            rack = self.racks[rack]
-            tmp_data[rack] = {}
-            for host in rackwise_hosts[rack]:
-                ip_ = {}
-                tmp_data[rack][host] = {}
-                ip_['oob'] = self.ipmi_data[host]['ipmi_address']
-                ip_['oam'] = self.ipmi_data[host]['oam']
-                for net_type in self.private_network_data:
-                    ip_[net_type] = self.ipmi_data[host][net_type]
-                tmp_data[rack][host]['ip'] = ip_
-                tmp_data[rack][host]['type'] = self.host_type[host]
-                if self.host_type[host] == 'genesis':
-                    self.dhcp_relay = tmp_data[rack][host]['ip']['pxe']
-                    self.genesis_rack = rack
-                tmp_data[rack][host]['host_profile'] = self.ipmi_data[host][
-                    'host_profile']
-                tmp_data[rack][host]['rack'] = rack
-        self.data['baremetal'] = tmp_data
+        for host in self.get_sorted_hosts():
+            record = self.hosts[host]
+            if record.type == 'genesis':
+                self.dhcp_relay = self.addresses.address(record.row, 'pxe')
+                self.genesis_rack = record.rack
+
+    def get_host_ips(self, host):
+        """ Addresses of host by network type, as strings """
+        record = self.hosts[host]
+        ip_ = {}
+        ip_['oob'] = record.ipmi_address
+        ip_['oam'] = self.addresses.address(record.row, 'oam')
+        for net_type in self.private_network_data:
+            ip_[net_type] = self.addresses.address(record.row, net_type)
+        return ip_
+
+    def get_baremetal(self):
+        """ Baremetal section of the intermediary, from the host records """
+        baremetal = {}
+        for rack in self.host_index.sorted_racks:
+            baremetal[rack] = {}
+            for host in self.host_index.rack_hosts[rack]:
+                record = self.hosts[host]
+                baremetal[rack][host] = {
+                    'ip': self.get_host_ips(host),
+                    'type': record.type,
+                    'host_profile': record.host_profile,
+                    'rack': rack,
+                }
+        return baremetal
 
     def assign_region_name(self):
         """ Assign region name """
@@ -380,23 +495,15 @@ class ProcessInputFiles(ParserEngine):
         self.data['region_name'] = self.region_name
         nw = self.public_network_data['oam']['ip']
         vlan = self.public_network_data['oam']['vlan']
-        subnet = netaddr.IPNetwork(nw)
-        ips = list(subnet)
-        gw = str(ips[self.rules_data['gateway_offset']])
-        static_start = str(ips[self.IPS_TO_LEAVE + 1])
-        static_end = str(ips[-1])
-        reserved_start = str(ips[1])
-        reserved_end = str(ips[self.IPS_TO_LEAVE])
-        return {
+        subnet = get_subnet(nw)
+        oam_data = {
             'nw': nw,
-            'gw': gw,
+            'gw': subnet.address(self.rules_data.gateway_offset),
             'vlan': vlan,
             'routes': ['0.0.0.0/0'],
-            'static_start': static_start,
-            'static_end': static_end,
-            'reserved_start': reserved_start,
-            'reserved_end': reserved_end,
         }
+        oam_data.update(subnet.ranges(self.IPS_TO_LEAVE, static_end=-1))
+        return oam_data
 
     def get_rackwise_oob_data(self):
         """
@@ -404,44 +511,192 @@ class ProcessInputFiles(ParserEngine):
         for e.g gateway, ip address ranges etc
         """
         self.logger.info("Extracting oob data per rack")
-        oob_data = self.public_network_data['oob']
         oob_network_data = {}
-        oob_all_subnets = [
-            netaddr.IPNetwork(subnet) for subnet in oob_data['subnets']
-        ]
         assigned_subnets = []
-        rackwise_hosts = self.get_rackwise_hosts()
+        rackwise_hosts = self.host_index.rack_hosts
         rackwise_oob_subnets = {}
         for rack in rackwise_hosts:
-            host = rackwise_hosts[rack][0]
-            host_oob_ip = self.ipmi_data[host]['ipmi_address']
-            for subnet in oob_all_subnets:
-                if host_oob_ip in subnet:
-                    rackwise_oob_subnets[rack] = subnet
-                    assigned_subnets.append(subnet)
-                    break
+            subnet = self.find_oob_subnet(rackwise_hosts[rack][0])
+            if subnet is not None:
+                rackwise_oob_subnets[rack] = subnet
+                assigned_subnets.append(subnet)
         for rack in rackwise_oob_subnets:
             nw = rackwise_oob_subnets[rack]
-            ips = list(nw)
-            gw = str(ips[self.rules_data['gateway_offset']])
             routes = [
                 str(subnet) for subnet in assigned_subnets if subnet != nw
             ]
-            static_start = str(ips[self.OOB_IPS_TO_LEAVE])
-            static_end = str(ips[-1])
-            reserved_start = str(ips[1])
-            reserved_end = str(ips[self.OOB_IPS_TO_LEAVE - 1])
             oob_network_data[rack] = {
                 'nw': str(nw),
-                'gw': gw,
+                'gw': nw.address(self.rules_data.gateway_offset),
                 'routes': routes,
-                'static_start': static_start,
-                'static_end': static_end,
-                'reserved_start': reserved_start,
-                'reserved_end': reserved_end,
             }
+            oob_network_data[rack].update(
+                nw.ranges(self.OOB_IPS_TO_LEAVE - 1, static_end=-1))
         return oob_network_data
 
+    def find_oob_subnet(self, host):
+        """ OOB subnet of the ipmi address of host, None if there is none """
+        oob_subnets = [
+            str(get_subnet(subnet))
+            for subnet in self.public_network_data['oob']['subnets']
+        ]
+        subnets = [
+            cidr for net_type, cidr in self.stages.result(
+                'network_index').lookup(self.hosts[host].ipmi_address)
+            if net_type == 'oob'
+        ]
+        if not subnets:
+            return None
+        """ The first listed one when oob subnets overlap """
+        return get_subnet(min(subnets, key=oob_subnets.index))
+
+    def plan_address_capacity(self):
+        """
+        Check, before any address is assigned, that every subnet addresses
+        are allocated from has room for its hosts in its static range.
+        Raises NotEnoughIp listing all the shortfalls. Returns the planned
+        (network, rack, cidr, hosts, capacity), rack being 'common' for
+        networks shared by all racks. OOB addresses come from the excel
+        files and are never allocated: a rack without an OOB subnet, or
+        with one too small, is only warned about
+        """
+        self.logger.info("Planning address capacity")
+        rackwise_hosts = self.host_index.rack_hosts
+        rackwise_subnets = self.stages.result('rackwise_subnet')
+        total_hosts = len(self.hostnames)
+        plan = []
+        for rack in self.host_index.sorted_racks:
+            hosts = len(rackwise_hosts[rack])
+            for net_type in self.private_network_data:
+                if not self.private_network_data[net_type]['is_common']:
+                    subnet = rackwise_subnets[rack].get(net_type)
+                    plan.append((net_type, rack, subnet, hosts,
+                                 subnet and subnet.capacity(
+                                     self.IPS_TO_LEAVE,
+                                     dhcp=net_type == 'pxe')))
+            subnet = self.find_oob_subnet(rackwise_hosts[rack][0])
+            if subnet is None:
+                self.logger.warning("%s: no oob subnet for %d nodes", rack,
+                                    hosts)
+            elif subnet.capacity(self.OOB_IPS_TO_LEAVE - 1,
+                                 static_end=-1) < hosts:
+                self.logger.warning(
+                    "%s: oob %s static range can not hold %d nodes", rack,
+                    subnet, hosts)
+        for net_type, subnet in rackwise_subnets['common'].items():
+            plan.append((net_type, 'common', subnet, total_hosts,
+                         subnet.capacity(
+                             self.IPS_TO_LEAVE, dhcp=net_type == 'pxe')))
+        subnet = get_subnet(self.public_network_data['oam']['ip'])
+        plan.append(('oam', 'common', subnet, total_hosts,
+                     subnet.capacity(self.IPS_TO_LEAVE, static_end=-1)))
+        shortfalls = [
+            entry for entry in plan if entry[2] is None or entry[3] > entry[4]
+        ]
+        if shortfalls:
+            messages = []
+            for net_type, rack, subnet, hosts, capacity in shortfalls:
+                if subnet is None:
+                    messages.append('{}: no {} subnet for {} nodes'.format(
+                        rack, net_type, hosts))
+                else:
+                    messages.append(
+                        '{}: {} {} can not handle {} nodes, room for {}'.
+                        format(rack, net_type, subnet, hosts, capacity))
+            net_type, rack, subnet, hosts, capacity = shortfalls[0]
+            raise NotEnoughIp(subnet and str(subnet), hosts, messages)
+        return plan
+
+    def build_network_index(self):
+        """
+        Index of the networks extracted from the excel files, with
+        (net_type, cidr) values
+        """
+        networks = [('oob', subnet)
+                    for subnet in self.public_network_data['oob']['subnets']]
+        networks.append(('oam', self.public_network_data['oam']['ip']))
+        networks.append(('ingress', self.public_network_data['ingress']))
+        for net_type in self.private_network_data:
+            subnets = self.private_network_data[net_type]['subnet']
+            if self.private_network_data[net_type]['is_common']:
+                subnets = subnets[:1]
+            networks.extend((net_type, subnet) for subnet in subnets)
+        network_index = IPIndex()
+        for net_type, subnet in networks:
+            network_index.add(subnet, (net_type, str(get_subnet(subnet))))
+        return network_index
+
+    def check_address_conflicts(self):
+        """
+        Warn about overlapping networks, overlapping reserved and DHCP
+        ranges, and host addresses outside of their networks, inside a
+        reserved or DHCP range or given more than once. Returns the
+        conflicts
+        """
+        network_index = self.stages.result('network_index')
+        conflicts = []
+        for value in network_index.values():
+            for other in network_index.overlaps(value[1]):
+                if value < other:
+                    conflicts.append('{} network {} overlaps {} network {}'.
+                                     format(value[0], value[1], *other))
+        network = self.data['network']
+        sections = [(net_type, network['common'][net_type])
+                    for net_type in network['common'] if net_type != 'oob']
+        sections.extend(('oob', section) for section in self.stages.result(
+            'oob_network').values())
+        for rack in network['rack']:
+            sections.extend((net_type, section)
+                            for net_type, section in network['rack']
+                            [rack].items() if isinstance(section, dict))
+        range_index = IPIndex()
+        for net_type, section in sections:
+            for kind in ('reserved', 'dhcp'):
+                if kind + '_start' not in section:
+                    continue
+                start = section[kind + '_start']
+                end = section[kind + '_end']
+                value = (kind, net_type, section['nw'])
+                for other in range_index.overlaps_range(start, end):
+                    conflicts.append(
+                        '{} range of {} network {} overlaps {} range of {} '
+                        'network {}'.format(*(value + other)))
+                range_index.add_range(start, end, value)
+        owners = {}
+        for rack in sorted(self.host_index.rack_hosts):
+            for host in sorted(self.host_index.rack_hosts[rack]):
+                record = self.hosts[host]
+                values = {'oob': address_int(record.ipmi_address)}
+                for net_type in self.addresses.columns:
+                    values[net_type] = self.addresses.value(
+                        record.row, net_type)
+                for net_type, value in sorted(values.items()):
+                    problems = []
+                    if value in owners:
+                        problems.append('is also the {} address of {}'.format(
+                            *owners[value]))
+                    else:
+                        owners[value] = (net_type, host)
+                    if not any(entry[0] == net_type for entry in
+                               network_index.lookup_value(*value)):
+                        problems.append(
+                            'is outside of the {} networks'.format(net_type))
+                    for kind, _, nw in range_index.lookup_value(*value):
+                        problems.append('is in the {} range of {}'.format(
+                            kind, nw))
+                    if not problems:
+                        continue
+                    if net_type == 'oob':
+                        address = record.ipmi_address
+                    else:
+                        address = self.addresses.address(record.row, net_type)
+                    conflicts.extend('{} address {} of {} {}'.format(
+                        net_type, address, host, problem)
+                                     for problem in problems)
+        for conflict in conflicts:
+            self.logger.warning("Address conflict: %s", conflict)
+        return conflicts
+
     def assign_design_spec_data(self):
         """ Assign Design Spec data to internal datastructures """
         self.logger.info("Assigning network data")
@@ -463,15 +718,20 @@ class ProcessInputFiles(ParserEngine):
         """
         self.logger.info("Assigning network data")
         rack_data = {}
-        rackwise_subnets = self.get_rackwise_subnet()
+        """ Filled in below, the stage output is left untouched """
+        rackwise_subnets = {
+            rack: dict(subnets)
+            for rack, subnets in self.stages.result('rackwise_subnet').items()
+        }
         common_subnets = {}
-        rackwise_oob_data = self.get_rackwise_oob_data()
+        rackwise_oob_data = self.stages.result('oob_network')
         for rack in rackwise_subnets:
             for net_type in rackwise_subnets[rack]:
                 if not self.private_network_data[net_type]['is_common']:
-                    ips = list(rackwise_subnets[rack][net_type])
-                    nw = str(rackwise_subnets[rack][net_type])
-                    gw = str(ips[self.rules_data['gateway_offset']])
+                    subnet = rackwise_subnets[rack][net_type]
+                    ranges = self.network_data[rack][net_type].as_dict()
+                    nw = str(subnet)
+                    gw = subnet.address(self.rules_data.gateway_offset)
                     routes = [
                         subnet for subnet in self.
                         network_data['assigned_subnets'][net_type]
@@ -487,25 +747,25 @@ class ProcessInputFiles(ParserEngine):
                         'routes':
                         routes,
                         'static_start':
-                        self.network_data[rack][net_type]['static_start'],
+                        ranges['static_start'],
                         'static_end':
-                        self.network_data[rack][net_type]['static_end'],
+                        ranges['static_end'],
                         'reserved_start':
-                        self.network_data[rack][net_type]['reserved_start'],
+                        ranges['reserved_start'],
                         'reserved_end':
-                        self.network_data[rack][net_type]['reserved_end'],
+                        ranges['reserved_end'],
                     }
                 else:
-                    ips = list(rackwise_subnets['common'][net_type])
-                    nw = str(rackwise_subnets['common'][net_type])
-                    gw = str(ips[self.rules_data['gateway_offset']])
+                    subnet = rackwise_subnets['common'][net_type]
+                    nw = str(subnet)
+                    gw = subnet.address(self.rules_data.gateway_offset)
                     routes = [
                         subnet for subnet in self.
                         private_network_data[net_type]['subnet']
                         if subnet != nw
                     ]
-                    racks = sorted(self.racks.keys())
-                    rack = self.racks[racks[0]]
+                    rack = self.host_index.sorted_racks[0]
+                    ranges = self.network_data[rack][net_type].as_dict()
                     common_subnets[net_type] = {
                         'nw':
                         nw,
@@ -516,23 +776,30 @@ class ProcessInputFiles(ParserEngine):
                         'vlan':
                         self.private_network_data[net_type]['vlan'],
                         'static_start':
-                        self.network_data[rack][net_type]['static_start'],
+                        ranges['static_start'],
                         'static_end':
-                        self.network_data[rack][net_type]['static_end'],
+                        ranges['static_end'],
                         'reserved_start':
-                        self.network_data[rack][net_type]['reserved_start'],
+                        ranges['reserved_start'],
                         'reserved_end':
-                        self.network_data[rack][net_type]['reserved_end'],
+                        ranges['reserved_end'],
                     }
                     if net_type == 'pxe':
                         common_subnets[net_type]['dhcp_start'] =\
-                                self.network_data[rack][net_type]['dhcp_start']
+                                ranges['dhcp_start']
                         common_subnets[net_type]['dhcp_end'] =\
-                                self.network_data[rack][net_type]['dhcp_end']
+                                ranges['dhcp_end']
 
         rackwise_subnets.pop('common')
-        common_subnets['oob'] = rackwise_oob_data[rack]
-        common_subnets['oam'] = self.get_oam_network_data()
+        """
+        OOB data of the last rack looped over, or of the last rack with an
+        oob subnet when that one has none
+        """
+        if rack in rackwise_oob_data:
+            common_subnets['oob'] = rackwise_oob_data[rack]
+        elif rackwise_oob_data:
+            common_subnets['oob'] = list(rackwise_oob_data.values())[-1]
+        common_subnets['oam'] = self.stages.result('oam_network')
         for rack in rackwise_subnets:
             if rack == self.genesis_rack:
                 rackwise_subnets[rack]['is_genesis'] = True
@@ -542,7 +809,7 @@ class ProcessInputFiles(ParserEngine):
         rack_data['common'] = common_subnets
         self.data['network'] = rack_data
         self.data['network']['ingress'] = self.public_network_data['ingress']
-        self.data['network']['proxy'] = self.rules_data['proxy']
+        self.data['network']['proxy'] = self.rules_data.section('proxy')
         self.data['network']['proxy']['no_proxy'] = self.rules_data['no_proxy']
         self.data['network']['ntp'] = {
             'servers': self.dns_ntp_ldap_data['ntp'],
@@ -555,14 +822,11 @@ class ProcessInputFiles(ParserEngine):
         self.data['network']['ldap'] = self.dns_ntp_ldap_data['ldap']
         self.data['network']['ldap']['domain'] = \
                 self.data['network']['ldap']['base_url'].split('.')[1]
-        self.data['network']['bgp'] = self.rules_data['bgp']
+        self.data['network']['bgp'] = self.rules_data.section('bgp')
         self.data['network']['bgp']['public_service_cidr'] =\
                 self.data['network']['ingress']
-        subnet = \
-                netaddr.IPNetwork(
-                    self.data['network']['bgp']['public_service_cidr'])
-        ips = list(subnet)
-        self.data['network']['bgp']['ingress_vip'] = str(ips[1])
+        subnet = get_subnet(self.data['network']['bgp']['public_service_cidr'])
+        self.data['network']['bgp']['ingress_vip'] = subnet.address(1)
 
     def get_deployment_configuration(self):
         """ Get deployment configuration from self.rules_data['py """
@@ -577,80 +841,89 @@ class ProcessInputFiles(ParserEngine):
         """
         self.logger.info("Extracting rack information per host profile ")
         host_profile_wise_racks = {}
-        rackwise_host_data = self.data['baremetal']
-        for rack in rackwise_host_data:
-            for host in rackwise_host_data[rack]:
-                host_data = rackwise_host_data[rack][host]
-                host_profile = host_data['host_profile']
-                if host_profile not in host_profile_wise_racks:
-                    host_profile_wise_racks[host_profile] = {
-                        'racks': set(),
-                    }
-                host_profile_wise_racks[host_profile]['racks'].add(rack)
-                host_profile_wise_racks[host_profile][
-                    'type'] = rackwise_host_data[rack][host]['type']
+        for host in self.get_sorted_hosts():
+            record = self.hosts[host]
+            if record.host_profile not in host_profile_wise_racks:
+                host_profile_wise_racks[record.host_profile] = {
+                    'racks': set(),
+                }
+            host_profile_wise_racks[record.host_profile]['racks'].add(
+                record.rack)
+            host_profile_wise_racks[record.host_profile]['type'] = record.type
         return host_profile_wise_racks
 
     def assign_racks_to_host_profile(self):
         """ Create profile key and assigning host profile data to it """
         self.logger.info("Assigning rack to host profile")
         host_profile_wise_racks = self.get_host_profile_wise_racks()
+        interfaces = self.rules_data.section('hostprofile_interfaces')
         for host_profile in host_profile_wise_racks:
             rack_list = list(host_profile_wise_racks[host_profile]['racks'])
             host_profile_wise_racks[host_profile]['racks'] = rack_list
-            for key in self.rules_data['hostprofile_interfaces'][host_profile]:
-                host_profile_wise_racks[host_profile][key] = self.rules_data[
-                    'hostprofile_interfaces'][host_profile][key]
+            host_profile_wise_racks[host_profile].update(
+                interfaces[host_profile])
         self.data['profiles'] = host_profile_wise_racks
 
     def assign_ceph_data(self):
         """ Assigning ceph data from configuration in setttings.py """
         self.logger.info("Assigning ceph data")
-        self.data['ceph'] = self.rules_data['ceph']
+        self.data['ceph'] = self.rules_data.section('ceph')
 
     def assign_conf_data(self):
         """ Creating a conf key and storing common network config for UCP """
         self.logger.info("Assigning conf data")
-        self.data['ceph'] = self.rules_data['ceph']
-        self.data['conf'] = self.rules_data['conf']
-        ingress_subnet = netaddr.IPNetwork(self.data['network']['ingress'])
-        ips = list(ingress_subnet)
-        self.data['conf']['ingress'] = '{}/32'.format(str(ips[1]))
+        self.data['ceph'] = self.rules_data.section('ceph')
+        self.data['conf'] = self.rules_data.section('conf')
+        ingress_subnet = get_subnet(self.data['network']['ingress'])
+        self.data['conf']['ingress'] = '{}/32'.format(
+            ingress_subnet.address(1))
 
     def assign_hardware_profile(self):
         """ Get sitetype and set Hardware profile accordingly """
-        hardware_profile = {}
-        for key in self.rules_data['hardware_profile']:
-            if self.data["sitetype"] == key:
-                hardware_profile = self.rules_data['hardware_profile'][key]
-        self.data['hw_profile'] = hardware_profile
+        self.data['hw_profile'] = self.rules_data.hardware_profile
 
     def generate_intermediary_yaml(self):
         """ Generating intermediary yaml """
         self.logger.info("Generating intermediary yaml")
-        self.assign_design_spec_data()
-        self.get_rack_data()
-        self.get_rackwise_subnet()
-        self.assign_private_ip_to_hosts()
-        self.assign_public_ip_to_host()
-        self.assign_ip()
-        self.assign_network_data()
-        self.get_deployment_configuration()
-        self.assign_racks_to_host_profile()
-        self.assign_region_name()
-        self.assign_ceph_data()
-        self.assign_conf_data()
-        self.assign_location_data()
-        self.assign_sitetype()
-        self.assign_hardware_profile()
+        """
+        Stages run one after the other: they fill in self and its dicts,
+        and are CPU bound, so threads would gain nothing under the GIL
+        """
+        self.stages.run()
+        self.data['baremetal'] = self.get_baremetal()
         self.intermediary_yaml = self.data
         return self.intermediary_yaml
 
-    def dump_intermediary_file(self):
+    def generate_intermediary_file(self,
+                                   site_config,
+                                   baseline=None,
+                                   intermediary_format='yaml'):
+        """
+        Generate and dump the intermediary of the site described by
+        site_config, optionally keeping the addresses of the baseline
+        intermediary. intermediary_format is one of
+        intermediary_codec.INTERMEDIARY_FORMATS. Returns the intermediary
+        """
+        """ Collects rules.yaml data """
+        self.apply_design_rules(site_config)
+        if baseline:
+            self.load_baseline(baseline)
+        """ Parses the design spec supplied to raw yaml """
+        self.logger.info("Parsing raw data from design spec")
+        self.get_parsed_raw_data_from_excel()
+        self.logger.info("Generating Intermediary File")
+        try:
+            intermediary_yaml = self.generate_intermediary_yaml()
+        except NotEnoughIp as error:
+            error.display_error()
+            sys.exit("Tugboat exited!!")
+        self.dump_intermediary_file(intermediary_format)
+        return intermediary_yaml
+
+    def dump_intermediary_file(self, intermediary_format='yaml'):
         """ Dumping intermediary yaml """
-        self.logger.info("Dumping intermediary yaml")
-        intermediary_file = "{}_intermediary.yaml".format(self.region_name)
-        yaml_file = yaml.dump(self.data, default_flow_style=False)
-        with open(intermediary_file, 'w') as f:
-            f.write(yaml_file)
-        f.close()
+        self.logger.info("Dumping intermediary %s", intermediary_format)
+        codec = get_codec(intermediary_format)
+        intermediary_file = "{}_intermediary.{}".format(
+            self.region_name, codec.extension)
+        dump_intermediary(self.data, intermediary_file, codec)
@@ -0,0 +1,116 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from .intermediary_codec import load_intermediary
+
+# Excel derived host fields compared with the baseline, as
+# (field, key in the baremetal section of the intermediary)
+HOST_FIELDS = (('rack', 'rack'), ('ipmi_address', 'oob'), ('host_profile',
+                                                           'host_profile'))
+
+
+class IntermediaryBaseline():
+    """
+    A previously generated intermediary, used to keep the addresses of
+    the hosts whose excel rows did not change.
+
+    compare() sorts the current hosts into added, changed and unchanged
+    ones, and lists the hosts and racks that are gone. Only unchanged
+    hosts get their previous addresses back from address().
+    """
+
+    def __init__(self, intermediary):
+        self.hosts = {}
+        self.genesis = None
+        for rack, hosts in (intermediary.get('baremetal') or {}).items():
+            for host, host_data in hosts.items():
+                self.hosts[host] = {
+                    'rack': host_data.get('rack', rack),
+                    'oob': host_data.get('ip', {}).get('oob'),
+                    'host_profile': host_data.get('host_profile'),
+                    'ip': host_data.get('ip', {}),
+                }
+                if host_data.get('type') == 'genesis':
+                    self.genesis = host
+        self.added = []
+        self.changed = {}
+        self.unchanged = set()
+        self.removed = []
+
+    @classmethod
+    def load(cls, file_name):
+        return cls(load_intermediary(file_name) or {})
+
+    def compare(self, hosts):
+        """
+        hosts maps each current host to its rack, ipmi_address and
+        host_profile
+        """
+        self.added = []
+        self.changed = {}
+        self.unchanged = set()
+        for host, current in hosts.items():
+            if host not in self.hosts:
+                self.added.append(host)
+                continue
+            previous = self.hosts[host]
+            fields = [
+                field for field, key in HOST_FIELDS
+                if current[field] != previous[key]
+            ]
+            if fields:
+                self.changed[host] = fields
+            else:
+                self.unchanged.add(host)
+        self.removed = sorted(host for host in self.hosts if host not in hosts)
+
+    def address(self, host, net_type):
+        """ Previous address of an unchanged host, None otherwise """
+        if host not in self.unchanged:
+            return None
+        return self.hosts[host]['ip'].get(net_type)
+
+    def summary(self, baremetal):
+        """
+        Lines describing the changes from the baseline to baremetal, the
+        baremetal section of the new intermediary
+        """
+        previous_racks = set(host['rack'] for host in self.hosts.values())
+        racks = set(baremetal)
+        renumbered = []
+        for rack in sorted(baremetal):
+            for host in sorted(baremetal[rack]):
+                if host not in self.hosts:
+                    continue
+                previous_ip = self.hosts[host]['ip']
+                for net_type, address in sorted(
+                        baremetal[rack][host]['ip'].items()):
+                    if previous_ip.get(net_type) != address:
+                        renumbered.append('{} {}: {} -> {}'.format(
+                            host, net_type, previous_ip.get(net_type),
+                            address))
+        lines = [
+            'Hosts unchanged: {}'.format(len(self.unchanged)),
+            'Hosts added: {}'.format(', '.join(sorted(self.added)) or '-'),
+            'Hosts removed: {}'.format(', '.join(self.removed) or '-'),
+            'Hosts changed: {}'.format(', '.join(
+                '{} ({})'.format(host, ', '.join(fields))
+                for host, fields in sorted(self.changed.items())) or '-'),
+            'Racks added: {}'.format(', '.join(sorted(racks - previous_racks))
+                                     or '-'),
+            'Racks removed: {}'.format(', '.join(
+                sorted(previous_racks - racks)) or '-'),
+            'Addresses changed: {}'.format(len(renumbered)),
+        ]
+        return lines + ['  ' + line for line in renumbered]
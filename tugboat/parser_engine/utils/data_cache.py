@@ -0,0 +1,178 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import pkg_resources
+from .spec_matcher import get_spec_files
+from .spec_matcher import load_excel_specs
+
+# Revision of the parsed data. Bump it with any change to the parser that
+# changes what get_data() returns, the tugboat version is rarely bumped
+CACHE_REVISION = 1
+
+_version = {}
+
+
+def get_tugboat_version():
+    """ Version of the installed tugboat package, looked up once """
+    if 'tugboat' not in _version:
+        try:
+            _version['tugboat'] = pkg_resources.get_distribution(
+                'tugboat').version
+        except pkg_resources.DistributionNotFound:
+            _version['tugboat'] = 'unknown'
+    return _version['tugboat']
+
+
+def get_default_cache_dir():
+    """ $XDG_CACHE_HOME/tugboat, falling back to ~/.cache/tugboat """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(
+        os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'tugboat')
+
+
+def file_digest(file_name):
+    """ SHA-256 of the content of file_name """
+    digest = hashlib.sha256()
+    with open(file_name, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ParsedDataCache():
+    """
+    On-disk cache of the dict returned by ExcelParser.get_data().
+
+    Entries are keyed by the SHA-256 of every input workbook, the excel
+    spec, CACHE_REVISION and the tugboat version, so any change to the
+    inputs or to the parser is a miss.
+    Entries are written atomically (temp file + rename) and the cache is
+    trimmed to max_size bytes, oldest entries first, which keeps it safe
+    to share between parallel runs.
+    """
+
+    SUFFIX = '.json'
+
+    def __init__(self, cache_dir=None, max_size=64 * 1024 * 1024):
+        self.logger = logging.getLogger(__name__)
+        self.cache_dir = cache_dir or get_default_cache_dir()
+        self.max_size = max_size
+
+    @staticmethod
+    def get_referenced_files(excel_specs):
+        """
+        Files referenced by "file.xlsx:sheet" style sheet names in the
+        excel spec. Their content feeds get_data() as much as the -x files
+        """
+        specs = load_excel_specs(excel_specs)
+        referenced = []
+        for spec in specs['specs'].values():
+            for value in spec.values():
+                if not isinstance(value, str) or ':' not in value:
+                    continue
+                if re.search('.xlsx', value) or re.search('.xls', value):
+                    file_name = value.split(':')[0]
+                    if file_name not in referenced:
+                        referenced.append(file_name)
+        return referenced
+
+    def get_key(self,
+                file_names,
+                excel_specs,
+                detect_extent=False,
+                xlsx_engine='openpyxl'):
+        """ Compute the cache key for the given inputs """
+        digest = hashlib.sha256()
+        digest.update('{}:{}'.format(CACHE_REVISION,
+                                     get_tugboat_version()).encode())
+        """
+        The engines are separate readers meant to give the same data. Keep
+        their data apart so that a difference between them shows in a run
+        with the other engine instead of being served from the cache
+        """
+        digest.update(xlsx_engine.encode())
+        """ Detected extents can read more rows than the spec lists """
+        digest.update(b'detect-extent' if detect_extent else b'spec-rows')
+        for spec_file in get_spec_files(excel_specs):
+            digest.update(file_digest(spec_file).encode())
+        """ Order of the -x files decides sheet name collisions """
+        for file_name in file_names:
+            digest.update(file_digest(file_name).encode())
+        for file_name in self.get_referenced_files(excel_specs):
+            if os.path.exists(file_name):
+                digest.update(file_digest(file_name).encode())
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.SUFFIX)
+
+    def get(self, key):
+        """ Return the cached data for key, or None on a miss """
+        path = self._path(key)
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            """ Missing, concurrently evicted or partially written """
+            self.logger.debug("Parsed data cache miss: %s", key)
+            return None
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.logger.info("Parsed data cache hit: %s", key)
+        return data
+
+    def put(self, key, data):
+        """ Store data under key """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=self.cache_dir, prefix='.tmp-', suffix=self.SUFFIX)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, self._path(key))
+        except (IOError, OSError) as err:
+            self.logger.warning("Unable to write parsed data cache: %s", err)
+            return
+        self.evict()
+
+    def evict(self):
+        """ Remove least recently used entries beyond max_size """
+        entries = []
+        total = 0
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(self.SUFFIX) or name.startswith('.tmp-'):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
@@ -0,0 +1,226 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import hashlib
+import json
+import logging
+import os
+from collections.abc import Mapping
+from types import MappingProxyType
+import pkg_resources
+import yaml
+from ..check_exceptions import (
+    InvalidDesignRules, )
+from .data_cache import file_digest
+from .data_cache import get_tugboat_version
+from .data_cache import ParsedDataCache
+
+# Rules every site needs, as (key, type)
+REQUIRED_RULES = (
+    ('host_types', list),
+    ('private_network_types', dict),
+    ('state_codes', dict),
+    ('ips_to_leave', int),
+    ('oob_ips_to_leave', int),
+    ('gateway_offset', int),
+    ('deployment_manifest', str),
+    ('ldap_protocol', str),
+    ('sitetype', str),
+    ('hardware_profile', dict),
+    ('hostprofile_interfaces', dict),
+    ('proxy', dict),
+    ('no_proxy', str),
+    ('bgp', dict),
+    ('ceph', dict),
+    ('conf', dict),
+)
+
+# Revision of the compiled rules. Bump it with any change to how the rules
+# are merged, the tugboat version is rarely bumped
+RULES_REVISION = 1
+
+_global_config = {}
+_compiled = {}
+
+
+def get_global_config_file():
+    global_config_dir = pkg_resources.resource_filename('tugboat', 'config/')
+    return global_config_dir + 'global_config.yaml'
+
+
+def load_global_config():
+    """
+    Global design rules, read once per process. Callers get their own
+    copy
+    """
+    if 'rules' not in _global_config:
+        with open(get_global_config_file(), 'r') as f:
+            _global_config['rules'] = yaml.safe_load(f.read())
+    return copy.deepcopy(_global_config['rules'])
+
+
+def merge_rules(base, override):
+    """
+    Deep merge of two rule layers: dicts are merged key by key, any other
+    value of override replaces the one of base
+    """
+    merged = dict(base)
+    for key, value in override.items():
+        if isinstance(merged.get(key), dict) and isinstance(value, dict):
+            merged[key] = merge_rules(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def freeze(value):
+    """ Read-only copy of value: mappings become proxies, lists tuples """
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item)
+                                 for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """ Plain, mutable copy of a frozen value """
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class DesignRules(Mapping):
+    """
+    The global design rules with the site config layered on top,
+    validated and read-only.
+
+    Rules read as a mapping of frozen values. Sections copied into the
+    intermediary are taken with section(), which returns a mutable copy.
+    """
+
+    def __init__(self, rules):
+        self._rules = freeze(rules)
+        self.validate()
+
+    def __getitem__(self, key):
+        return self._rules[key]
+
+    def __iter__(self):
+        return iter(self._rules)
+
+    def __len__(self):
+        return len(self._rules)
+
+    def validate(self):
+        problems = []
+        for key, value_type in REQUIRED_RULES:
+            if key not in self._rules:
+                problems.append("'{}' is missing".format(key))
+            elif not isinstance(thaw(self._rules[key]), value_type):
+                problems.append("'{}' should be a {}".format(
+                    key, value_type.__name__))
+        if not problems:
+            try:
+                self.ctrl_profile
+            except (KeyError, TypeError):
+                problems.append(
+                    "'hardware_profile.{}.profile_name.ctrl' is missing".
+                    format(self.sitetype))
+        if problems:
+            raise InvalidDesignRules(problems)
+
+    def section(self, key):
+        """ Mutable copy of the rules under key """
+        return thaw(self._rules[key])
+
+    @property
+    def host_types(self):
+        return self._rules['host_types']
+
+    @property
+    def private_network_types(self):
+        return self._rules['private_network_types']
+
+    @property
+    def ips_to_leave(self):
+        return self._rules['ips_to_leave']
+
+    @property
+    def oob_ips_to_leave(self):
+        return self._rules['oob_ips_to_leave']
+
+    @property
+    def gateway_offset(self):
+        return self._rules['gateway_offset']
+
+    @property
+    def sitetype(self):
+        return self._rules['sitetype']
+
+    @property
+    def ctrl_profile(self):
+        """ Host profile of the controllers of the site type """
+        return self._rules['hardware_profile'][
+            self.sitetype]['profile_name']['ctrl']
+
+    @property
+    def hardware_profile(self):
+        """ Hardware profile of the site type, empty when not defined """
+        return self.section('hardware_profile').get(self.sitetype, {})
+
+
+def get_rules_key(site_config):
+    """ Key of the rules compiled from the global rules and site_config """
+    digest = hashlib.sha256()
+    digest.update('{}:{}'.format(RULES_REVISION,
+                                 get_tugboat_version()).encode())
+    digest.update(file_digest(get_global_config_file()).encode())
+    digest.update(file_digest(site_config).encode())
+    return digest.hexdigest()
+
+
+def compile_design_rules(site_config, cache_dir=None):
+    """
+    DesignRules of site_config. Compiled rules are kept for the process
+    and, with cache_dir, on disk keyed by the content of the rule files.
+    Invalid rules raise InvalidDesignRules and are never cached
+    """
+    logger = logging.getLogger(__name__)
+    key = get_rules_key(site_config)
+    if key in _compiled:
+        return _compiled[key]
+    cache = None
+    rules = None
+    if cache_dir is not None:
+        cache = ParsedDataCache(os.path.join(cache_dir, 'rules'))
+        rules = cache.get(key)
+    if rules is not None:
+        _compiled[key] = DesignRules(rules)
+        return _compiled[key]
+    with open(site_config, 'r') as f:
+        site_rules = yaml.safe_load(f.read()) or {}
+    rules = merge_rules(load_global_config(), site_rules)
+    """ Validated before anything is cached """
+    _compiled[key] = DesignRules(rules)
+    if cache is not None:
+        """ Rules JSON can not represent exactly are not cached """
+        if json.loads(json.dumps(rules)) == rules:
+            cache.put(key, rules)
+        else:
+            logger.debug("Design rules of %s not cached", site_config)
+    return _compiled[key]
@@ -12,16 +12,19 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import json
 import jsonschema
 import pkg_resources
 import re
 import sys
-import yaml
-from openpyxl import load_workbook
-from openpyxl import Workbook
 from ..check_exceptions import (
     NoSpecMatched, )
+from .workbook import CombinedWorkbook
+from .extraction_plan import ExtractionPlan
+from .extraction_plan import ReadExtent
+from .spec_matcher import SpecMatcher
+from .workbook import WorkbookPool
 import logging
 import pprint
 
@@ -29,20 +32,43 @@ import pprint
 class ExcelParser():
     """ Parse data from excel into a dict """
 
-    def __init__(self, file_name, excel_specs):
+    def __init__(self,
+                 file_name,
+                 excel_specs,
+                 jobs=1,
+                 engine='openpyxl',
+                 detect_extent=False):
+        """
+        excel_specs is a spec file or a directory of spec files. When it
+        holds several specs the one matching the excel files is used.
+        engine is one of workbook.XLSX_ENGINES. With detect_extent the
+        host, vlan and network rows are read as far as they go instead of
+        from the spec start to end rows
+        """
         self.logger = logging.getLogger(__name__)
         self.file_name = file_name
-        with open(excel_specs, 'r') as f:
-            spec_raw_data = f.read()
-        self.excel_specs = yaml.safe_load(spec_raw_data)
+        self.jobs = jobs
+        self.engine = engine
+        self.detect_extent = detect_extent
+        self.spec_matcher = SpecMatcher.load(excel_specs)
+        """ Sheet names get resolved per package, keep the loaded specs """
+        self.excel_specs = copy.deepcopy(self.spec_matcher.excel_specs)
         """ 
         A combined design spec, returns a workbok object after combining
         all the inputs excel specs
         """
         combined_design_spec = self.combine_excel_design_specs(file_name)
         self.wb_combined = combined_design_spec
+        """ Workbooks referenced as "file.xlsx:sheet" in the excel spec """
+        self.wb_pool = WorkbookPool(engine=self.engine)
         self.filenames = file_name
-        self.spec = 'xl_spec'
+        try:
+            self.spec = self.find_correct_spec()
+        except NoSpecMatched as error:
+            error.display_error()
+            sys.exit("Tugboat exited!!")
+        self.plan = None
+        self.values = None
 
     @staticmethod
     def sanitize(string):
@@ -53,64 +79,35 @@ class ExcelParser():
         """ Compare the strings """
         return bool(re.search(self.sanitize(string1), self.sanitize(string2)))
 
-    def validate_sheet(self, spec, sheet):
-        """ Check if the sheet is correct or not """
-        ws = self.wb_combined[sheet]
-        header_row = self.excel_specs['specs'][spec]['header_row']
-        ipmi_header = self.excel_specs['specs'][spec]['ipmi_address_header']
-        ipmi_column = self.excel_specs['specs'][spec]['ipmi_address_col']
-        header_value = ws.cell(row=header_row, column=ipmi_column).value
-        import pdb
-        pdb.set_trace()
-        return bool(self.compare(ipmi_header, header_value))
-
     def find_correct_spec(self):
-        """ Find the correct spec """
-        for spec in self.excel_specs['specs']:
-            sheet_name = self.excel_specs['specs'][spec]['ipmi_sheet_name']
-            for sheet in self.wb_combined.sheetnames:
-                if self.compare(sheet_name, sheet):
-                    self.excel_specs['specs'][spec]['ipmi_sheet_name'] = sheet
-                    if self.validate_sheet(spec, sheet):
-                        return spec
-        raise NoSpecMatched(self.excel_specs)
+        """
+        Find the spec matching the excel files and resolve its sheet names
+        to the actual names of the matched sheets
+        """
+        spec, sheets = self.spec_matcher.match(self.wb_combined)
+        self.excel_specs['specs'][spec].update(sheets)
+        return spec
 
     def get_ipmi_data(self):
         """ Read IPMI data from the sheet """
         ipmi_data = {}
         hosts = []
-        #self.spec = self.find_correct_spec()
-        provided_sheetname = self.excel_specs['specs'][self.
-                                                       spec]['ipmi_sheet_name']
-        workbook_object, extracted_sheetname = self.get_xl_obj_and_sheetname(
-            provided_sheetname)
-        if workbook_object != None:
-            ws = workbook_object[extracted_sheetname]
-        else:
-            ws = self.wb_combined[provided_sheetname]
-        row = self.excel_specs['specs'][self.spec]['start_row']
-        end_row = self.excel_specs['specs'][self.spec]['end_row']
-        hostname_col = self.excel_specs['specs'][self.spec]['hostname_col']
-        ipmi_address_col = self.excel_specs['specs'][self.
-                                                     spec]['ipmi_address_col']
         host_profile_col = self.excel_specs['specs'][self.
                                                      spec]['host_profile_col']
-        ipmi_gateway_col = self.excel_specs['specs'][self.
-                                                     spec]['ipmi_gateway_col']
+        columns = self.get_values()['ipmi']
         previous_server_gateway = None
-        while row <= end_row:
-            hostname = self.sanitize(
-                ws.cell(row=row, column=hostname_col).value)
+        for row, hostname, ipmi_address, ipmi_gateway, tmp_host_profile in zip(
+                columns['row'], columns['hostname_col'],
+                columns['ipmi_address_col'], columns['ipmi_gateway_col'],
+                columns['host_profile_col']):
+            hostname = self.sanitize(hostname)
             hosts.append(hostname)
-            ipmi_address = ws.cell(row=row, column=ipmi_address_col).value
             if '/' in ipmi_address:
                 ipmi_address = ipmi_address.split('/')[0]
-            ipmi_gateway = ws.cell(row=row, column=ipmi_gateway_col).value
             if ipmi_gateway:
                 previous_server_gateway = ipmi_gateway
             else:
                 ipmi_gateway = previous_server_gateway
-            tmp_host_profile = ws.cell(row=row, column=host_profile_col).value
             try:
                 if tmp_host_profile is None:
                     raise RuntimeError("No value read from {} ".format(
@@ -125,53 +122,34 @@ class ExcelParser():
                 'ipmi_gateway': ipmi_gateway,
                 'host_profile': host_profile,
             }
-            row += 1
         self.logger.debug("ipmi data extracted from excel:\n%s",
                           [pprint.pformat(ipmi_data),
                            pprint.pformat(hosts)])
         return [ipmi_data, hosts]
 
-    def get_private_vlan_data(self, ws):
+    def get_private_vlan_data(self):
         """ Get private vlan data from private IP sheet """
         vlan_data = {}
-        row = self.excel_specs['specs'][self.spec]['vlan_start_row']
-        end_row = self.excel_specs['specs'][self.spec]['vlan_end_row']
-        type_col = self.excel_specs['specs'][self.spec]['net_type_col']
-        vlan_col = self.excel_specs['specs'][self.spec]['vlan_col']
-        while row <= end_row:
-            cell_value = ws.cell(row=row, column=type_col).value
+        columns = self.get_values()['vlan']
+        for cell_value, vlan in zip(columns['net_type_col'],
+                                    columns['vlan_col']):
             if cell_value:
-                vlan = ws.cell(row=row, column=vlan_col).value
                 if vlan:
                     vlan = vlan.lower()
                 vlan_data[vlan] = cell_value
-            row += 1
         self.logger.debug("vlan data extracted from excel:\n%s",
                           pprint.pformat(vlan_data))
         return vlan_data
 
     def get_private_network_data(self):
         """ Read network data from the private ip sheet """
-        provided_sheetname = self.excel_specs['specs'][
-            self.spec]['private_ip_sheet']
-        workbook_object, extracted_sheetname = self.get_xl_obj_and_sheetname(
-            provided_sheetname)
-        if workbook_object != None:
-            ws = workbook_object[extracted_sheetname]
-        else:
-            ws = self.wb_combined[provided_sheetname]
-        vlan_data = self.get_private_vlan_data(ws)
+        vlan_data = self.get_private_vlan_data()
         network_data = {}
-        row = self.excel_specs['specs'][self.spec]['net_start_row']
-        end_row = self.excel_specs['specs'][self.spec]['net_end_row']
-        col = self.excel_specs['specs'][self.spec]['net_col']
-        vlan_col = self.excel_specs['specs'][self.spec]['net_vlan_col']
+        columns = self.get_values()['net']
         old_vlan = ''
-        while row <= end_row:
-            vlan = ws.cell(row=row, column=vlan_col).value
+        for vlan, network in zip(columns['net_vlan_col'], columns['net_col']):
             if vlan:
                 vlan = vlan.lower()
-            network = ws.cell(row=row, column=col).value
             if vlan and network:
                 net_type = vlan_data[vlan]
                 if 'vlan' not in network_data:
@@ -184,11 +162,9 @@ class ExcelParser():
                 # value is spread over several rows
                 vlan = old_vlan
             else:
-                row += 1
                 continue
             network_data[vlan_data[vlan]]['subnet'].append(network)
             old_vlan = vlan
-            row += 1
         for network in network_data:
             network_data[network]['is_common'] = True
             """
@@ -204,38 +180,21 @@ class ExcelParser():
 
     def get_public_network_data(self):
         """ Read public network data from public ip data """
-        network_data = {}
-        provided_sheetname = self.excel_specs['specs'][self.
-                                                       spec]['public_ip_sheet']
-        workbook_object, extracted_sheetname = self.get_xl_obj_and_sheetname(
-            provided_sheetname)
-        if workbook_object != None:
-            ws = workbook_object[extracted_sheetname]
-        else:
-            ws = self.wb_combined[provided_sheetname]
-        oam_row = self.excel_specs['specs'][self.spec]['oam_ip_row']
-        oam_col = self.excel_specs['specs'][self.spec]['oam_ip_col']
-        oam_vlan_col = self.excel_specs['specs'][self.spec]['oam_vlan_col']
-        ingress_row = self.excel_specs['specs'][self.spec]['ingress_ip_row']
-        oob_row = self.excel_specs['specs'][self.spec]['oob_net_row']
-        col = self.excel_specs['specs'][self.spec]['oob_net_start_col']
-        end_col = self.excel_specs['specs'][self.spec]['oob_net_end_col']
+        values = self.get_values()
         network_data = {
             'oam': {
-                'ip': ws.cell(row=oam_row, column=oam_col).value,
-                'vlan': ws.cell(row=oam_row, column=oam_vlan_col).value,
+                'ip': values['oam_ip'],
+                'vlan': values['oam_vlan'],
             },
-            'ingress': ws.cell(row=ingress_row, column=oam_col).value,
+            'ingress': values['ingress'],
         }
         network_data['oob'] = {
             'subnets': [],
         }
-        while col <= end_col:
-            cell_value = ws.cell(row=oob_row, column=col).value
+        for cell_value in values['oob']:
             if cell_value:
                 network_data['oob']['subnets'].append(
                     self.sanitize(cell_value))
-            col += 1
         self.logger.debug(
             "public network data extracted from\
                           excel:\n%s", pprint.pformat(network_data))
@@ -244,34 +203,21 @@ class ExcelParser():
     def get_dns_ntp_ldap_data(self):
         """ Read dns, ntp and ldap data from build notes sheet """
         dns_ntp_ldap_data = {}
-        provided_sheetname = self.excel_specs['specs'][
-            self.spec]['dns_ntp_ldap_sheet']
-        workbook_object, extracted_sheetname = self.get_xl_obj_and_sheetname(
-            provided_sheetname)
-        if workbook_object != None:
-            ws = workbook_object[extracted_sheetname]
-        else:
-            ws = self.wb_combined[provided_sheetname]
+        values = self.get_values()
+        sheet_name = self.excel_specs['specs'][self.spec]['dns_ntp_ldap_sheet']
         dns_row = self.excel_specs['specs'][self.spec]['dns_row']
         dns_col = self.excel_specs['specs'][self.spec]['dns_col']
         ntp_row = self.excel_specs['specs'][self.spec]['ntp_row']
         ntp_col = self.excel_specs['specs'][self.spec]['ntp_col']
-        domain_row = self.excel_specs['specs'][self.spec]['domain_row']
-        domain_col = self.excel_specs['specs'][self.spec]['domain_col']
-        login_domain_row = self.excel_specs['specs'][self.
-                                                     spec]['login_domain_row']
-        ldap_col = self.excel_specs['specs'][self.spec]['ldap_col']
-        global_group = self.excel_specs['specs'][self.spec]['global_group']
-        ldap_search_url_row = self.excel_specs['specs'][
-            self.spec]['ldap_search_url_row']
-        dns_servers = ws.cell(row=dns_row, column=dns_col).value
-        ntp_servers = ws.cell(row=ntp_row, column=ntp_col).value
+        dns_servers = values['dns']
+        ntp_servers = values['ntp']
         try:
             if dns_servers is None:
                 raise RuntimeError(
                     "No value read for dns_server from File:" +
                     "{} Sheet:'{}' Row:{} Col:{}".format(
                         self.file_name, sheet_name, dns_row, dns_col))
+            if ntp_servers is None:
                 raise RuntimeError(
                     "No value read for ntp_server from File:" +
                     "{} Sheet:'{}' Row:{} Col:{}".format(
@@ -293,13 +239,11 @@ class ExcelParser():
         dns_ntp_ldap_data = {
             'dns': dns_servers,
             'ntp': ntp_servers,
-            'domain': ws.cell(row=domain_row, column=domain_col).value,
+            'domain': values['domain'],
             'ldap': {
-                'subdomain': ws.cell(row=login_domain_row,
-                                     column=ldap_col).value,
-                'common_name': ws.cell(row=global_group,
-                                       column=ldap_col).value,
-                'url': ws.cell(row=ldap_search_url_row, column=ldap_col).value,
+                'subdomain': values['ldap_subdomain'],
+                'common_name': values['ldap_common_name'],
+                'url': values['ldap_url'],
             }
         }
         self.logger.debug(
@@ -309,32 +253,13 @@ class ExcelParser():
 
     def get_location_data(self):
         """ Read location data from the site and zone sheet """
-        provided_sheetname = self.excel_specs['specs'][self.
-                                                       spec]['location_sheet']
-        workbook_object, extracted_sheetname = self.get_xl_obj_and_sheetname(
-            provided_sheetname)
-        if workbook_object != None:
-            ws = workbook_object[extracted_sheetname]
-        else:
-            ws = self.wb_combined[provided_sheetname]
-        corridor_row = self.excel_specs['specs'][self.spec]['corridor_row']
-        column = self.excel_specs['specs'][self.spec]['column']
-        site_name_row = self.excel_specs['specs'][self.spec]['site_name_row']
-        state_name_row = self.excel_specs['specs'][self.spec]['state_name_row']
-        country_name_row = self.excel_specs['specs'][self.
-                                                     spec]['country_name_row']
-        clli_name_row = self.excel_specs['specs'][self.spec]['clli_name_row']
+        values = self.get_values()
         return {
-            'corridor':
-            ws.cell(row=corridor_row, column=column).value,
-            'name':
-            ws.cell(row=site_name_row, column=column).value,
-            'state':
-            ws.cell(row=state_name_row, column=column).value,
-            'country':
-            ws.cell(row=country_name_row, column=column).value,
-            'physical_location_id':
-            ws.cell(row=clli_name_row, column=column).value,
+            'corridor': values['corridor'],
+            'name': values['site_name'],
+            'state': values['state_name'],
+            'country': values['country_name'],
+            'physical_location_id': values['clli_name'],
         }
 
     def validate_data(self, data):
@@ -358,19 +283,9 @@ class ExcelParser():
                          OK!")
 
     def validate_sheet_names_with_spec(self):
-        spec = list(self.excel_specs['specs'].keys())[0]
-        spec_item = self.excel_specs['specs'][spec]
-        sheet_name_list = []
-        ipmi_header_sheet_name = spec_item['ipmi_sheet_name']
-        sheet_name_list.append(ipmi_header_sheet_name)
-        private_ip_sheet_name = spec_item['private_ip_sheet']
-        sheet_name_list.append(private_ip_sheet_name)
-        public_ip_sheet_name = spec_item['public_ip_sheet']
-        sheet_name_list.append(public_ip_sheet_name)
-        dns_ntp_ldap_sheet_name = spec_item['dns_ntp_ldap_sheet']
-        sheet_name_list.append(dns_ntp_ldap_sheet_name)
-        location_sheet_name = spec_item['location_sheet']
-        sheet_name_list.append(location_sheet_name)
+        sheet_name_list = [
+            sheet_plan.spec_sheet_name for sheet_plan in self.get_plan().sheets
+        ]
         try:
             for sheetname in sheet_name_list:
                 workbook_object, extracted_sheetname = \
@@ -390,6 +305,33 @@ class ExcelParser():
 
         self.logger.info("Sheet name in excel spec validated with")
 
+    def get_plan(self):
+        """ Extraction plan compiled from the excel spec in use """
+        if self.plan is None or self.plan.spec != self.spec:
+            self.plan = ExtractionPlan.compile(
+                self.spec, self.excel_specs['specs'][self.spec],
+                self.detect_extent)
+            self.values = None
+        return self.plan
+
+    def get_worksheet(self, workbook, sheetname):
+        """ Worksheet from the -x files, or from workbook if given """
+        if workbook is not None:
+            return self.wb_pool.get(workbook)[sheetname]
+        return self.wb_combined[sheetname]
+
+    def get_values(self):
+        """
+        Values of all the cells and ranges listed in the extraction plan,
+        read in one pass per sheet on first use
+        """
+        plan = self.get_plan()
+        if self.values is None:
+            for problem in plan.check_dimensions(self.get_worksheet):
+                self.logger.warning(problem)
+            self.values = plan.read(self.get_worksheet)
+        return self.values
+
     def get_data(self):
         """ Create a dict with combined data """
         self.validate_sheet_names_with_spec()
@@ -414,17 +356,19 @@ class ExcelParser():
         return data
 
     def combine_excel_design_specs(self, filenames):
-        design_spec = Workbook()
-        for exel_file in filenames:
-            loaded_workbook = load_workbook(exel_file, data_only=True)
-            for names in loaded_workbook.sheetnames:
-                design_spec_worksheet = design_spec.create_sheet(names)
-                loaded_workbook_ws = loaded_workbook[names]
-                for row in loaded_workbook_ws:
-                    for cell in row:
-                        design_spec_worksheet[cell.
-                                              coordinate].value = cell.value
-        return design_spec
+        """
+        Index the sheets of all the input excel files into a single
+        read-only view. Cells are streamed from the source files on demand,
+        or read up front by self.jobs worker processes when jobs > 1. The
+        spec is not matched yet, workers read what any of the specs reads
+        """
+        extent = ReadExtent.compile(self.excel_specs, self.detect_extent)
+        return CombinedWorkbook(filenames, self.jobs, self.engine, extent)
+
+    def close(self):
+        """ Close the input excel files """
+        self.wb_combined.close()
+        self.wb_pool.close()
 
     def get_xl_obj_and_sheetname(self, sheetname):
         """
@@ -434,7 +378,7 @@ class ExcelParser():
         if (re.search('.xlsx', sheetname) or re.search('.xls', sheetname)):
             """ Extract file name """
             source_xl_file = sheetname.split(':')[0]
-            wb = load_workbook(source_xl_file, data_only=True)
+            wb = self.wb_pool.get(source_xl_file)
             return [wb, sheetname.split(':')[1]]
         else:
             return [None, sheetname]
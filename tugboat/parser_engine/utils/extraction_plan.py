@@ -0,0 +1,324 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import re
+from collections import namedtuple
+from collections import OrderedDict
+from .workbook import read_columns
+from .workbook import scan_rows
+
+# Excel spec fields read by the parser. Adding a field to the spec only
+# needs an entry in one of the tables below.
+
+# (name, sheet key, row key, column key)
+CELLS = (
+    ('oam_ip', 'public_ip_sheet', 'oam_ip_row', 'oam_ip_col'),
+    ('oam_vlan', 'public_ip_sheet', 'oam_ip_row', 'oam_vlan_col'),
+    ('ingress', 'public_ip_sheet', 'ingress_ip_row', 'oam_ip_col'),
+    ('dns', 'dns_ntp_ldap_sheet', 'dns_row', 'dns_col'),
+    ('ntp', 'dns_ntp_ldap_sheet', 'ntp_row', 'ntp_col'),
+    ('domain', 'dns_ntp_ldap_sheet', 'domain_row', 'domain_col'),
+    ('ldap_subdomain', 'dns_ntp_ldap_sheet', 'login_domain_row', 'ldap_col'),
+    ('ldap_common_name', 'dns_ntp_ldap_sheet', 'global_group', 'ldap_col'),
+    ('ldap_url', 'dns_ntp_ldap_sheet', 'ldap_search_url_row', 'ldap_col'),
+    ('corridor', 'location_sheet', 'corridor_row', 'column'),
+    ('site_name', 'location_sheet', 'site_name_row', 'column'),
+    ('state_name', 'location_sheet', 'state_name_row', 'column'),
+    ('country_name', 'location_sheet', 'country_name_row', 'column'),
+    ('clli_name', 'location_sheet', 'clli_name_row', 'column'),
+)
+# (name, sheet key, start row key, end row key, column keys)
+ROW_BLOCKS = (
+    ('ipmi', 'ipmi_sheet_name', 'start_row', 'end_row',
+     ('hostname_col', 'ipmi_address_col', 'ipmi_gateway_col',
+      'host_profile_col')),
+    ('vlan', 'private_ip_sheet', 'vlan_start_row', 'vlan_end_row',
+     ('net_type_col', 'vlan_col')),
+    ('net', 'private_ip_sheet', 'net_start_row', 'net_end_row',
+     ('net_vlan_col', 'net_col')),
+)
+# (name, sheet key, row key, start column key, end column key)
+COLUMN_RUNS = (('oob', 'public_ip_sheet', 'oob_net_row', 'oob_net_start_col',
+                'oob_net_end_col'), )
+# Consecutive blank rows ending a block when its extent is detected
+BLANK_RUN = 3
+# Spec keys naming a sheet
+SHEET_KEYS = tuple(
+    OrderedDict.fromkeys(
+        entry[1] for entries in (CELLS, ROW_BLOCKS, COLUMN_RUNS)
+        for entry in entries))
+
+
+class CellRef(namedtuple('CellRef', ['name', 'row', 'column'])):
+    """ A single cell, read as a value """
+    __slots__ = ()
+
+
+class RowBlockRef(
+        namedtuple('RowBlockRef', [
+            'name', 'start_row', 'end_row', 'fields', 'detect', 'limit'
+        ])):
+    """
+    Rows start_row..end_row of the columns in fields, a tuple of
+    (spec key, column). Read as a dict of spec key -> list of values, plus
+    'row' -> list of row numbers.
+
+    With detect set, end_row is ignored: the rows are scanned from
+    start_row up to limit (None for the end of the sheet) and only the
+    rows holding data are kept
+    """
+    __slots__ = ()
+
+    def scan(self, ws):
+        """ Detect and read the extent of the block in ws """
+        kept, data, scanned = scan_rows(
+            ws, self.start_row, [column for _, column in self.fields],
+            self.limit, BLANK_RUN)
+        logger = logging.getLogger(__name__)
+        logger.info("Sheet '%s', %s rows: scanned %d from row %d, kept %d",
+                    ws.title, self.name, scanned, self.start_row, len(kept))
+        if kept and kept[-1] > self.end_row:
+            logger.info("Sheet '%s', %s rows: data found up to row %d, "
+                        "past end_row %d of the spec", ws.title, self.name,
+                        kept[-1], self.end_row)
+        values = {key: data[column] for key, column in self.fields}
+        values['row'] = kept
+        return values
+
+
+class ColumnRunRef(
+        namedtuple('ColumnRunRef',
+                   ['name', 'row', 'start_column', 'end_column'])):
+    """ Columns start_column..end_column of one row, read as a list """
+    __slots__ = ()
+
+
+class SheetPlan(
+        namedtuple('SheetPlan', [
+            'workbook', 'sheet', 'spec_sheet_name', 'cells', 'row_blocks',
+            'column_runs', 'min_row', 'max_row', 'columns'
+        ])):
+    """
+    Everything read from one (workbook, sheet). workbook is None for
+    sheets of the -x files, otherwise the file named in a qualified
+    "file.xlsx:sheet" spec entry
+    """
+    __slots__ = ()
+
+    @property
+    def max_column(self):
+        return self.columns[-1]
+
+    def extract(self, ws):
+        """ Read all the refs of this sheet in one ordered pass over ws """
+        data = read_columns(ws, self.min_row, self.max_row, self.columns)
+        values = {}
+        for cell in self.cells:
+            values[cell.name] = data[cell.column][cell.row - self.min_row]
+        for block in self.row_blocks:
+            if block.detect:
+                values[block.name] = block.scan(ws)
+                continue
+            start = block.start_row - self.min_row
+            end = block.end_row + 1 - self.min_row
+            values[block.name] = {
+                key: data[column][start:end]
+                for key, column in block.fields
+            }
+            values[block.name]['row'] = list(
+                range(block.start_row, block.end_row + 1))
+        for run in self.column_runs:
+            values[run.name] = [
+                data[column][run.row - self.min_row]
+                for column in range(run.start_column, run.end_column + 1)
+            ]
+        return values
+
+
+class ExtractionPlan(namedtuple('ExtractionPlan', ['spec', 'sheets'])):
+    """
+    An excel spec compiled into the list of cells and ranges to read,
+    grouped per sheet, so that every sheet is read in a single pass
+    """
+    __slots__ = ()
+
+    @staticmethod
+    def split_sheet_name(spec_sheet_name):
+        """
+        Split "MTN57a_AEC_Network_Design_v1.6.xlsx:Public IPs" into
+        workbook and sheet. Plain sheet names have no workbook
+        """
+        if (re.search('.xlsx', spec_sheet_name)
+                or re.search('.xls', spec_sheet_name)):
+            workbook, sheet = spec_sheet_name.split(':')[:2]
+            return workbook, sheet
+        return None, spec_sheet_name
+
+    @classmethod
+    def compile(cls, spec_name, spec, detect_extent=False):
+        """
+        Compile the spec named spec_name, spec being its dict. With
+        detect_extent the row blocks are scanned for their actual extent
+        instead of being read from start to end row
+        """
+        sheets = OrderedDict()
+
+        def sheet_refs(sheet_key):
+            spec_sheet_name = spec[sheet_key]
+            if spec_sheet_name not in sheets:
+                sheets[spec_sheet_name] = ([], [], [])
+            return sheets[spec_sheet_name]
+
+        for name, sheet_key, row_key, column_key in CELLS:
+            sheet_refs(sheet_key)[0].append(
+                CellRef(name, spec[row_key], spec[column_key]))
+        for name, sheet_key, start_key, end_key, column_keys in ROW_BLOCKS:
+            fields = tuple((key, spec[key]) for key in column_keys)
+            sheet_refs(sheet_key)[1].append(
+                RowBlockRef(name, spec[start_key], spec[end_key], fields,
+                            detect_extent, None))
+        for name, sheet_key, row_key, start_key, end_key in COLUMN_RUNS:
+            sheet_refs(sheet_key)[2].append(
+                ColumnRunRef(name, spec[row_key], spec[start_key],
+                             spec[end_key]))
+
+        sheet_plans = []
+        for spec_sheet_name, (cells, row_blocks, column_runs) in \
+                sheets.items():
+            if detect_extent:
+                row_blocks = cls.limit_blocks(cells, row_blocks, column_runs)
+            rows = set()
+            columns = set()
+            for cell in cells:
+                rows.add(cell.row)
+                columns.add(cell.column)
+            for block in row_blocks:
+                rows.add(block.start_row)
+                if not block.detect:
+                    rows.add(block.end_row)
+                columns.update(column for _, column in block.fields)
+            for run in column_runs:
+                rows.add(run.row)
+                columns.update(range(run.start_column, run.end_column + 1))
+            workbook, sheet = cls.split_sheet_name(spec_sheet_name)
+            sheet_plans.append(
+                SheetPlan(workbook, sheet, spec_sheet_name, tuple(cells),
+                          tuple(row_blocks), tuple(column_runs), min(rows),
+                          max(rows), tuple(sorted(columns))))
+        return cls(spec_name, tuple(sheet_plans))
+
+    @staticmethod
+    def limit_blocks(cells, row_blocks, column_runs):
+        """
+        A detected block stops short of the next thing read from the same
+        sheet, e.g. the vlan block ends before the network block starts
+        """
+        starts = [cell.row for cell in cells]
+        starts += [block.start_row for block in row_blocks]
+        starts += [run.row for run in column_runs]
+        limited = []
+        for block in row_blocks:
+            following = [row for row in starts if row > block.start_row]
+            limit = min(following) - 1 if following else None
+            limited.append(block._replace(limit=limit))
+        return limited
+
+    def check_dimensions(self, get_worksheet):
+        """
+        Compare the extent read by the plan with the dimensions recorded in
+        each sheet, without reading any cell. Returns a list of problems
+        """
+        problems = []
+        for sheet_plan in self.sheets:
+            ws = get_worksheet(sheet_plan.workbook, sheet_plan.sheet)
+            if ws.max_row is not None and sheet_plan.max_row > ws.max_row:
+                problems.append(
+                    "Sheet '{}' has {} rows, spec '{}' reads up to row {}".
+                    format(sheet_plan.spec_sheet_name, ws.max_row, self.spec,
+                           sheet_plan.max_row))
+            if (ws.max_column is not None
+                    and sheet_plan.max_column > ws.max_column):
+                problems.append(
+                    "Sheet '{}' has {} columns, spec '{}' reads up to column "
+                    "{}".format(sheet_plan.spec_sheet_name, ws.max_column,
+                                self.spec, sheet_plan.max_column))
+        return problems
+
+    def read(self, get_worksheet):
+        """
+        Execute the plan. get_worksheet(workbook, sheet) returns the
+        worksheet to read. Returns a dict of ref name -> value(s)
+        """
+        values = {}
+        for sheet_plan in self.sheets:
+            ws = get_worksheet(sheet_plan.workbook, sheet_plan.sheet)
+            values.update(sheet_plan.extract(ws))
+        return values
+
+
+class ReadExtent(namedtuple('ReadExtent', ['max_row', 'max_column',
+                                           'scans'])):
+    """
+    Extent of the sheets of the -x files read by any of the specs, known
+    before one of them is matched: rows up to max_row and columns up to
+    max_column, and past max_row the rows scanned by detected blocks
+    without a limit, as (start row, columns)
+    """
+    __slots__ = ()
+
+    @classmethod
+    def compile(cls, excel_specs, detect_extent=False):
+        """ Extent of the specs of excel_specs, None if one is incomplete """
+        max_row = max_column = 1
+        scans = set()
+        for name, spec in excel_specs['specs'].items():
+            try:
+                plan = ExtractionPlan.compile(name, spec, detect_extent)
+                headers = [(spec['header_row'],
+                            spec[key[:-len('_header')] + '_col'])
+                           for key in spec if key.endswith('_header')]
+            except KeyError:
+                return None
+            for row, column in headers:
+                max_row = max(max_row, row)
+                max_column = max(max_column, column)
+            for sheet_plan in plan.sheets:
+                if sheet_plan.workbook is not None:
+                    continue
+                max_row = max(max_row, sheet_plan.max_row)
+                max_column = max(max_column, sheet_plan.max_column)
+                for block in sheet_plan.row_blocks:
+                    if not block.detect:
+                        continue
+                    if block.limit is not None:
+                        max_row = max(max_row, block.limit)
+                    else:
+                        scans.add((block.start_row,
+                                   tuple(sorted(
+                                       set(column
+                                           for _, column in block.fields)))))
+        return cls(max_row, max_column, tuple(sorted(scans)))
+
+    def last_row(self, ws):
+        """
+        Last row of ws read by the specs. Detected blocks are scanned the
+        way RowBlockRef.scan() does, so they stop at the same row
+        """
+        last_row = self.max_row
+        for start_row, columns in self.scans:
+            _, _, scanned = scan_rows(ws, start_row, columns, None,
+                                      BLANK_RUN)
+            last_row = max(last_row, start_row + scanned - 1)
+        return last_row
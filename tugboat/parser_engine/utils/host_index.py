@@ -0,0 +1,89 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import re
+from collections import OrderedDict
+
+# Hostnames are <region><rack id><host id>, e.g. abc12r01c001 is host c001
+# of rack r01 in region abc12. The rack id is the last 'r<digits>' followed
+# by more of the hostname
+HOSTNAME_PATTERN = re.compile(r'\w.*(r\d+)\w.*')
+
+
+def get_rack_id(host):
+    """ Rack id of host, e.g. 'r01' """
+    match = HOSTNAME_PATTERN.search(host)
+    if match is None:
+        raise ValueError("No rack found in hostname '{}'".format(host))
+    return match.group(1)
+
+
+class HostIndex():
+    """
+    Rack and role index of the hosts read from the excel files, built in a
+    single pass over the hostnames.
+
+    racks maps rack ids to rack names ('r01' -> 'rack01') in the order
+    they are first seen, rack_hosts rack names to their hosts in hostname
+    order and host_rack every host to its rack name. roles and host_type
+    are filled by categorize().
+    """
+
+    def __init__(self, hostnames):
+        self.region_name = ''
+        self.racks = OrderedDict()
+        self.rack_hosts = OrderedDict()
+        self.host_rack = {}
+        self.host_type = {}
+        self.roles = OrderedDict()
+        for host in hostnames:
+            rack_id = get_rack_id(host)
+            if not self.region_name:
+                self.region_name = host.split(rack_id)[0]
+            if rack_id not in self.racks:
+                rack = rack_id.replace('r', 'rack')
+                self.racks[rack_id] = rack
+                self.rack_hosts[rack] = []
+            rack = self.racks[rack_id]
+            self.rack_hosts[rack].append(host)
+            self.host_rack[host] = rack
+
+    @property
+    def sorted_racks(self):
+        """ Rack names, ordered by rack id """
+        return [self.racks[rack_id] for rack_id in sorted(self.racks)]
+
+    def categorize(self, host_profiles, ctrl_profile, genesis=None):
+        """
+        Sort hosts into genesis, controller and compute from their host
+        profile. The genesis host is genesis when given and a controller,
+        otherwise the first controller in hostname order
+        """
+        self.host_type = {}
+        self.roles = OrderedDict(
+            (role, []) for role in ('genesis', 'controller', 'compute'))
+        if host_profiles.get(genesis) != ctrl_profile:
+            genesis = None
+        for host in sorted(host_profiles):
+            if host_profiles[host] != ctrl_profile:
+                role = 'compute'
+            elif host == genesis:
+                role = 'genesis'
+            elif genesis is None and not self.roles['genesis']:
+                role = 'genesis'
+            else:
+                role = 'controller'
+            self.host_type[host] = role
+            self.roles[role].append(host)
+        return self.host_type
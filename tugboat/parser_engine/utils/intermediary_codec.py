@@ -0,0 +1,119 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import struct
+import zlib
+import yaml
+
+try:
+    from yaml import CSafeDumper as SafeDumper
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    """ PyYAML built without libyaml """
+    from yaml import SafeDumper
+    from yaml import SafeLoader
+
+# Binary snapshots start with MAGIC and a format version, followed by the
+# zlib compressed JSON document
+MAGIC = b'TUGBOAT\x00'
+SNAPSHOT_VERSION = 1
+HEADER = struct.Struct('>8sH')
+
+
+class YamlCodec():
+    """ YAML, with libyaml when available """
+    name = 'yaml'
+    extension = 'yaml'
+    binary = False
+
+    @staticmethod
+    def dump(data, stream):
+        yaml.dump(data, stream, Dumper=SafeDumper, default_flow_style=False)
+
+    @staticmethod
+    def load(stream):
+        return yaml.load(stream, Loader=SafeLoader)
+
+
+class JsonCodec():
+    """ Compact JSON, with sorted keys like the YAML output """
+    name = 'json'
+    extension = 'json'
+    binary = False
+
+    @staticmethod
+    def dump(data, stream):
+        json.dump(data, stream, sort_keys=True, separators=(',', ':'))
+
+    @staticmethod
+    def load(stream):
+        return json.load(stream)
+
+
+class SnapshotCodec():
+    """ Versioned binary snapshot: header and zlib compressed JSON """
+    name = 'binary'
+    extension = 'bin'
+    binary = True
+
+    @staticmethod
+    def dump(data, stream):
+        stream.write(HEADER.pack(MAGIC, SNAPSHOT_VERSION))
+        stream.write(
+            zlib.compress(
+                json.dumps(data, separators=(',', ':')).encode('utf-8')))
+
+    @staticmethod
+    def load(stream):
+        magic, version = HEADER.unpack(stream.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("Not an intermediary snapshot")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(
+                "Unsupported intermediary snapshot version {}".format(version))
+        return json.loads(zlib.decompress(stream.read()).decode('utf-8'))
+
+
+CODECS = {codec.name: codec for codec in (YamlCodec, JsonCodec, SnapshotCodec)}
+INTERMEDIARY_FORMATS = tuple(CODECS)
+
+
+def get_codec(name):
+    return CODECS[name]
+
+
+def detect_codec(file_name):
+    """ Snapshots are told by their header, JSON by the file extension """
+    with open(file_name, 'rb') as f:
+        if f.read(len(MAGIC)) == MAGIC:
+            return SnapshotCodec
+    if file_name.endswith('.json'):
+        return JsonCodec
+    return YamlCodec
+
+
+def dump_intermediary(data, file_name, codec=YamlCodec):
+    """ Stream data to file_name """
+    mode = 'wb' if codec.binary else 'w'
+    with open(file_name, mode) as f:
+        codec.dump(data, f)
+
+
+def load_intermediary(file_name):
+    """ Load an intermediary written in any of the formats """
+    codec = detect_codec(file_name)
+    mode = 'rb' if codec.binary else 'r'
+    with open(file_name, mode) as f:
+        return codec.load(f)
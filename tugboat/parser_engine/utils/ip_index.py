@@ -0,0 +1,152 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import netaddr
+
+# Address width of each IP version, in bits
+WIDTHS = {4: 32, 6: 128}
+
+
+def address_int(address):
+    """ IP version and integer value of address """
+    ip = netaddr.IPAddress(str(address))
+    return ip.version, int(ip)
+
+
+def range_blocks(first, last, width):
+    """ Fewest (first address, prefix length) blocks covering first..last """
+    blocks = []
+    while first <= last:
+        """ Largest aligned block starting at first that fits """
+        size = first & -first if first else 1 << width
+        while size > last - first + 1:
+            size >>= 1
+        blocks.append((first, width + 1 - size.bit_length()))
+        first += size
+    return blocks
+
+
+def unique(values):
+    """ values without repetitions, in order """
+    seen = set()
+    return [
+        value for value in values if not (value in seen or seen.add(value))
+    ]
+
+
+class _Node():
+    __slots__ = ('children', 'values')
+
+    def __init__(self):
+        self.children = [None, None]
+        self.values = []
+
+
+class IPIndex():
+    """
+    Binary prefix trie of networks and address ranges, each stored with a
+    hashable value.
+
+    A network is stored on the node of its prefix, a range on the nodes
+    of the CIDR blocks covering it. Queries walk one node per prefix bit
+    at most, so they cost the same with ten entries or ten thousand.
+    """
+
+    def __init__(self):
+        self.roots = {version: _Node() for version in WIDTHS}
+        self._values = []
+
+    def __len__(self):
+        return len(self._values)
+
+    def values(self):
+        """ Values of the entries, in the order they were added """
+        return list(self._values)
+
+    def _insert(self, version, first, prefixlen, value):
+        width = WIDTHS[version]
+        node = self.roots[version]
+        for i in range(prefixlen):
+            bit = (first >> (width - 1 - i)) & 1
+            if node.children[bit] is None:
+                node.children[bit] = _Node()
+            node = node.children[bit]
+        node.values.append(value)
+
+    def _walk(self, version, first, prefixlen):
+        """
+        Values of the entries containing the block, outermost first, and
+        the node of the block, None when there is none
+        """
+        width = WIDTHS[version]
+        node = self.roots[version]
+        values = list(node.values)
+        for shift in range(width - 1, width - 1 - prefixlen, -1):
+            node = node.children[(first >> shift) & 1]
+            if node is None:
+                return values, None
+            if node.values:
+                values.extend(node.values)
+        return values, node
+
+    def _overlapping(self, version, first, prefixlen):
+        values, node = self._walk(version, first, prefixlen)
+        if node is not None:
+            """ Entries inside the block """
+            stack = [child for child in node.children if child is not None]
+            while stack:
+                node = stack.pop()
+                values.extend(node.values)
+                stack.extend(
+                    child for child in node.children if child is not None)
+        return values
+
+    def add(self, network, value):
+        """ Add network, a CIDR or Subnet """
+        network = netaddr.IPNetwork(str(network))
+        self._insert(network.version, network.first, network.prefixlen,
+                     value)
+        self._values.append(value)
+
+    def add_range(self, start, end, value):
+        """ Add the addresses from start to end included """
+        version, first = address_int(start)
+        last = address_int(end)[1]
+        for block, prefixlen in range_blocks(first, last, WIDTHS[version]):
+            self._insert(version, block, prefixlen, value)
+        self._values.append(value)
+
+    def lookup(self, address):
+        """ Values of the entries containing address, outermost first """
+        return self.lookup_value(*address_int(address))
+
+    def lookup_value(self, version, value):
+        """ lookup() of the address of integer value """
+        return unique(self._walk(version, value, WIDTHS[version])[0])
+
+    def overlaps(self, network):
+        """ Values of the entries sharing addresses with network """
+        network = netaddr.IPNetwork(str(network))
+        return unique(
+            self._overlapping(network.version, network.first,
+                              network.prefixlen))
+
+    def overlaps_range(self, start, end):
+        """ Values of the entries sharing addresses with start..end """
+        version, first = address_int(start)
+        last = address_int(end)[1]
+        values = []
+        for block, prefixlen in range_blocks(first, last, WIDTHS[version]):
+            values.extend(self._overlapping(version, block, prefixlen))
+        return unique(values)
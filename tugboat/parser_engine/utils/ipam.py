@@ -0,0 +1,164 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import netaddr
+
+
+class Subnet():
+    """
+    A subnet and the addresses derived from it.
+
+    Addresses are computed from their offset in the subnet, with the same
+    indexing as list(netaddr.IPNetwork(cidr)): 0 is the network address and
+    negative offsets count back from the broadcast address. No list of the
+    subnet addresses is ever built, so a /12 costs the same as a /29.
+    """
+
+    __slots__ = ('cidr', 'network', 'first', 'size', 'version')
+
+    def __init__(self, cidr):
+        self.network = netaddr.IPNetwork(cidr)
+        self.cidr = str(self.network)
+        self.first = self.network.first
+        self.size = self.network.size
+        self.version = self.network.version
+
+    def __str__(self):
+        return self.cidr
+
+    def __repr__(self):
+        return "Subnet('{}')".format(self.cidr)
+
+    def __len__(self):
+        return self.size
+
+    def __eq__(self, other):
+        if not isinstance(other, Subnet):
+            return NotImplemented
+        return (self.version, self.first, self.size) == \
+            (other.version, other.first, other.size)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    def __hash__(self):
+        return hash((self.version, self.first, self.size))
+
+    def __contains__(self, address):
+        return address in self.network
+
+    def value(self, offset):
+        """ Address at offset, as an integer """
+        if offset < 0:
+            offset += self.size
+        if not 0 <= offset < self.size:
+            raise IndexError("Offset {} out of range for subnet {}".format(
+                offset, self.cidr))
+        return self.first + offset
+
+    def address(self, offset):
+        """ Address at offset, as a string """
+        return str(netaddr.IPAddress(self.value(offset), self.version))
+
+    def ranges(self, ips_to_leave, static_end=-2, dhcp=False):
+        """
+        Reserved and static ranges of the subnet. Offsets 1..ips_to_leave
+        are reserved and the static range runs from the next address to
+        static_end. With dhcp the upper half of the subnet, up to the last
+        address before the broadcast, goes to a DHCP range instead
+        """
+        ranges = {}
+        if dhcp:
+            mid = self.size // 2
+            ranges['dhcp_start'] = self.address(mid)
+            ranges['dhcp_end'] = self.address(-2)
+            static_end = mid - 1
+        ranges['static_start'] = self.address(ips_to_leave + 1)
+        ranges['static_end'] = self.address(static_end)
+        ranges['reserved_start'] = self.address(1)
+        ranges['reserved_end'] = self.address(ips_to_leave)
+        return ranges
+
+    def static_offsets(self, ips_to_leave, static_end=-2, dhcp=False):
+        """ First and last offsets of the static range of ranges() """
+        if dhcp:
+            static_end = self.size // 2 - 1
+        elif static_end < 0:
+            static_end += self.size
+        return ips_to_leave + 1, static_end
+
+    def capacity(self, ips_to_leave, static_end=-2, dhcp=False):
+        """ Number of addresses of the static range of ranges() """
+        first, last = self.static_offsets(ips_to_leave, static_end, dhcp)
+        return max(0, last + 1 - first)
+
+
+_subnets = {}
+
+
+def get_subnet(cidr):
+    """ Subnet for cidr, parsed once per process """
+    cidr = str(cidr)
+    if cidr not in _subnets:
+        _subnets[cidr] = Subnet(cidr)
+    return _subnets[cidr]
+
+
+class AddressAllocator():
+    """
+    Hands out the addresses of the static range of ranges, a
+    records.NetworkRanges, in offset order, skipping the addresses
+    reserved for hosts keeping their previous address. Without
+    reservations the n-th address handed out is the n-th of the range
+    """
+
+    def __init__(self, ranges):
+        self.subnet = ranges.subnet
+        self.first, self.last = ranges.static_offsets()
+        self.next_offset = self.first
+        self.taken = set()
+
+    def offset(self, address):
+        """ Offset of address in the subnet, None if outside of it """
+        try:
+            if address not in self.subnet:
+                return None
+        except (netaddr.AddrFormatError, TypeError, ValueError):
+            return None
+        return int(netaddr.IPAddress(address)) - self.subnet.first
+
+    def reserve(self, address):
+        """
+        Take address. Returns its integer value, None if it is outside the
+        static range, e.g. in the reserved or DHCP range, or taken
+        """
+        offset = self.offset(address)
+        if offset is None or offset in self.taken:
+            return None
+        if not self.first <= offset <= self.last:
+            return None
+        self.taken.add(offset)
+        return self.subnet.value(offset)
+
+    def allocate(self):
+        """ Next free address, as an integer """
+        while self.next_offset in self.taken:
+            self.next_offset += 1
+        value = self.subnet.value(self.next_offset)
+        self.taken.add(self.next_offset)
+        self.next_offset += 1
+        return value
@@ -0,0 +1,108 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+from array import array
+from collections import OrderedDict
+import netaddr
+
+# Smallest array type code holding an IPv4 address
+IPV4_TYPECODE = next(code for code in 'IL' if array(code).itemsize >= 4)
+
+
+def intern_name(name):
+    """ Single shared copy of a host, rack, profile or network name """
+    return sys.intern(str(name))
+
+
+class HostRecord():
+    """
+    A host read from the excel files, with its rack and role. Its
+    addresses are in the AddressTable of the site, at row
+    """
+
+    __slots__ = ('name', 'rack', 'row', 'ipmi_address', 'host_profile',
+                 'type')
+
+    def __init__(self, name, rack, row, ipmi_address, host_profile):
+        self.name = intern_name(name)
+        self.rack = intern_name(rack)
+        self.row = row
+        self.ipmi_address = ipmi_address
+        self.host_profile = intern_name(host_profile)
+        self.type = None
+
+    def __repr__(self):
+        return "HostRecord('{}')".format(self.name)
+
+
+class AddressTable():
+    """
+    Addresses of the hosts, one row per host and one column per network
+    type. IPv4 columns are arrays of 32 bit integers, IPv6 columns lists of
+    integers. Addresses become strings in address() only
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.columns = OrderedDict()
+        self.versions = {}
+
+    def add_column(self, net_type, version):
+        """ Column for the addresses of net_type, kept if there is one """
+        if net_type in self.columns:
+            return
+        if version == 4:
+            column = array(IPV4_TYPECODE, [0]) * self.size
+        else:
+            column = [0] * self.size
+        net_type = intern_name(net_type)
+        self.versions[net_type] = version
+        self.columns[net_type] = column
+
+    def set(self, row, net_type, value):
+        self.columns[net_type][row] = value
+
+    def value(self, row, net_type):
+        """ IP version and integer value of the address of net_type of row """
+        return self.versions[net_type], self.columns[net_type][row]
+
+    def address(self, row, net_type):
+        """ Address of net_type of row, as a string """
+        return str(
+            netaddr.IPAddress(self.columns[net_type][row],
+                              self.versions[net_type]))
+
+
+class NetworkRanges():
+    """
+    Reserved, static and DHCP ranges of a subnet, as the arguments of
+    Subnet.ranges(). They are formatted by as_dict() only
+    """
+
+    __slots__ = ('subnet', 'ips_to_leave', 'static_end', 'dhcp')
+
+    def __init__(self, subnet, ips_to_leave, static_end=-2, dhcp=False):
+        self.subnet = subnet
+        self.ips_to_leave = ips_to_leave
+        self.static_end = static_end
+        self.dhcp = dhcp
+
+    def as_dict(self):
+        return self.subnet.ranges(self.ips_to_leave, self.static_end,
+                                  self.dhcp)
+
+    def static_offsets(self):
+        return self.subnet.static_offsets(self.ips_to_leave, self.static_end,
+                                          self.dhcp)
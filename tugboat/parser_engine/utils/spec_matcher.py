@@ -0,0 +1,195 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import re
+from collections import OrderedDict
+import yaml
+from ..check_exceptions import (
+    NoSpecMatched, )
+from .extraction_plan import ExtractionPlan
+from .extraction_plan import SHEET_KEYS
+from .workbook import read_columns
+
+
+def get_spec_files(excel_specs):
+    """
+    excel_specs is either a single spec file or a directory of them.
+    Returns the spec files, in the order their specs are tried
+    """
+    if not os.path.isdir(excel_specs):
+        return [excel_specs]
+    return [
+        os.path.join(excel_specs, name)
+        for name in sorted(os.listdir(excel_specs))
+        if name.endswith('.yaml') or name.endswith('.yml')
+    ]
+
+
+def load_excel_specs(excel_specs):
+    """ Load and combine the specs of all the spec files """
+    logger = logging.getLogger(__name__)
+    specs = OrderedDict()
+    for spec_file in get_spec_files(excel_specs):
+        with open(spec_file, 'r') as f:
+            spec_data = yaml.safe_load(f.read())
+        if not spec_data or 'specs' not in spec_data:
+            logger.warning("No specs found in %s", spec_file)
+            continue
+        for name, spec in spec_data['specs'].items():
+            if name in specs:
+                logger.warning("Spec '%s' from %s already loaded, ignored",
+                               name, spec_file)
+                continue
+            specs[name] = spec
+    return {'specs': specs}
+
+
+def sanitize(string):
+    """ Remove extra spaces and convert string to lower case """
+    return str(string).replace(' ', '').lower()
+
+
+class SpecMatcher():
+    """
+    Picks the excel spec matching a workbook.
+
+    A spec matches when every sheet it names is found in the workbook and
+    every header it declares is found in its header row. Sheet names and
+    headers in the spec are regular expressions, compared with spaces
+    removed and lower cased. Headers are declared as '<field>_header' next
+    to the '<field>_col' they label, e.g. ipmi_address_header, and are
+    looked up in 'header_row' of the IPMI sheet.
+
+    All patterns are compiled once, and a workbook is scored against every
+    spec at the same time: each sheet's header rows are read once, however
+    many specs look at them.
+    """
+
+    _loaded = {}
+
+    def __init__(self, excel_specs):
+        self.logger = logging.getLogger(__name__)
+        self.excel_specs = excel_specs
+        self._patterns = {}
+        self._sheet_checks = OrderedDict()
+        self._header_checks = OrderedDict()
+        for name, spec in excel_specs['specs'].items():
+            self._sheet_checks[name] = [
+                (key, self._compile(spec[key])) for key in SHEET_KEYS
+                if ExtractionPlan.split_sheet_name(spec[key])[0] is None
+            ]
+            self._header_checks[name] = [
+                (spec['header_row'], spec[key[:-len('_header')] + '_col'],
+                 self._compile(spec[key])) for key in sorted(spec)
+                if key.endswith('_header')
+            ]
+
+    @classmethod
+    def load(cls, excel_specs):
+        """
+        Matcher for a spec file or directory, loaded and compiled once per
+        process so that a batch of packages reuses it. It is loaded again
+        when a spec file is added, removed or changed
+        """
+        key = os.path.abspath(excel_specs)
+        signature = tuple((os.path.abspath(spec_file), stat.st_mtime_ns,
+                           stat.st_size)
+                          for spec_file in get_spec_files(excel_specs)
+                          for stat in [os.stat(spec_file)])
+        if key not in cls._loaded or cls._loaded[key][0] != signature:
+            cls._loaded[key] = (signature,
+                                cls(load_excel_specs(excel_specs)))
+        return cls._loaded[key][1]
+
+    def _compile(self, pattern):
+        pattern = sanitize(pattern)
+        if pattern not in self._patterns:
+            self._patterns[pattern] = re.compile(pattern)
+        return self._patterns[pattern]
+
+    def _find_sheets(self, sheetnames):
+        """ Resolve every compiled sheet pattern to a sheet, or None """
+        sanitized = [(sanitize(sheetname), sheetname)
+                     for sheetname in sheetnames]
+        found = {}
+        for pattern in self._patterns.values():
+            found[pattern] = None
+            for value, sheetname in sanitized:
+                if pattern.search(value):
+                    found[pattern] = sheetname
+                    break
+        return found
+
+    def match(self, workbook):
+        """
+        Return (spec name, {sheet key: sheet name}) of the best matching
+        spec. The most specific spec, i.e. the one with the most checks,
+        wins; ties go to the spec loaded first
+        """
+        specs = list(self.excel_specs['specs'])
+        if len(specs) == 1:
+            return specs[0], {}
+        found = self._find_sheets(workbook.sheetnames)
+        candidates = OrderedDict()
+        for name in specs:
+            sheets = {
+                key: found[pattern]
+                for key, pattern in self._sheet_checks[name]
+            }
+            if None not in sheets.values():
+                candidates[name] = sheets
+
+        """
+        Headers are only checked on an IPMI sheet of the workbook, a
+        "file.xlsx:sheet" one is read from another workbook
+        """
+        header_cells = {}
+        for name, sheets in candidates.items():
+            if 'ipmi_sheet_name' not in sheets:
+                continue
+            for row, column, _ in self._header_checks[name]:
+                header_cells.setdefault(sheets['ipmi_sheet_name'],
+                                        set()).add((row, column))
+        header_values = {}
+        for sheetname, cells in header_cells.items():
+            rows = [row for row, _ in cells]
+            data = read_columns(workbook[sheetname], min(rows), max(rows),
+                                [column for _, column in cells])
+            for row, column in cells:
+                header_values[(sheetname, row, column)] = \
+                    data[column][row - min(rows)]
+
+        best = None
+        best_score = -1
+        for name, sheets in candidates.items():
+            score = len(sheets)
+            header_checks = self._header_checks[name]
+            if 'ipmi_sheet_name' not in sheets:
+                header_checks = []
+            for row, column, pattern in header_checks:
+                value = header_values[(sheets['ipmi_sheet_name'], row,
+                                       column)]
+                if value is None or not pattern.search(sanitize(value)):
+                    score = None
+                    break
+                score += 1
+            self.logger.debug("Spec '%s' score: %s", name, score)
+            if score is not None and score > best_score:
+                best, best_score = name, score
+        if best is None:
+            raise NoSpecMatched(self.excel_specs)
+        self.logger.info("Excel spec '%s' matched", best)
+        return best, candidates[best]
@@ -0,0 +1,97 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import time
+from collections import namedtuple
+from collections import OrderedDict
+
+
+class Stage(namedtuple('Stage', ['name', 'function', 'requires'])):
+    """
+    A step of a pipeline. function takes no argument and returns the
+    output of the stage, requires names the stages whose output or side
+    effects it uses
+    """
+    __slots__ = ()
+
+
+class StageGraph():
+    """
+    Runs a graph of stages, each one once.
+
+    The output of every stage is memoized: result(name) runs the stage and
+    whatever it requires on first use only, so stages can ask for the
+    output of the stages they require instead of recomputing it. run()
+    runs all the stages in dependency order, and the wall time of every
+    stage is kept in timings.
+    """
+
+    def __init__(self, stages):
+        self.logger = logging.getLogger(__name__)
+        self.stages = OrderedDict((stage.name, stage) for stage in stages)
+        for stage in self.stages.values():
+            for name in stage.requires:
+                if name not in self.stages:
+                    raise ValueError("Stage '{}' requires unknown stage "
+                                     "'{}'".format(stage.name, name))
+        self.results = {}
+        self.timings = OrderedDict()
+        self.order = self._sort()
+
+    def _sort(self):
+        """ Stage names in dependency order, declaration order on ties """
+        order = []
+        state = {}
+
+        def visit(name, path):
+            if state.get(name) == 'done':
+                return
+            if state.get(name) == 'visiting':
+                raise ValueError("Stage cycle: {}".format(' -> '.join(
+                    path + [name])))
+            state[name] = 'visiting'
+            for required in self.stages[name].requires:
+                visit(required, path + [name])
+            state[name] = 'done'
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    def _run_stage(self, name):
+        start = time.time()
+        result = self.stages[name].function()
+        self.timings[name] = time.time() - start
+        self.logger.debug("Stage %s: %.3fs", name, self.timings[name])
+        return result
+
+    def result(self, name):
+        """ Output of stage name, running it and its requirements once """
+        if name not in self.results:
+            for required in self.stages[name].requires:
+                self.result(required)
+            self.results[name] = self._run_stage(name)
+        return self.results[name]
+
+    def run(self):
+        """ Run every stage not run yet, in dependency order """
+        for name in self.order:
+            self.result(name)
+        self.logger.debug(
+            "Stage timings:\n%s", '\n'.join(
+                '{}: {:.3f}s'.format(name, seconds)
+                for name, seconds in self.timings.items()))
+        return self.results
@@ -0,0 +1,368 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import logging
+import os
+import zipfile
+from collections import namedtuple
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree.ElementTree import ParseError
+from openpyxl import load_workbook
+from .xlsx_reader import XlsxReader
+
+CellValue = namedtuple('CellValue', ['row', 'column', 'value'])
+
+# Engines reading the xlsx files
+XLSX_ENGINES = ('openpyxl', 'xml')
+
+
+def open_workbook(filename, engine='openpyxl'):
+    """
+    Open filename in read-only mode. The 'xml' engine parses the xlsx
+    archive directly and falls back to openpyxl for files it can not read
+    """
+    if engine == 'xml':
+        try:
+            return XlsxReader(filename)
+        except (zipfile.BadZipFile, KeyError, ParseError) as error:
+            logging.getLogger(__name__).warning(
+                "Unable to read %s with the xml engine (%s), "
+                "falling back to openpyxl", filename, error)
+    return load_workbook(filename, read_only=True, data_only=True)
+
+
+class SheetView():
+    """
+    Forward-only, row cached view over a read-only worksheet.
+
+    Rows are pulled from the underlying openpyxl stream only as far as the
+    highest row requested so far, and are kept as plain value tuples.
+    """
+
+    def __init__(self, title, dimensions, rows):
+        self.title = title
+        """ Dimensions as recorded in the sheet, may be missing or stale """
+        self.min_row, self.max_row, self.min_column, self.max_column = \
+            dimensions
+        self._stream = iter(rows)
+        self._rows = []
+        self._exhausted = False
+
+    @staticmethod
+    def get_dimensions(worksheet):
+        return (worksheet.min_row, worksheet.max_row, worksheet.min_column,
+                worksheet.max_column)
+
+    @classmethod
+    def from_worksheet(cls, worksheet):
+        """ Stream rows from a read-only openpyxl worksheet """
+        dimensions = cls.get_dimensions(worksheet)
+        """
+        Recorded dimensions are not trusted for reading, otherwise rows
+        beyond a stale dimension would silently be dropped
+        """
+        worksheet.reset_dimensions()
+        return cls(worksheet.title, dimensions,
+                   worksheet.iter_rows(values_only=True))
+
+    def _read_up_to(self, row):
+        """ Pull rows from the stream until 'row' is cached """
+        while len(self._rows) < row and not self._exhausted:
+            try:
+                self._rows.append(next(self._stream))
+            except StopIteration:
+                self._exhausted = True
+
+    def value(self, row, column):
+        """ Return the value at row, column (both 1 based) """
+        self._read_up_to(row)
+        try:
+            return self._rows[row - 1][column - 1]
+        except IndexError:
+            return None
+
+    def cell(self, row, column):
+        """ openpyxl style accessor, only the value is available """
+        return CellValue(row, column, self.value(row, column))
+
+    def iter_rows(self,
+                  min_row=1,
+                  max_row=None,
+                  min_col=1,
+                  max_col=None,
+                  values_only=True):
+        """
+        Yield tuples of values for the requested range. values_only is
+        accepted for compatibility with openpyxl worksheets, only values
+        are ever returned
+        """
+        row = min_row
+        while max_row is None or row <= max_row:
+            self._read_up_to(row)
+            if row > len(self._rows):
+                break
+            values = self._rows[row - 1]
+            width = (max_col or len(values)) + 1 - min_col
+            values = tuple(values[min_col - 1:min_col - 1 + width])
+            yield values + (None, ) * (width - len(values))
+            row += 1
+
+
+def read_columns(ws, start_row, end_row, columns):
+    """
+    Read the given columns of rows start_row..end_row in a single pass.
+
+    Works on SheetView and openpyxl worksheets alike. Returns a dict of
+    column index -> list of values, one entry per row in the range.
+    """
+    columns = sorted(set(columns))
+    min_col = columns[0]
+    max_col = columns[-1]
+    data = {column: [] for column in columns}
+    n_rows = 0
+    for values in ws.iter_rows(
+            min_row=start_row,
+            max_row=end_row,
+            min_col=min_col,
+            max_col=max_col,
+            values_only=True):
+        for column in columns:
+            data[column].append(values[column - min_col])
+        n_rows += 1
+    """ Rows missing at the end of the sheet read as empty cells """
+    for column in columns:
+        data[column].extend([None] * (end_row + 1 - start_row - n_rows))
+    return data
+
+
+def is_blank(value):
+    """ Empty cells and cells holding only spaces are blank """
+    return value is None or (isinstance(value, str) and not value.strip())
+
+
+def scan_rows(ws, start_row, columns, end_row=None, blank_run=3):
+    """
+    Find the rows holding data in the given columns, from start_row on.
+
+    The scan stops after end_row, at the end of the sheet, or after
+    blank_run consecutive blank rows. Past the dimensions recorded in the
+    sheet a single blank row ends the scan. Blank rows inside the block are
+    skipped. Returns (row numbers kept, {column: [values]}, rows scanned).
+    """
+    columns = sorted(set(columns))
+    min_col = columns[0]
+    max_col = columns[-1]
+    recorded_max_row = ws.max_row
+    data = {column: [] for column in columns}
+    kept = []
+    scanned = 0
+    blanks = 0
+    for row, values in enumerate(
+            ws.iter_rows(
+                min_row=start_row,
+                max_row=end_row,
+                min_col=min_col,
+                max_col=max_col,
+                values_only=True), start_row):
+        scanned += 1
+        if all(is_blank(value) for value in values):
+            blanks += 1
+            if recorded_max_row is not None and row > recorded_max_row:
+                break
+            if blanks >= blank_run:
+                break
+            continue
+        blanks = 0
+        kept.append(row)
+        for column in columns:
+            data[column].append(values[column - min_col])
+    return kept, data, scanned
+
+
+def extract_workbook(filename, engine='openpyxl', extent=None):
+    """
+    Read the sheets of filename into lists of value rows, only as far as
+    extent, an extraction_plan.ReadExtent, when given.
+
+    Runs in the worker processes of CombinedWorkbook, so everything
+    returned has to be picklable.
+    """
+    workbook = open_workbook(filename, engine)
+    sheets = []
+    try:
+        for sheetname in workbook.sheetnames:
+            view = SheetView.from_worksheet(workbook[sheetname])
+            dimensions = (view.min_row, view.max_row, view.min_column,
+                          view.max_column)
+            if extent is None:
+                rows = list(view.iter_rows())
+            else:
+                rows = list(
+                    view.iter_rows(
+                        max_row=extent.last_row(view),
+                        max_col=extent.max_column))
+            sheets.append((sheetname, dimensions, rows))
+    finally:
+        workbook.close()
+    return sheets
+
+
+class CombinedWorkbook():
+    """
+    A single workbook like view over several excel files.
+
+    Every file is opened in read-only (streaming) mode and only an index of
+    sheet name -> (file, sheet) is built up front. Cell values are served
+    from the source files on demand, no merged copy is materialized.
+
+    With jobs > 1 and several files, the files are instead read in a pool
+    of worker processes and the per file sheets are merged in the parent,
+    in the order the files were given. Workers only read the rows and
+    columns of extent, an extraction_plan.ReadExtent, when given.
+    """
+
+    def __init__(self, filenames, jobs=1, engine='openpyxl', extent=None):
+        self.logger = logging.getLogger(__name__)
+        self.engine = engine
+        self._workbooks = []
+        self._index = OrderedDict()
+        self._sources = {}
+        self._views = {}
+        if jobs > 1 and len(filenames) > 1:
+            self.add_extracted_workbooks(filenames, jobs, extent)
+        else:
+            for filename in filenames:
+                self.add_workbook(filename)
+
+    def add_workbook(self, filename):
+        """ Open filename and index its sheets """
+        workbook = open_workbook(filename, self.engine)
+        self._workbooks.append(workbook)
+        for sheetname in workbook.sheetnames:
+            name = self._add_to_index(filename, sheetname)
+            self._sources[name] = workbook
+
+    def add_extracted_workbooks(self, filenames, jobs, extent=None):
+        """ Read filenames in parallel and index their sheets """
+        workers = min(jobs, len(filenames))
+        self.logger.debug("Reading %d excel files with %d workers",
+                          len(filenames), workers)
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            """ map() yields in input order, keeping the merge stable """
+            results = executor.map(extract_workbook, filenames,
+                                   [self.engine] * len(filenames),
+                                   [extent] * len(filenames))
+            for filename, sheets in zip(filenames, results):
+                for sheetname, dimensions, rows in sheets:
+                    name = self._add_to_index(filename, sheetname)
+                    self._views[name] = SheetView(sheetname, dimensions, rows)
+
+    def _add_to_index(self, filename, sheetname):
+        name = self._unique_name(sheetname)
+        if name != sheetname:
+            self.logger.warning(
+                "Sheet '%s' from %s already present, available as '%s'",
+                sheetname, filename, name)
+        self._index[name] = (filename, sheetname)
+        return name
+
+    def _unique_name(self, sheetname):
+        """
+        Sheets with a name already taken by an earlier file are renamed the
+        same way openpyxl does when creating duplicate sheets: 'Name1',
+        'Name2' and so on. The first file always wins the plain name.
+        """
+        if sheetname not in self._index:
+            return sheetname
+        i = 1
+        while '{}{}'.format(sheetname, i) in self._index:
+            i += 1
+        return '{}{}'.format(sheetname, i)
+
+    @property
+    def sheetnames(self):
+        return list(self._index.keys())
+
+    def source(self, sheetname):
+        """ Return the (file, sheet) a combined sheet name refers to """
+        return self._index[sheetname]
+
+    def __contains__(self, sheetname):
+        return sheetname in self._index
+
+    def __getitem__(self, sheetname):
+        if sheetname not in self._index:
+            raise KeyError("Worksheet {} does not exist.".format(sheetname))
+        if sheetname not in self._views:
+            _, name = self._index[sheetname]
+            self._views[sheetname] = SheetView.from_worksheet(
+                self._sources[sheetname][name])
+        return self._views[sheetname]
+
+    def close(self):
+        """ Release the file handles held by the read-only workbooks """
+        for workbook in self._workbooks:
+            workbook.close()
+        self._workbooks = []
+        self._sources = {}
+        self._views = {}
+
+
+class WorkbookPool():
+    """
+    Bounded pool of opened workbooks, keyed by path and modification time.
+
+    Used for excel spec sheet names qualified with a file name, for
+    example "MTN57a_AEC_Network_Design_v1.6.xlsx:Public IPs", so that every
+    referenced file is opened once per run no matter how many spec sections
+    point to it.
+    """
+
+    def __init__(self, max_size=8, engine='openpyxl'):
+        self.logger = logging.getLogger(__name__)
+        self.max_size = max_size
+        self.engine = engine
+        self._pool = OrderedDict()
+        self.hits = 0
+        self.loads = 0
+
+    @staticmethod
+    def _key(filename):
+        path = os.path.abspath(filename)
+        return (path, os.path.getmtime(path))
+
+    def get(self, filename):
+        """ Return the opened workbook for filename, loading it if needed """
+        key = self._key(filename)
+        if key in self._pool:
+            self.hits += 1
+            self._pool.move_to_end(key)
+            return self._pool[key]
+        self.loads += 1
+        self.logger.debug("Loading workbook %s", filename)
+        workbook = CombinedWorkbook([filename], engine=self.engine)
+        self._pool[key] = workbook
+        while len(self._pool) > self.max_size:
+            _, evicted = self._pool.popitem(last=False)
+            evicted.close()
+        return workbook
+
+    def close(self):
+        """ Close every pooled workbook """
+        for workbook in self._pool.values():
+            workbook.close()
+        self._pool.clear()
+        self.logger.debug("Workbook pool: %d hits, %d loads", self.hits,
+                          self.loads)
@@ -0,0 +1,314 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import posixpath
+import re
+import zipfile
+from xml.etree.ElementTree import iterparse
+from xml.etree.ElementTree import parse
+from openpyxl.styles.numbers import builtin_format_code
+from openpyxl.styles.numbers import is_date_format
+from openpyxl.styles.numbers import is_timedelta_format
+from openpyxl.utils.datetime import from_excel
+from openpyxl.utils.datetime import from_ISO8601
+from openpyxl.utils.datetime import MAC_EPOCH
+from openpyxl.utils.datetime import WINDOWS_EPOCH
+
+MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+REL_NS = ('{http://schemas.openxmlformats.org/officeDocument/2006/'
+          'relationships}')
+PKG_REL_NS = '{http://schemas.openxmlformats.org/package/2006/relationships}'
+RELATIONSHIPS = ('http://schemas.openxmlformats.org/officeDocument/2006/'
+                 'relationships/')
+OFFICE_DOCUMENT = RELATIONSHIPS + 'officeDocument'
+SHARED_STRINGS = RELATIONSHIPS + 'sharedStrings'
+STYLES = RELATIONSHIPS + 'styles'
+
+ROW = MAIN_NS + 'row'
+CELL = MAIN_NS + 'c'
+VALUE = MAIN_NS + 'v'
+INLINE_STRING = MAIN_NS + 'is'
+TEXT = MAIN_NS + 't'
+PHONETIC_RUN = MAIN_NS + 'rPh'
+SHARED_STRING = MAIN_NS + 'si'
+SHEET = MAIN_NS + 'sheet'
+DIMENSION = MAIN_NS + 'dimension'
+SHEET_DATA = MAIN_NS + 'sheetData'
+WORKBOOK_PROPERTIES = MAIN_NS + 'workbookPr'
+NUMBER_FORMAT = MAIN_NS + 'numFmt'
+CELL_FORMATS = MAIN_NS + 'cellXfs'
+CELL_FORMAT = MAIN_NS + 'xf'
+
+CELL_REFERENCE = re.compile(r'^\$?([A-Z]+)\$?(\d+)$')
+
+
+def column_index(letters):
+    """ 'A' -> 1, 'AA' -> 27 """
+    index = 0
+    for letter in letters:
+        index = index * 26 + ord(letter) - ord('A') + 1
+    return index
+
+
+def split_reference(reference):
+    """ 'B12' -> (12, 2) """
+    letters, row = CELL_REFERENCE.match(reference).groups()
+    return int(row), column_index(letters)
+
+
+def get_text(element):
+    """ Text of a string item, skipping phonetic (rPh) runs """
+    if element.tag == TEXT:
+        return element.text or ''
+    return ''.join(
+        get_text(child) for child in element if child.tag != PHONETIC_RUN)
+
+
+def cast_number(value):
+    """ Same rule as openpyxl: int unless the text has a '.' or exponent """
+    if '.' in value or 'E' in value or 'e' in value:
+        return float(value)
+    return int(value)
+
+
+class XlsxWorksheet():
+    """
+    Worksheet of an XlsxReader, with the subset of the openpyxl read-only
+    worksheet interface used by SheetView
+    """
+
+    def __init__(self, reader, title, path):
+        self.parent = reader
+        self.title = title
+        self._path = path
+        self.min_row = self.max_row = None
+        self.min_column = self.max_column = None
+        self._read_dimensions()
+
+    def _read_dimensions(self):
+        """ Parse the <dimension> element, stopping before the data """
+        with self.parent._archive.open(self._path) as source:
+            for _, element in iterparse(source):
+                if element.tag == DIMENSION:
+                    bounds = element.get('ref').split(':')
+                    self.min_row, self.min_column = split_reference(
+                        bounds[0])
+                    self.max_row, self.max_column = split_reference(
+                        bounds[-1])
+                    break
+                if element.tag in (ROW, SHEET_DATA):
+                    break
+
+    def reset_dimensions(self):
+        """ Kept for interface compatibility, rows are never truncated """
+        pass
+
+    def _cell_value(self, cell):
+        data_type = cell.get('t', 'n')
+        if data_type == 'inlineStr':
+            inline_string = cell.find(INLINE_STRING)
+            if inline_string is None:
+                return None
+            return get_text(inline_string)
+        value = cell.findtext(VALUE) or None
+        if value is None:
+            return None
+        if data_type == 's':
+            return self.parent.shared_strings[int(value)]
+        if data_type == 'n':
+            value = cast_number(value)
+            style = int(cell.get('s', 0))
+            date_styles = self.parent.date_styles
+            if style in date_styles:
+                """ Same conversion and out of range value as openpyxl """
+                try:
+                    return from_excel(value, self.parent.epoch,
+                                      timedelta=date_styles[style])
+                except (OverflowError, ValueError):
+                    return '#VALUE!'
+            return value
+        if data_type == 'b':
+            return bool(int(value))
+        if data_type == 'd':
+            return from_ISO8601(value)
+        """ Formula strings ('str') and error values ('e') are kept as text """
+        return value
+
+    def iter_rows(self, values_only=True):
+        """
+        Yield one tuple of values per row, from row 1, filling in rows
+        missing from the sheet. Parsing stops as soon as the consumer
+        stops asking for rows
+        """
+        with self.parent._archive.open(self._path) as source:
+            expected_row = 1
+            for _, element in iterparse(source):
+                if element.tag != ROW:
+                    continue
+                row_index = int(element.get('r', expected_row))
+                values = {}
+                column = 0
+                for cell in element.iter(CELL):
+                    reference = cell.get('r')
+                    if reference:
+                        _, column = split_reference(reference)
+                    else:
+                        column += 1
+                    value = self._cell_value(cell)
+                    if value is not None:
+                        values[column] = value
+                element.clear()
+                while expected_row < row_index:
+                    yield ()
+                    expected_row += 1
+                row = [None] * (max(values) if values else 0)
+                for column, value in values.items():
+                    row[column - 1] = value
+                yield tuple(row)
+                expected_row = row_index + 1
+
+
+class XlsxReader():
+    """
+    Minimal xlsx reader working directly on the zip archive.
+
+    Only the parts needed are parsed: the workbook and its relations
+    to find the sheets, the shared strings and the styles once on first
+    use, and the XML of the sheets actually read, with iterparse and only
+    as far as the rows requested. Values are returned as openpyxl returns
+    them: numbers with a date format read as datetimes, other number
+    formats are not applied.
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self._archive = zipfile.ZipFile(filename)
+        self._shared_strings = None
+        self._date_styles = None
+        try:
+            self._read_workbook()
+        except Exception:
+            self._archive.close()
+            raise
+
+    def _read_relations(self, part):
+        """ Relations of part, as id -> part path """
+        rels_path = posixpath.join(
+            posixpath.dirname(part), '_rels',
+            posixpath.basename(part) + '.rels')
+        relations = {}
+        with self._archive.open(rels_path) as source:
+            for _, element in iterparse(source):
+                if element.tag != PKG_REL_NS + 'Relationship':
+                    continue
+                target = element.get('Target')
+                if target.startswith('/'):
+                    target = target[1:]
+                else:
+                    target = posixpath.normpath(
+                        posixpath.join(posixpath.dirname(part), target))
+                relations[element.get('Id')] = (element.get('Type'), target)
+        return relations
+
+    def _read_workbook(self):
+        """
+        Sheet names and part paths in workbook order, the parts related to
+        the workbook by relation type, and the date epoch
+        """
+        workbook_part = 'xl/workbook.xml'
+        for rel_type, target in self._read_relations('').values():
+            if rel_type == OFFICE_DOCUMENT:
+                workbook_part = target
+        relations = self._read_relations(workbook_part)
+        self._parts = {
+            rel_type: target
+            for rel_type, target in relations.values()
+        }
+        self._sheets = []
+        self.epoch = WINDOWS_EPOCH
+        with self._archive.open(workbook_part) as source:
+            for _, element in iterparse(source):
+                if element.tag == SHEET:
+                    _, target = relations[element.get(REL_NS + 'id')]
+                    self._sheets.append((element.get('name'), target))
+                elif element.tag == WORKBOOK_PROPERTIES:
+                    if element.get('date1904') in ('1', 'true'):
+                        self.epoch = MAC_EPOCH
+
+    def _open_part(self, rel_type):
+        """ Part related to the workbook by rel_type, None if missing """
+        try:
+            return self._archive.open(self._parts[rel_type])
+        except KeyError:
+            return None
+
+    @property
+    def shared_strings(self):
+        """ Shared string table, loaded once on first use """
+        if self._shared_strings is None:
+            self._shared_strings = []
+            source = self._open_part(SHARED_STRINGS)
+            if source is None:
+                return self._shared_strings
+            with source:
+                for _, element in iterparse(source):
+                    if element.tag == SHARED_STRING:
+                        """ Same clean up as openpyxl """
+                        self._shared_strings.append(
+                            get_text(element).replace('x005F_', ''))
+                        element.clear()
+        return self._shared_strings
+
+    @property
+    def date_styles(self):
+        """
+        Cell style index -> whether a timedelta, of the styles with a date
+        number format, loaded once on first use
+        """
+        if self._date_styles is None:
+            self._date_styles = {}
+            source = self._open_part(STYLES)
+            if source is None:
+                return self._date_styles
+            with source:
+                root = parse(source).getroot()
+            custom = {
+                int(element.get('numFmtId')): element.get('formatCode')
+                for element in root.iter(NUMBER_FORMAT)
+            }
+            cell_formats = root.find(CELL_FORMATS)
+            if cell_formats is None:
+                return self._date_styles
+            for index, element in enumerate(cell_formats.iter(CELL_FORMAT)):
+                number_format = int(element.get('numFmtId', 0))
+                if number_format in custom:
+                    code = custom[number_format]
+                else:
+                    code = builtin_format_code(number_format)
+                if is_date_format(code):
+                    self._date_styles[index] = is_timedelta_format(code)
+        return self._date_styles
+
+    @property
+    def sheetnames(self):
+        return [name for name, _ in self._sheets]
+
+    def __getitem__(self, sheetname):
+        for name, path in self._sheets:
+            if name == sheetname:
+                return XlsxWorksheet(self, name, path)
+        raise KeyError("Worksheet {} does not exist.".format(sheetname))
+
+    def close(self):
+        self._archive.close()
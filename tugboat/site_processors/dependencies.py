@@ -0,0 +1,220 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+from collections.abc import Mapping
+from collections.abc import Sequence
+
+# Value of the paths that are not in the intermediary
+MISSING = object()
+
+
+def get_path(data, path):
+    """ Value at path, a sequence of keys and indexes, MISSING if none """
+    value = data
+    for key in path:
+        try:
+            value = value[key]
+        except (KeyError, IndexError, TypeError):
+            return MISSING
+    return value
+
+
+def value_digest(value):
+    """ SHA-256 of value, a part of the intermediary """
+    if value is MISSING:
+        return 'missing'
+    try:
+        text = json.dumps(value, sort_keys=True, default=str)
+    except TypeError:
+        """ Keys of mixed types can not be sorted """
+        text = repr(value)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def value_kind(value):
+    """ Kind of value, a part of the intermediary """
+    if value is MISSING:
+        return 'missing'
+    if isinstance(value, Mapping):
+        return 'mapping'
+    if isinstance(value, (list, tuple)):
+        return 'sequence'
+    return 'value'
+
+
+def prune_paths(paths):
+    """ Sorted paths without the ones inside another path """
+    kept = []
+    for path in sorted(paths, key=lambda path: (len(path), repr(path))):
+        if not any(path[:len(parent)] == parent for parent in kept):
+            kept.append(path)
+    return sorted(kept, key=repr)
+
+
+class Recorder():
+    """
+    Paths of the intermediary read by a render: paths whose value was
+    read, and paths of the containers looked up, whose presence only was
+    read until something inside them is
+    """
+
+    def __init__(self):
+        self.paths = set()
+        self.present = set()
+
+    def inputs(self):
+        """ Pruned paths read and paths present, see InputDigests.digest """
+        paths = prune_paths(self.paths)
+        present = [
+            path for path in self.present
+            if not any(path[:len(parent)] == parent for parent in paths)
+        ]
+        return paths, sorted(present, key=repr)
+
+    def covers(self, path):
+        """ Whether path or a path containing it was read whole """
+        return any(path[:i] in self.paths for i in range(len(path) + 1))
+
+    def wrap(self, value, path=()):
+        """
+        value, recording the reads below path when it is a container.
+        Values inside a path read whole are not wrapped again
+        """
+        if self.covers(path):
+            return value
+        if isinstance(value, Mapping):
+            self.present.add(path)
+            return RecordingMapping(value, path, self)
+        if isinstance(value, (list, tuple)):
+            self.present.add(path)
+            return RecordingSequence(value, path, self)
+        self.paths.add(path)
+        return value
+
+
+class RecordingMapping(Mapping):
+    """
+    Read-only view of a dict of the intermediary. Reading a key holding
+    a container records its presence only, as membership tests do, until
+    a value is reached. Anything else (iteration, length, printing)
+    depends on the whole dict and records its path
+    """
+
+    __slots__ = ('_data', '_path', '_recorder')
+
+    def __init__(self, data, path, recorder):
+        self._data = data
+        self._path = path
+        self._recorder = recorder
+
+    def __getitem__(self, key):
+        try:
+            value = self._data[key]
+        except (KeyError, TypeError):
+            """ Its absence is read too """
+            self._recorder.paths.add(self._path + (key, ))
+            raise
+        return self._recorder.wrap(value, self._path + (key, ))
+
+    def __iter__(self):
+        self._recorder.paths.add(self._path)
+        return iter(self._data)
+
+    def __len__(self):
+        self._recorder.paths.add(self._path)
+        return len(self._data)
+
+    def __repr__(self):
+        self._recorder.paths.add(self._path)
+        return repr(self._data)
+
+    def items(self):
+        self._recorder.paths.add(self._path)
+        return self._data.items()
+
+    def values(self):
+        self._recorder.paths.add(self._path)
+        return self._data.values()
+
+
+class RecordingSequence(Sequence):
+    """ Read-only view of a list of the intermediary, see RecordingMapping """
+
+    __slots__ = ('_data', '_path', '_recorder')
+
+    def __init__(self, data, path, recorder):
+        self._data = data
+        self._path = path
+        self._recorder = recorder
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self._recorder.paths.add(self._path)
+            return self._recorder.wrap(self._data[index], self._path)
+        try:
+            value = self._data[index]
+        except (IndexError, TypeError):
+            self._recorder.paths.add(self._path)
+            raise
+        return self._recorder.wrap(value, self._path + (index, ))
+
+    def __iter__(self):
+        self._recorder.paths.add(self._path)
+        return iter(self._data)
+
+    def __len__(self):
+        self._recorder.paths.add(self._path)
+        return len(self._data)
+
+    def __repr__(self):
+        self._recorder.paths.add(self._path)
+        return repr(self._data)
+
+
+class InputDigests():
+    """ Digests of parts of the intermediary, each computed once """
+
+    def __init__(self, data):
+        self.data = data
+        self._digests = {}
+        self._kinds = {}
+
+    def path_digest(self, path):
+        path = tuple(path)
+        if path not in self._digests:
+            self._digests[path] = value_digest(get_path(self.data, path))
+        return self._digests[path]
+
+    def path_kind(self, path):
+        path = tuple(path)
+        if path not in self._kinds:
+            self._kinds[path] = value_kind(get_path(self.data, path))
+        return self._kinds[path]
+
+    def digest(self, paths, present=()):
+        """
+        Digest of the values at paths and of the kind, container or not,
+        of the values at present
+        """
+        digest = hashlib.sha256()
+        for path in paths:
+            digest.update(json.dumps(list(path), default=str).encode())
+            digest.update(self.path_digest(path).encode())
+        for path in present:
+            digest.update(b'?')
+            digest.update(json.dumps(list(path), default=str).encode())
+            digest.update(self.path_kind(path).encode())
+        return digest.hexdigest()
@@ -0,0 +1,165 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+# Statuses of a rendered file, in the order of the summary
+STATUSES = ('added', 'changed', 'unchanged', 'removed')
+
+_umask = {}
+
+
+def get_umask():
+    """ umask of the process, looked up once """
+    if 'umask' not in _umask:
+        _umask['umask'] = os.umask(0)
+        os.umask(_umask['umask'])
+    return _umask['umask']
+
+
+def content_digest(content):
+    """ SHA-256 of content, bytes """
+    return hashlib.sha256(content).hexdigest()
+
+
+def file_entry(path, digest):
+    """ Index entry of the file at path, whose content has digest """
+    stat = os.stat(path)
+    return {
+        'sha256': digest,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+    }
+
+
+def current_digest(path, entry=None):
+    """
+    Digest of the file at path, None when there is none. The file is
+    only read when its size or mtime differ from its index entry
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    if entry is not None and entry.get('size') == stat.st_size and \
+            entry.get('mtime_ns') == stat.st_mtime_ns:
+        return entry['sha256']
+    with open(path, 'rb') as f:
+        return content_digest(f.read())
+
+
+def write_if_changed(path, content, entry=None):
+    """
+    Write content, bytes, to path unless the file already holds it. The
+    file is replaced atomically through a temporary file in its
+    directory. Returns the status of the file and its new index entry
+    """
+    digest = content_digest(content)
+    existing = current_digest(path, entry)
+    if existing == digest:
+        return 'unchanged', file_entry(path, digest)
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path) or '.', prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(content)
+        """ mkstemp files are private, manifests are not """
+        os.chmod(tmp_path, 0o666 & ~get_umask())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+    status = 'added' if existing is None else 'changed'
+    return status, file_entry(path, digest)
+
+
+class OutputIndex():
+    """
+    Content hashes of the files rendered under root, kept in
+    root/.tugboat_index.json. Paths are relative to root.
+
+    Files whose content did not change are not rewritten, so their
+    mtime stays the same, and files tugboat rendered before but no
+    template produces any more can be found and removed.
+    """
+
+    FILE_NAME = '.tugboat_index.json'
+
+    def __init__(self, root):
+        self.logger = logging.getLogger(__name__)
+        self.root = root
+        self.path = os.path.join(root, self.FILE_NAME)
+        self.entries = {}
+        try:
+            with open(self.path, 'r') as f:
+                self.entries = json.load(f)
+        except (IOError, OSError, ValueError):
+            """ No index yet, or an unreadable one: nothing is known """
+            self.entries = {}
+
+    def key(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def get(self, path):
+        return self.entries.get(self.key(path))
+
+    def update(self, path, entry):
+        self.entries[self.key(path)] = entry
+
+    def remove_stale(self, directory, paths):
+        """
+        Remove the indexed files under directory that are not in paths.
+        Files edited since they were rendered are kept and only dropped
+        from the index. Returns the removed paths
+        """
+        directory = os.path.normpath(directory)
+        prefix = self.key(directory) + '/'
+        keep = set(self.key(path) for path in paths)
+        removed = []
+        for key in sorted(self.entries):
+            if not key.startswith(prefix) or key in keep:
+                continue
+            entry = self.entries.pop(key)
+            path = os.path.normpath(os.path.join(self.root, key))
+            digest = current_digest(path, entry)
+            if digest is None:
+                continue
+            if digest != entry['sha256']:
+                self.logger.warning(
+                    "%s is no longer rendered but was edited, kept", path)
+                continue
+            os.remove(path)
+            removed.append(path)
+            """ Directories left empty go too """
+            parent = os.path.dirname(path)
+            while parent.startswith(directory + os.sep) and \
+                    not os.listdir(parent):
+                os.rmdir(parent)
+                parent = os.path.dirname(parent)
+        return removed
+
+    def save(self):
+        """ Write the index atomically """
+        os.makedirs(self.root, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.tmp-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.entries, f, indent=1, sort_keys=True)
+        os.replace(tmp_path, self.path)
@@ -12,19 +12,262 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import pkg_resources
 import os
 import logging
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 
-from jinja2 import Environment
-from jinja2 import FileSystemLoader
+from jinja2 import FileSystemBytecodeCache
 from .base import BaseProcessor
+from .dependencies import InputDigests
+from .dependencies import Recorder
+from .output_index import current_digest
+from .output_index import OutputIndex
+from .output_index import STATUSES
+from .output_index import write_if_changed
+from .template_package import create_environment
+from .template_package import get_package_dir
+from .template_package import get_package_loader
+from .template_package import get_source_loader
+from .template_package import get_template_dir
+from .template_package import get_template_outputs
+from .template_package import get_templates_digest
+from .template_package import load_template_package
+
+_environments = {}
+_render_state = {}
+
+
+class CountingBytecodeCache(FileSystemBytecodeCache):
+    """ Bytecode cache counting the templates it had compiled code of """
+
+    def __init__(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        super().__init__(directory)
+        self.hits = 0
+        self.misses = 0
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        if bucket.code is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+
+
+def get_environment(cache_dir=None):
+    """
+    Jinja environment shared by every render of the process. It loads
+    the compiled template package when there is one, the template sources
+    otherwise. With cache_dir, templates compiled from source are kept on
+    disk under cache_dir/templates and reused until their source changes
+    """
+    template_dir = get_template_dir()
+    package = load_template_package(template_dir=template_dir)
+    key = (template_dir, cache_dir, package is not None)
+    if key in _environments:
+        return _environments[key]
+    if package is not None:
+        j2_env = create_environment(get_package_loader())
+    else:
+        bytecode_cache = None
+        if cache_dir is not None:
+            bytecode_cache = CountingBytecodeCache(
+                os.path.join(cache_dir, 'templates'))
+        j2_env = create_environment(
+            get_source_loader(template_dir), bytecode_cache)
+    _environments[key] = j2_env
+    return j2_env
+
+
+def get_recording(entry, templates_digest):
+    """
+    Whether rendering the template of the index entry with its data
+    wrapped in a Recorder gives its output, as found by the last render
+    with the same templates. None when there is no such render
+    """
+    if entry is None or entry.get('inputs') is None:
+        return None
+    recorded = entry['inputs']
+    if recorded.get('templates') != templates_digest:
+        return None
+    if not recorded.get('recordable', True):
+        return False
+    return True if 'present' in recorded else None
+
+
+def render_recorded(template_j2, data, recording=None):
+    """
+    Render template_j2 with data. Returns the output and the paths of data
+    read and present, see Recorder.inputs(), recorded with data wrapped in
+    a Recorder. They are None when the template can not be recorded: the
+    recording render fails or gives another output, as dumping a dict to
+    JSON or telling dicts apart by their type may. Such templates are
+    rendered every time.
+
+    recording is get_recording() of the template. When None, the template
+    is rendered twice, with and without the Recorder, and the outputs are
+    compared. Otherwise it is rendered once, with the Recorder when True
+    """
+    if recording is False:
+        return template_j2.render(data=data), None
+    recorder = Recorder()
+    if recording:
+        try:
+            return (template_j2.render(data=recorder.wrap(data)),
+                    recorder.inputs())
+        except Exception:
+            return template_j2.render(data=data), None
+    content = template_j2.render(data=data)
+    try:
+        recorded = template_j2.render(data=recorder.wrap(data))
+    except Exception:
+        return content, None
+    if recorded != content:
+        return content, None
+    return content, recorder.inputs()
+
+
+def write_template(template_j2, outfile, data, entry=None, recording=None):
+    """
+    Render template_j2 with the intermediary data to outfile, which is
+    only written when its content changed. Returns the status of
+    outfile, its new index entry and the inputs of render_recorded()
+    """
+    logger = logging.getLogger(__name__)
+    logger.info("Rendering {}".format(template_j2))
+    content, inputs = render_recorded(template_j2, data, recording)
+    try:
+        status, entry = write_if_changed(outfile, content.encode('utf-8'),
+                                         entry)
+    except IOError as ioe:
+        raise SystemExit("Error when generating {:s}:\n{:s}".format(
+            outfile, ioe.strerror))
+    logger.info('Rendered {} ({})'.format(outfile, status))
+    return status, entry, inputs
+
+
+def init_render_worker(intermediary_yaml, cache_dir):
+    """
+    Keep the intermediary and cache dir of the site in a render worker.
+    They are handed over once per worker, tasks only carry the template
+    and output file names
+    """
+    _render_state['data'] = intermediary_yaml
+    _render_state['cache_dir'] = cache_dir
+
+
+def render_file(name, outfile, entry, recording):
+    """ write_template() of the template name in a render worker """
+    j2_env = get_environment(_render_state['cache_dir'])
+    return write_template(
+        j2_env.get_template(name), outfile, _render_state['data'], entry,
+        recording)
 
 
 class SiteProcessor(BaseProcessor):
-    def __init__(self, intermediary_yaml):
+    def __init__(self, intermediary_yaml, cache_dir=None, render_jobs=1):
         self.logger = logging.getLogger(__name__)
         self.yaml_data = intermediary_yaml
+        self.cache_dir = cache_dir
+        self.render_jobs = render_jobs
+
+    def get_outputs(self, template_dir, package=None):
+        """
+        (template name, output file) of every template, from the index of
+        the compiled template package or from template_dir. The
+        directories of the output files are created
+        """
+        if package is not None:
+            template_outputs = package['outputs']
+        else:
+            template_outputs = get_template_outputs(template_dir)
+        outputs = []
+        for name, output in template_outputs:
+            outfile = 'pegleg_manifests/site/{}/{}'.format(
+                self.yaml_data['region_name'], output)
+            outfile_dir = os.path.dirname(outfile)
+            if not os.path.exists(outfile_dir):
+                os.makedirs(outfile_dir)
+            outputs.append((name, outfile))
+        return outputs
+
+    def load_templates(self, j2_env, names):
+        """
+        Templates of names. Logs how long loading took and how many
+        templates came from the bytecode cache
+        """
+        bytecode_cache = j2_env.bytecode_cache
+        hits = misses = 0
+        if bytecode_cache is not None:
+            hits, misses = bytecode_cache.hits, bytecode_cache.misses
+        start = time.time()
+        templates = [j2_env.get_template(name) for name in names]
+        seconds = time.time() - start
+        if bytecode_cache is None:
+            self.logger.debug("Loaded %d templates in %.3fs", len(templates),
+                              seconds)
+        else:
+            hits = bytecode_cache.hits - hits
+            misses = bytecode_cache.misses - misses
+            self.logger.debug(
+                "Loaded %d templates in %.3fs: %d from the bytecode cache, "
+                "%d compiled, %d already loaded", len(templates), seconds,
+                hits, misses, len(templates) - hits - misses)
+        return templates
+
+    def is_current(self, outfile, entry, templates_digest, inputs):
+        """
+        Whether outfile was rendered by the same templates from the same
+        values of the paths it read, and was not changed since
+        """
+        if entry is None or entry.get('inputs') is None:
+            return False
+        recorded = entry['inputs']
+        if 'present' not in recorded:
+            return False
+        return recorded['templates'] == templates_digest and \
+            inputs.digest(recorded['paths'], recorded['present']) == \
+            recorded['sha256'] and \
+            current_digest(outfile, entry) == entry['sha256']
+
+    def render_serial(self, outputs, index):
+        """
+        Render outputs, (template name, output file, get_recording()), one
+        after the other. Returns write_template()s
+        """
+        j2_env = get_environment(self.cache_dir)
+        templates = self.load_templates(j2_env,
+                                        [name for name, _, _ in outputs])
+        return [
+            write_template(template_j2, outfile, self.yaml_data,
+                           index.get(outfile), recording)
+            for template_j2, (name, outfile, recording) in zip(
+                templates, outputs)
+        ]
+
+    def render_parallel(self, outputs, index):
+        """
+        Render outputs in render_jobs worker processes. Every template is
+        rendered on its own, so the files are the same as rendered one
+        after the other. Returns write_template()s
+        """
+        workers = min(self.render_jobs, len(outputs))
+        start = time.time()
+        with ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_render_worker,
+                initargs=(self.yaml_data, self.cache_dir)) as executor:
+            futures = [
+                executor.submit(render_file, name, outfile,
+                                index.get(outfile), recording)
+                for name, outfile, recording in outputs
+            ]
+            results = [future.result() for future in futures]
+        self.logger.debug("Rendered %d templates in %.3fs with %d workers",
+                          len(outputs), time.time() - start, workers)
+        return results
 
     def render_template(self):
         """
@@ -32,37 +275,68 @@ class SiteProcessor(BaseProcessor):
         Network configs common to all racks (i.e oam, overlay, storage,
         calico) are generated in a single file. Rack specific
         configs( pxe and oob) are generated per rack.
+
+        Templates are only rendered when the parts of the intermediary
+        they read last time changed. Files whose content did not change
+        are left alone and files no template renders any more are
+        removed. Returns the number of files of every status
         """
-        template_software_dir = pkg_resources.resource_filename(
-            'tugboat', 'templates/')
-        template_dir_abspath = os.path.dirname(template_software_dir)
+        template_dir_abspath = get_template_dir()
         self.logger.debug("Template dif abspath:%s", template_dir_abspath)
-
-        for dirpath, dirs, files in os.walk(template_dir_abspath):
-            for filename in files:
-                j2_env = Environment(
-                    autoescape=False,
-                    loader=FileSystemLoader(dirpath),
-                    trim_blocks=True)
-                j2_env.filters['get_role_wise_nodes']\
-                        = self.get_role_wise_nodes
-                templatefile = os.path.join(dirpath, filename)
-                outdirs = dirpath.split('templates')[1]
-                outfile_path = 'pegleg_manifests/site/{}{}'.format(
-                    self.yaml_data['region_name'], outdirs)
-                outfile_yaml = templatefile.split('.j2')[0].split('/')[-1]
-                outfile = outfile_path + '/' + outfile_yaml
-                outfile_dir = os.path.dirname(outfile)
-                if not os.path.exists(outfile_dir):
-                    os.makedirs(outfile_dir)
-                template_j2 = j2_env.get_template(filename)
-                self.logger.info("Rendering {}".format(template_j2))
-                try:
-                    out = open(outfile, "w")
-                    template_j2.stream(data=self.yaml_data).dump(out)
-                    self.logger.info('Rendered {}'.format(outfile))
-                    out.close()
-                except IOError as ioe:
-                    raise SystemExit(
-                        "Error when generating {:s}:\n{:s}".format(
-                            outfile, ioe.strerror))
+        index = OutputIndex('pegleg_manifests')
+        package = load_template_package(template_dir=template_dir_abspath)
+        if package is not None:
+            self.logger.debug("Rendering the compiled templates of %s",
+                              get_package_dir())
+            templates_digest = package['templates']
+        else:
+            templates_digest = get_templates_digest(template_dir_abspath)
+        outputs = self.get_outputs(template_dir_abspath, package)
+        inputs = InputDigests(self.yaml_data)
+        statuses = []
+        pending = []
+        for name, outfile in outputs:
+            entry = index.get(outfile)
+            if self.is_current(outfile, entry, templates_digest, inputs):
+                statuses.append('unchanged')
+            else:
+                pending.append((name, outfile,
+                                get_recording(entry, templates_digest)))
+        self.logger.info("Rendering %d of %d templates, the inputs of the "
+                         "others did not change", len(pending), len(outputs))
+        if self.render_jobs > 1 and len(pending) > 1:
+            results = self.render_parallel(pending, index)
+        else:
+            results = self.render_serial(pending, index)
+        for (name, outfile, _), (status, entry, read) in zip(pending, results):
+            if read is None:
+                """ Templates that could not be recorded always render """
+                entry['inputs'] = {
+                    'templates': templates_digest,
+                    'recordable': False,
+                }
+            else:
+                paths, present = read
+                entry['inputs'] = {
+                    'templates': templates_digest,
+                    'paths': paths,
+                    'present': present,
+                    'sha256': inputs.digest(paths, present),
+                }
+            index.update(outfile, entry)
+            statuses.append(status)
+        region_dir = 'pegleg_manifests/site/{}'.format(
+            self.yaml_data['region_name'])
+        removed = index.remove_stale(region_dir,
+                                     [outfile for _, outfile in outputs])
+        index.save()
+        summary = OrderedDict((status, 0) for status in STATUSES)
+        for status in statuses:
+            summary[status] += 1
+        summary['removed'] = len(removed)
+        for path in removed:
+            self.logger.info('Removed {}'.format(path))
+        self.logger.info(
+            "Manifests: %d added, %d changed, %d unchanged, %d removed",
+            *summary.values())
+        return summary
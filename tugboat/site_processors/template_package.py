@@ -0,0 +1,251 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import compileall
+import hashlib
+import json
+import logging
+import os
+import posixpath
+import tempfile
+import click
+import jinja2
+import pkg_resources
+from jinja2 import Environment
+from jinja2 import FileSystemLoader
+from jinja2 import ModuleLoader
+from tugboat.parser_engine.utils.data_cache import file_digest
+from tugboat.parser_engine.utils.data_cache import get_tugboat_version
+from .base import BaseProcessor
+
+# Index of a compiled template package, next to its modules
+INDEX_FILE = 'index.json'
+# Environment variable checking the compiled templates against their
+# sources, when set, for template development
+CHECK_TEMPLATES_VARIABLE = 'TUGBOAT_CHECK_TEMPLATES'
+
+_packages = {}
+
+
+def get_template_dir():
+    template_software_dir = pkg_resources.resource_filename(
+        'tugboat', 'templates/')
+    return os.path.dirname(template_software_dir)
+
+
+def get_package_dir():
+    """ Directory of the compiled template package """
+    package_dir = pkg_resources.resource_filename('tugboat',
+                                                  'compiled_templates/')
+    return os.path.dirname(package_dir)
+
+
+class TemplateEnvironment(Environment):
+    """
+    Environment of the templates, named by their path under the template
+    directory. Templates included or imported by a template are looked up
+    in its own directory, as when every directory had its own loader
+    """
+
+    def join_path(self, template, parent):
+        return posixpath.join(posixpath.dirname(parent), template)
+
+
+def get_source_loader(template_dir):
+    """ Loader of the template sources, by their path under template_dir """
+    return FileSystemLoader(template_dir)
+
+
+def create_environment(loader, bytecode_cache=None):
+    """ Jinja environment of the templates, with the tugboat filters """
+    j2_env = TemplateEnvironment(
+        autoescape=False,
+        loader=loader,
+        bytecode_cache=bytecode_cache,
+        trim_blocks=True)
+    j2_env.filters['get_role_wise_nodes'] = BaseProcessor.get_role_wise_nodes
+    return j2_env
+
+
+def get_templates_digest(template_dir):
+    """
+    Digest of the templates under template_dir and of the tugboat version,
+    which brings the filters. A change to any of them renders everything
+    """
+    digest = hashlib.sha256()
+    digest.update(get_tugboat_version().encode())
+    for dirpath, dirs, files in sorted(os.walk(template_dir)):
+        for filename in sorted(files):
+            templatefile = os.path.join(dirpath, filename)
+            digest.update(os.path.relpath(templatefile, template_dir).encode())
+            digest.update(file_digest(templatefile).encode())
+    return digest.hexdigest()
+
+
+def get_sources_fingerprint(template_dir):
+    """
+    Fingerprint of the templates under template_dir from their names,
+    sizes and modification times. No template is read
+    """
+    digest = hashlib.sha256()
+    for dirpath, dirs, files in sorted(os.walk(template_dir)):
+        for filename in sorted(files):
+            templatefile = os.path.join(dirpath, filename)
+            stat = os.stat(templatefile)
+            digest.update('{}\0{}\0{}\n'.format(
+                os.path.relpath(templatefile, template_dir), stat.st_size,
+                stat.st_mtime_ns).encode())
+    return digest.hexdigest()
+
+
+def get_template_outputs(template_dir):
+    """
+    (template name, output file) of every file under template_dir. Output
+    files are relative to the manifest directory of the region, the
+    template path without its .j2 extension
+    """
+    outputs = []
+    for dirpath, dirs, files in sorted(os.walk(template_dir)):
+        outdir = os.path.relpath(dirpath, template_dir).replace(os.sep, '/')
+        for filename in sorted(files):
+            name = filename if outdir == '.' else outdir + '/' + filename
+            output = filename.split('.j2')[0]
+            if outdir != '.':
+                output = outdir + '/' + output
+            outputs.append((name, output))
+    return outputs
+
+
+def build_template_package(template_dir=None, package_dir=None):
+    """
+    Compile the templates under template_dir into Python modules in
+    package_dir, next to an index of their output files, of the digest
+    and fingerprint of the sources and of the versions compiling them.
+    Returns the index
+    """
+    template_dir = template_dir or get_template_dir()
+    package_dir = package_dir or get_package_dir()
+    os.makedirs(package_dir, exist_ok=True)
+    """ Modules of templates removed since the last build go too """
+    for name in os.listdir(package_dir):
+        if name.startswith('tmpl_') and name.endswith('.py'):
+            os.remove(os.path.join(package_dir, name))
+    j2_env = create_environment(get_source_loader(template_dir))
+    j2_env.compile_templates(package_dir, zip=None, ignore_errors=False)
+    compileall.compile_dir(package_dir, quiet=1)
+    index = {
+        'jinja2': jinja2.__version__,
+        'tugboat': get_tugboat_version(),
+        'sources': get_sources_fingerprint(template_dir),
+        'templates': get_templates_digest(template_dir),
+        'outputs': get_template_outputs(template_dir),
+    }
+    fd, tmp_path = tempfile.mkstemp(dir=package_dir, prefix='.tmp-')
+    with os.fdopen(fd, 'w') as f:
+        json.dump(index, f, indent=1)
+    os.replace(tmp_path, os.path.join(package_dir, INDEX_FILE))
+    for key in [key for key in _packages if key[0] == package_dir]:
+        del _packages[key]
+    return index
+
+
+def read_template_package(package_dir, template_dir, sources=None):
+    """
+    Index of the package in package_dir, None when there is none or when
+    it was not built by this tugboat and Jinja, or, unless sources is
+    None, from the sources of fingerprint sources, which is warned about
+    """
+    logger = logging.getLogger(__name__)
+    try:
+        with open(os.path.join(package_dir, INDEX_FILE), 'r') as f:
+            index = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    if index.get('jinja2') != jinja2.__version__ or \
+            index.get('tugboat') != get_tugboat_version():
+        logger.warning(
+            "Ignoring the compiled templates of %s, built by another "
+            "version of tugboat or Jinja. Rendering the templates of %s",
+            package_dir, template_dir)
+        return None
+    if sources is not None and index.get('sources') != sources:
+        logger.warning(
+            "Ignoring the compiled templates of %s, the templates of %s "
+            "changed since they were compiled. Rendering them from source",
+            package_dir, template_dir)
+        return None
+    return index
+
+
+def check_template_sources():
+    """ Whether compiled templates are checked against their sources """
+    return bool(os.environ.get(CHECK_TEMPLATES_VARIABLE))
+
+
+def load_template_package(package_dir=None, template_dir=None):
+    """
+    Index of the compiled template package of the templates under
+    template_dir, read once per process. None when there is no package,
+    or one built by other versions of tugboat or Jinja: templates are then
+    rendered from their sources.
+
+    The package is trusted to be built from the current sources, no
+    template is looked at. With TUGBOAT_CHECK_TEMPLATES set, a package
+    built before a template changed is ignored too, the sources being
+    checked once per process
+    """
+    package_dir = package_dir or get_package_dir()
+    template_dir = template_dir or get_template_dir()
+    key = (package_dir, template_dir, check_template_sources())
+    if key not in _packages:
+        sources = None
+        if key[2]:
+            sources = get_sources_fingerprint(template_dir)
+        _packages[key] = read_template_package(package_dir, template_dir,
+                                               sources)
+    return _packages[key]
+
+
+def get_package_loader(package_dir=None):
+    """ Loader of the compiled template modules """
+    return ModuleLoader(package_dir or get_package_dir())
+
+
+@click.command()
+@click.option(
+    '--template-dir',
+    'template_dir',
+    type=click.Path(exists=True, file_okay=False),
+    help='Directory of the template sources [default: tugboat/templates]')
+@click.option(
+    '--output',
+    '-o',
+    'package_dir',
+    type=click.Path(file_okay=False),
+    help='Directory of the compiled package \
+    [default: tugboat/compiled_templates]')
+def main(template_dir, package_dir):
+    """
+    Compile the manifest templates ahead of time. Rendering loads the
+    compiled modules and the index of output files instead of walking and
+    parsing the template sources. Run it again after changing a template
+    """
+    package_dir = package_dir or get_package_dir()
+    index = build_template_package(template_dir, package_dir)
+    print('Compiled {} templates into {}'.format(
+        len(index['outputs']), package_dir))
+
+
+if __name__ == '__main__':
+    main()
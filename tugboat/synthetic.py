@@ -0,0 +1,311 @@
+# Copyright 2018 AT&T Intellectual Property.  All other rights reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the 'License');
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an 'AS IS' BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import copy
+import os
+import click
+import yaml
+from openpyxl import Workbook
+from tugboat.parser_engine.utils.design_rules import load_global_config
+from tugboat.parser_engine.utils.ipam import get_subnet
+
+# Hostnames are <region>r<2 digits><c|o><3 digits>, see data_schema.json
+MAX_RACKS = 99
+MAX_HOSTS = 999
+
+# Controllers of a synthetic site, the first hosts of the first rack
+CONTROLLERS = 3
+
+# Private networks, as (sheet label, vlan, first address). Each one is a
+# /14 at most, so they never overlap
+PRIVATE_NETWORKS = (('PXE', 41, '172.16.0.0'), ('Storage', 42, '172.20.0.0'),
+                    ('Calico', 43, '172.24.0.0'), ('Overlay', 44,
+                                                   '172.28.0.0'))
+OAM_NETWORK = (21, '100.64.0.0')
+INGRESS_NETWORK = '100.127.0.0/24'
+
+# Excel spec of the synthetic workbooks, the layout of
+# samples/specs/excel_spec.yaml. end_row and oob_net_end_col follow the
+# number of hosts and racks
+EXCEL_SPEC = {
+    'ipmi_sheet_name': 'Server IP-Profile Info',
+    'start_row': 3,
+    'end_row': 14,
+    'hostname_col': 2,
+    'ipmi_address_col': 3,
+    'host_profile_col': 5,
+    'ipmi_gateway_col': 4,
+    'private_ip_sheet': 'Private IPs',
+    'net_type_col': 1,
+    'vlan_col': 2,
+    'vlan_start_row': 2,
+    'vlan_end_row': 13,
+    'net_start_row': 17,
+    'net_end_row': 24,
+    'net_col': 4,
+    'net_vlan_col': 1,
+    'public_ip_sheet': 'Public IPs',
+    'oam_vlan_col': 1,
+    'oam_ip_row': 4,
+    'oam_ip_col': 2,
+    'oob_net_row': 9,
+    'oob_net_start_col': 2,
+    'oob_net_end_col': 5,
+    'ingress_ip_row': 6,
+    'dns_ntp_ldap_sheet': 'Build notes',
+    'login_domain_row': 4,
+    'ldap_col': 2,
+    'global_group': 5,
+    'ldap_search_url_row': 6,
+    'ntp_row': 13,
+    'ntp_col': 2,
+    'dns_row': 14,
+    'dns_col': 2,
+    'domain_row': 2,
+    'domain_col': 2,
+    'location_sheet': 'Site and Zone Info',
+    'column': 3,
+    'corridor_row': 3,
+    'site_name_row': 6,
+    'state_name_row': 7,
+    'country_name_row': 8,
+    'clli_name_row': 10,
+}
+
+# Site config of the synthetic sites
+SITE_CONFIG = {
+    'sitetype': 'foundry',
+    'hardware_profile': {
+        'foundry': {
+            'profile_name': {
+                'ctrl': 'cp',
+                'compute': 'nc',
+            },
+        },
+    },
+    'hostprofile_interfaces': {
+        'cp': {
+            'networks': {
+                'p1': 'enp67s0f0',
+                'p2': 'enp67s0f1',
+            },
+        },
+        'nc': {
+            'networks': {
+                'p1': 'enp67s0f0',
+                'p2': 'enp67s0f1',
+            },
+        },
+    },
+    'proxy': {
+        'http': 'http://proxy.example.com:8080',
+        'https': 'http://proxy.example.com:8080',
+    },
+    'no_proxy': 'localhost,127.0.0.1',
+    'bgp': {
+        'asnumber': 64671,
+    },
+    'ceph': {
+        'osd_count': 6,
+    },
+    'conf': {
+        'ntp_pool': 'pool.ntp.org',
+    },
+}
+
+
+def get_prefix(size, smallest=24, largest=14):
+    """ Prefix of the smallest IPv4 subnet of at least size addresses """
+    prefix = 32 - (size - 1).bit_length()
+    return max(largest, min(smallest, prefix))
+
+
+def get_host_cells(region, racks, hosts_per_rack, oob_ips_to_leave):
+    """ Cells of the IPMI sheet and the oob subnet of every rack """
+    cells = {}
+    oob_subnets = []
+    oob_prefix = get_prefix(hosts_per_rack + oob_ips_to_leave, largest=16)
+    row = EXCEL_SPEC['start_row']
+    for rack in range(1, racks + 1):
+        subnet = get_subnet('10.{}.0.0/{}'.format(rack, oob_prefix))
+        oob_subnets.append(str(subnet))
+        for host in range(1, hosts_per_rack + 1):
+            controller = rack == 1 and host <= CONTROLLERS
+            cells[row, EXCEL_SPEC['hostname_col']] = \
+                '{}r{:02d}{}{:03d}'.format(region, rack,
+                                           'c' if controller else 'o', host)
+            cells[row, EXCEL_SPEC['ipmi_address_col']] = subnet.address(
+                oob_ips_to_leave + host - 1)
+            if host == 1:
+                cells[row, EXCEL_SPEC['ipmi_gateway_col']] = subnet.address(1)
+            cells[row, EXCEL_SPEC['host_profile_col']] = \
+                'dp-cp' if controller else 'dp-nc'
+            row += 1
+    return cells, oob_subnets
+
+
+def get_private_cells(total_hosts, ips_to_leave):
+    """ Cells of the private IP sheet, networks sized for total_hosts """
+    cells = {}
+    for i, (label, vlan, first) in enumerate(PRIVATE_NETWORKS):
+        if label == 'PXE':
+            """ The upper half of the PXE network is for DHCP """
+            size = 2 * (total_hosts + ips_to_leave + 1)
+        else:
+            size = total_hosts + ips_to_leave + 2
+        cells[EXCEL_SPEC['vlan_start_row'] + i,
+              EXCEL_SPEC['net_type_col']] = label
+        cells[EXCEL_SPEC['vlan_start_row'] + i,
+              EXCEL_SPEC['vlan_col']] = 'VLAN {}'.format(vlan)
+        cells[EXCEL_SPEC['net_start_row'] + i,
+              EXCEL_SPEC['net_vlan_col']] = 'VLAN {}'.format(vlan)
+        cells[EXCEL_SPEC['net_start_row'] + i,
+              EXCEL_SPEC['net_col']] = '{}/{}'.format(first, get_prefix(size))
+    return cells
+
+
+def get_public_cells(total_hosts, ips_to_leave, oob_subnets):
+    """ Cells of the public IP sheet """
+    vlan, first = OAM_NETWORK
+    size = total_hosts + ips_to_leave + 1
+    cells = {
+        (EXCEL_SPEC['oam_ip_row'], EXCEL_SPEC['oam_vlan_col']):
+        'VLAN {}'.format(vlan),
+        (EXCEL_SPEC['oam_ip_row'], EXCEL_SPEC['oam_ip_col']):
+        '{}/{}'.format(first, get_prefix(size)),
+        (EXCEL_SPEC['ingress_ip_row'], EXCEL_SPEC['oam_ip_col']):
+        INGRESS_NETWORK,
+    }
+    for i, subnet in enumerate(oob_subnets):
+        cells[EXCEL_SPEC['oob_net_row'],
+              EXCEL_SPEC['oob_net_start_col'] + i] = subnet
+    return cells
+
+
+def get_build_notes_cells():
+    """ Cells of the DNS, NTP and LDAP sheet """
+    column = EXCEL_SPEC['ldap_col']
+    return {
+        (EXCEL_SPEC['domain_row'], EXCEL_SPEC['domain_col']):
+        'syn.cci.att.com',
+        (EXCEL_SPEC['login_domain_row'], column): 'testitservices',
+        (EXCEL_SPEC['global_group'], column): 'AP-NC_Test',
+        (EXCEL_SPEC['ldap_search_url_row'], column):
+        'url: ldap://its-ad-ldap.atttest.com',
+        (EXCEL_SPEC['ntp_row'], EXCEL_SPEC['ntp_col']):
+        'ntp1.example.com\nntp2.example.com',
+        (EXCEL_SPEC['dns_row'], EXCEL_SPEC['dns_col']): '8.8.8.8, 8.8.4.4',
+    }
+
+
+def get_location_cells():
+    """ Cells of the location sheet """
+    column = EXCEL_SPEC['column']
+    return {
+        (EXCEL_SPEC['corridor_row'], column): 'Corridor 1',
+        (EXCEL_SPEC['site_name_row'], column): 'Dallas',
+        (EXCEL_SPEC['state_name_row'], column): 'Texas',
+        (EXCEL_SPEC['country_name_row'], column): 'USA',
+        (EXCEL_SPEC['clli_name_row'], column): 'DLLSTX21',
+    }
+
+
+def write_sheet(workbook, title, cells):
+    """ Append cells, {(row, column): value}, to a write-only sheet """
+    ws = workbook.create_sheet(title)
+    rows = max(row for row, _ in cells)
+    columns = max(column for _, column in cells)
+    values = [[None] * columns for _ in range(rows)]
+    for (row, column), value in cells.items():
+        values[row - 1][column - 1] = value
+    for row in values:
+        ws.append(row)
+
+
+def generate_package(output_dir, racks=2, hosts_per_rack=10, region='syn01'):
+    """
+    Write a synthetic engineering package of racks racks of
+    hosts_per_rack hosts to output_dir: the design spec workbook, its
+    excel spec and a site config. Every subnet is sized to fit the hosts.
+    Returns the paths of the files, as excel, spec and site_config
+    """
+    if not 1 <= racks <= MAX_RACKS:
+        raise ValueError("racks must be within 1 and {}".format(MAX_RACKS))
+    if not 1 <= hosts_per_rack <= MAX_HOSTS:
+        raise ValueError("hosts_per_rack must be within 1 and {}".format(
+            MAX_HOSTS))
+    rules = load_global_config()
+    total_hosts = racks * hosts_per_rack
+    host_cells, oob_subnets = get_host_cells(
+        region, racks, hosts_per_rack, rules['oob_ips_to_leave'])
+    workbook = Workbook(write_only=True)
+    write_sheet(workbook, EXCEL_SPEC['ipmi_sheet_name'], host_cells)
+    write_sheet(workbook, EXCEL_SPEC['private_ip_sheet'],
+                get_private_cells(total_hosts, rules['ips_to_leave']))
+    write_sheet(workbook, EXCEL_SPEC['public_ip_sheet'],
+                get_public_cells(total_hosts, rules['ips_to_leave'],
+                                 oob_subnets))
+    write_sheet(workbook, EXCEL_SPEC['dns_ntp_ldap_sheet'],
+                get_build_notes_cells())
+    write_sheet(workbook, EXCEL_SPEC['location_sheet'], get_location_cells())
+    os.makedirs(output_dir, exist_ok=True)
+    package = {
+        'excel': os.path.join(output_dir,
+                              '{}_design_spec.xlsx'.format(region)),
+        'spec': os.path.join(output_dir, 'excel_spec.yaml'),
+        'site_config': os.path.join(output_dir, 'site_config.yaml'),
+    }
+    workbook.save(package['excel'])
+    spec = copy.deepcopy(EXCEL_SPEC)
+    spec['end_row'] = spec['start_row'] + total_hosts - 1
+    spec['oob_net_end_col'] = spec['oob_net_start_col'] + racks - 1
+    with open(package['spec'], 'w') as f:
+        yaml.safe_dump({'specs': {'xl_spec': spec}}, f,
+                       default_flow_style=False)
+    with open(package['site_config'], 'w') as f:
+        yaml.safe_dump(SITE_CONFIG, f, default_flow_style=False)
+    return package
+
+
+@click.command()
+@click.option(
+    '--racks',
+    '-r',
+    default=2,
+    type=click.IntRange(1, MAX_RACKS),
+    show_default=True,
+    help='Number of racks')
+@click.option(
+    '--hosts',
+    '-n',
+    'hosts_per_rack',
+    default=10,
+    type=click.IntRange(1, MAX_HOSTS),
+    show_default=True,
+    help='Number of hosts per rack')
+@click.option(
+    '--region',
+    default='syn01',
+    show_default=True,
+    help='Region name, three letters and digits')
+@click.argument('output_dir', type=click.Path(file_okay=False))
+def main(output_dir, racks, hosts_per_rack, region):
+    """ Write a synthetic engineering package to OUTPUT_DIR """
+    package = generate_package(output_dir, racks, hosts_per_rack, region)
+    for key in ('excel', 'spec', 'site_config'):
+        print('{}: {}'.format(key, package[key]))
+
+
+if __name__ == '__main__':
+    main()
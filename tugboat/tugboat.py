@@ -13,18 +13,27 @@
 # limitations under the License.
 
 import click
-import yaml
+import sys
+from tugboat.batch import format_results
+from tugboat.batch import load_batch_manifest
+from tugboat.batch import run_batch
 from tugboat.parser_engine.generate_intermediary import ProcessInputFiles
+from tugboat.parser_engine.utils.data_cache import ParsedDataCache
+from tugboat.parser_engine.utils.intermediary_codec import (
+    INTERMEDIARY_FORMATS, load_intermediary)
+from tugboat.parser_engine.utils.workbook import XLSX_ENGINES
 from tugboat.site_processors.site_processor import SiteProcessor
 import logging
 
 
-def generate_manifest_files(intermediary):
+def generate_manifest_files(intermediary, cache_dir=None, render_jobs=1):
     """ Generate manifests """
     if intermediary:
-        processor_engine = SiteProcessor(intermediary)
+        processor_engine = SiteProcessor(intermediary, cache_dir, render_jobs)
         print('Generating manifest files')
-        processor_engine.render_template()
+        summary = processor_engine.render_template()
+        print(', '.join('{} {}'.format(count, status)
+                        for status, count in summary.items()))
     else:
         logging.error('Intermediary not found')
 
@@ -52,6 +61,12 @@ def generate_manifest_files(intermediary):
     '-s',
     type=click.Path(exists=True),
     help='Path to excel spec, to be passed with generate_intermediary')
+@click.option(
+    '--spec-dir',
+    'spec_dir',
+    type=click.Path(exists=True, file_okay=False),
+    help='Directory of excel specs, the spec matching the excel \
+    files is detected. To be used instead of --exel_spec')
 @click.option(
     '--intermediary',
     '-i',
@@ -71,14 +86,85 @@ def generate_manifest_files(intermediary):
     show_default=True,
     help='Loglevel NOTSET:0 ,DEBUG:10,\
     INFO:20, WARNING:30, ERROR:40, CRITICAL:50')
+@click.option(
+    '--no-cache',
+    'no_cache',
+    is_flag=True,
+    help='Always parse the excel files, bypassing the parsed data cache')
+@click.option(
+    '--cache-dir',
+    'cache_dir',
+    type=click.Path(file_okay=False),
+    help='Directory of the parsed data, design rules and compiled template \
+    caches [default: $XDG_CACHE_HOME/tugboat]')
+@click.option(
+    '--jobs',
+    'jobs',
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help='Number of processes used to read multiple excel files')
+@click.option(
+    '--render-jobs',
+    'render_jobs',
+    default=1,
+    type=click.IntRange(min=1),
+    show_default=True,
+    help='Number of processes rendering the manifest templates')
+@click.option(
+    '--xlsx-engine',
+    'xlsx_engine',
+    default='openpyxl',
+    type=click.Choice(XLSX_ENGINES),
+    show_default=True,
+    help='Engine reading the excel files. xml parses only the cells \
+    referenced by the excel spec straight from the xlsx archive')
+@click.option(
+    '--detect-extent',
+    'detect_extent',
+    is_flag=True,
+    help='Read host, vlan and network rows as far as the data goes \
+    instead of from the start to the end rows of the excel spec')
+@click.option(
+    '--baseline',
+    'baseline',
+    type=click.Path(exists=True, dir_okay=False),
+    help='Previously generated intermediary file. Hosts whose excel rows \
+    did not change keep their addresses, and the changes are logged')
+@click.option(
+    '--batch',
+    'batch',
+    type=click.Path(exists=True, dir_okay=False),
+    help='Batch manifest listing the excel files, excel spec and site \
+    config of several sites. Generates the intermediary of every site, and \
+    the manifests with -m, processing --jobs sites at a time')
+@click.option(
+    '--intermediary-format',
+    'intermediary_format',
+    default='yaml',
+    type=click.Choice(INTERMEDIARY_FORMATS),
+    show_default=True,
+    help='Format of the generated intermediary file. json and binary \
+    load faster with -i, which accepts every format')
 def main(*args, **kwargs):
     generate_intermediary = kwargs['generate_intermediary']
     generate_manifests = kwargs['generate_manifests']
     filenames = kwargs['excel']
-    spec = kwargs['exel_spec']
+    spec = kwargs['exel_spec'] or kwargs['spec_dir']
     intermediary = kwargs['intermediary']
     site_config = kwargs['site_config']
     loglevel = kwargs['loglevel']
+    jobs = kwargs['jobs']
+    render_jobs = kwargs['render_jobs']
+    xlsx_engine = kwargs['xlsx_engine']
+    detect_extent = kwargs['detect_extent']
+    baseline = kwargs['baseline']
+    batch = kwargs['batch']
+    intermediary_format = kwargs['intermediary_format']
+    cache = None
+    if not kwargs['no_cache']:
+        cache = ParsedDataCache(kwargs['cache_dir'])
+    cache_dir = cache.cache_dir if cache is not None else None
     logger = logging.getLogger('tugboat')
     # Set default log level to INFO
     logger.setLevel(loglevel)
@@ -92,6 +178,24 @@ def main(*args, **kwargs):
     logger.info("Tugboat start")
     intermediary_yaml = {}
     """ Check if mandatory params exists """
+    if batch:
+        """ Sites are independent, a failed site does not stop others """
+        options = {
+            'manifests': generate_manifests,
+            'render_jobs': render_jobs,
+            'no_cache': kwargs['no_cache'],
+            'cache_dir': kwargs['cache_dir'],
+            'xlsx_engine': xlsx_engine,
+            'detect_extent': detect_extent,
+            'intermediary_format': intermediary_format,
+        }
+        results = run_batch(load_batch_manifest(batch), options, jobs)
+        print(format_results(results))
+        logger.info("Tugboat Execution Completed")
+        if any(result['status'] != 'ok' for result in results):
+            sys.exit(1)
+        return
+
     if generate_intermediary and generate_manifests:
         """
         Generate intermediary and manifests files using the
@@ -105,17 +209,12 @@ def main(*args, **kwargs):
             return
 
 
-        process_input_ob = ProcessInputFiles(filenames, spec)
-        """ Collects rules.yaml data """
-        process_input_ob.apply_design_rules(site_config)
-        """ Parses the design spec supplied to raw yaml """
-        logger.info("Parsing raw data from design spec")
-        process_input_ob.get_parsed_raw_data_from_excel()
-        logger.info("Generating Intermediary File")
-        intermediary_yaml = process_input_ob.generate_intermediary_yaml()
-        process_input_ob.dump_intermediary_file()
+        process_input_ob = ProcessInputFiles(
+            filenames, spec, cache, jobs, xlsx_engine, detect_extent)
+        intermediary_yaml = process_input_ob.generate_intermediary_file(
+            site_config, baseline, intermediary_format)
         logger.info("Generatng Manifests")
-        generate_manifest_files(intermediary_yaml)
+        generate_manifest_files(intermediary_yaml, cache_dir, render_jobs)
 
     elif generate_manifests and intermediary:
         """
@@ -124,12 +223,9 @@ def main(*args, **kwargs):
         is not required
         """
         logger.info("Loading intermediary")
-        with open(intermediary, 'r') as intermediary_file:
-            raw_data = intermediary_file.read()
-            yaml_data = yaml.safe_load(raw_data)
-            intermediary_yaml = yaml_data
+        intermediary_yaml = load_intermediary(intermediary)
         logger.info("Generatng Manifests")
-        generate_manifest_files(intermediary_yaml)
+        generate_manifest_files(intermediary_yaml, cache_dir, render_jobs)
 
     elif generate_intermediary:
 
@@ -142,15 +238,10 @@ def main(*args, **kwargs):
             logging.error('Site Config not found')
             return
 
-        process_input_ob = ProcessInputFiles(filenames, spec)
-        """ Collects rules.yaml data """
-        process_input_ob.apply_design_rules(site_config)
-        """ Parses the design spec supplied to raw yaml """
-        logger.info("Parsing raw data from design spec")
-        process_input_ob.get_parsed_raw_data_from_excel()
-        logger.info("Generating Intermediary File")
-        intermediary_yaml = process_input_ob.generate_intermediary_yaml()
-        process_input_ob.dump_intermediary_file()
+        process_input_ob = ProcessInputFiles(
+            filenames, spec, cache, jobs, xlsx_engine, detect_extent)
+        intermediary_yaml = process_input_ob.generate_intermediary_file(
+            site_config, baseline, intermediary_format)
 
     else:
         print('No suitable options passed')